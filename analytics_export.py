@@ -0,0 +1,540 @@
+import argparse
+import itertools
+import json
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError as e:
+    raise ImportError("pyarrow is required for the Parquet analytics export") from e
+
+from dealer_data import connect
+from impact_model import ImpactStateStore
+from services.analytics_service.rollups import DAILY_KEY, WATERMARK_KEY, daily_key
+
+# Incremental export of analytics history to date-partitioned Parquet:
+#
+#   <dir>/events/date=YYYY-MM-DD/part-<ingested>.parquet   raw analytics_events rows
+#   <dir>/counters/date=YYYY-MM-DD/part-0.parquet          compacted daily event counters (Redis)
+#   <dir>/dealer_daily/date=YYYY-MM-DD/part-0.parquet      per-dealer daily leads, sales and events
+#   <dir>/dealers/part-0.parquet                          dealer state and first subscription (rewritten every run)
+#   <dir>/impact/intervention_date=YYYY-MM-DD/<dealer>.parquet   persisted impact model results
+#
+# Progress is kept in <dir>/_watermarks.json and advanced after every file,
+# so an interrupted run resumes where it stopped. File names are derived from
+# the watermark, so re-running a partially written window overwrites it
+# instead of duplicating rows. Rows are streamed in chunks of `chunk_rows`
+# through server-side cursors, so memory does not grow with the export size.
+EXPORT_DIR = os.getenv("ANALYTICS_EXPORT_DIR", "analytics_export")
+WATERMARK_FILE = "_watermarks.json"
+CHUNK_ROWS = 50000
+DATASETS = ("events", "counters", "dealer_daily", "dealers", "impact")
+
+# Events are exported by insert time (ingested_at), so rows with late or
+# skewed timestamps are still picked up; they are filed under the date of
+# their own timestamp. Inserts are left this long so open transactions commit first
+EVENT_EXPORT_DELAY = timedelta(minutes=15)
+# Leads are marked sold after the day they were created, so recent dealer days are re-exported on every run
+DEALER_RESTATE_DAYS = 30
+
+EVENT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("event_type", pa.dictionary(pa.int32(), pa.string())),
+    ("user_id", pa.string()),
+    ("dealer_id", pa.string()),
+    ("data", pa.string()),  # The full event as JSON
+    ("timestamp", pa.timestamp("us", tz="UTC"))
+])
+
+COUNTER_SCHEMA = pa.schema([
+    ("event_type", pa.dictionary(pa.int32(), pa.string())),
+    ("count", pa.int64())
+])
+
+DEALER_DAILY_SCHEMA = pa.schema([
+    ("dealer_id", pa.string()),
+    ("leads", pa.int64()),
+    ("sales", pa.int64()),
+    ("events", pa.int64())
+])
+
+# What ParquetDealerDataLoader needs to pick a dealer's unaffected peers, as dealer_data.PEER_SALES_QUERY does
+DEALER_SCHEMA = pa.schema([
+    ("dealer_id", pa.string()),
+    ("state", pa.string()),
+    ("subscribed_from", pa.timestamp("us", tz="UTC"))  # First CarReport subscription, null if never subscribed
+])
+
+IMPACT_SCHEMA = pa.schema([
+    ("dealer_id", pa.string()),
+    ("date", pa.date32()),
+    ("period", pa.dictionary(pa.int32(), pa.string())),
+    ("y", pa.float64()),
+    ("preds", pa.float64()),
+    ("preds_lower", pa.float64()),
+    ("preds_upper", pa.float64()),
+    ("point_effects", pa.float64()),
+    ("cum_effects", pa.float64())
+])
+
+EVENTS_QUERY = """
+SELECT id::text, event_type, user_id::text, dealer_id::text, data::text, timestamp
+FROM analytics_events
+WHERE ingested_at >= %(start)s
+  AND ingested_at < %(end)s
+ORDER BY timestamp
+"""
+
+# DAILY_SERIES_QUERY for every dealer at once, one UTC day per call
+DEALER_DAILY_QUERY = """
+SELECT dealer_id::text, SUM(leads) AS leads, SUM(sales) AS sales, SUM(events) AS events
+FROM (
+    SELECT dealer_id,
+           COUNT(*) AS leads,
+           COUNT(*) FILTER (WHERE status = 'sold') AS sales,
+           0 AS events
+    FROM leads
+    WHERE created_at >= %(start)s
+      AND created_at < %(end)s
+    GROUP BY 1
+    UNION ALL
+    SELECT dealer_id, 0 AS leads, 0 AS sales, COUNT(*) AS events
+    FROM analytics_events
+    WHERE dealer_id IS NOT NULL
+      AND timestamp >= %(start)s
+      AND timestamp < %(end)s
+    GROUP BY 1
+) daily
+GROUP BY dealer_id
+ORDER BY dealer_id
+"""
+
+DEALERS_QUERY = """
+SELECT d.id::text, d.state, min(s.start_date)
+FROM dealers d
+LEFT JOIN dealer_subscriptions s ON s.dealer_id = d.id
+GROUP BY d.id, d.state
+ORDER BY d.id
+"""
+
+FIRST_INGESTED_QUERY = """
+SELECT min(ingested_at) FROM analytics_events
+"""
+
+FIRST_DAY_QUERY = """
+SELECT LEAST((SELECT min(timestamp) FROM analytics_events), (SELECT min(created_at) FROM leads))
+"""
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _write_atomic(path: str, schema, batches) -> int:
+    """
+    Write record batches to a Parquet file, replacing `path` only once the file is complete
+
+    No file is created when there are no rows.
+    """
+    tmp_path = path + ".tmp"
+    writer = None
+    rows = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp_path, path)
+    return rows
+
+
+def _event_batch(rows) -> "pa.RecordBatch":
+    ids, event_types, user_ids, dealer_ids, data, timestamps = zip(*rows)
+    return pa.RecordBatch.from_arrays([
+        pa.array(ids, pa.string()),
+        pa.array(event_types, pa.string()).dictionary_encode(),
+        pa.array(user_ids, pa.string()),
+        pa.array(dealer_ids, pa.string()),
+        pa.array(data, pa.string()),
+        pa.array(timestamps, pa.timestamp("us", tz="UTC"))
+    ], schema=EVENT_SCHEMA)
+
+
+def _split_by_day(chunks):
+    """Yield (UTC date, rows) runs from chunks of event rows ordered by timestamp"""
+    for rows in chunks:
+        for day, run in itertools.groupby(rows, key=lambda row: row[5].astimezone(timezone.utc).date()):
+            yield day, list(run)
+
+
+def _dealer_daily_batch(rows) -> "pa.RecordBatch":
+    dealer_ids, leads, sales, events = zip(*rows)
+    return pa.RecordBatch.from_arrays([
+        pa.array(dealer_ids, pa.string()),
+        pa.array(leads, pa.int64()),
+        pa.array(sales, pa.int64()),
+        pa.array(events, pa.int64())
+    ], schema=DEALER_DAILY_SCHEMA)
+
+
+def _dealer_batch(rows) -> "pa.RecordBatch":
+    dealer_ids, states, subscribed_from = zip(*rows)
+    return pa.RecordBatch.from_arrays([
+        pa.array(dealer_ids, pa.string()),
+        pa.array(states, pa.string()),
+        pa.array(subscribed_from, pa.timestamp("us", tz="UTC"))
+    ], schema=DEALER_SCHEMA)
+
+
+class AnalyticsExporter:
+    def __init__(self, directory: str = None, connection_factory=None, redis_client=None,
+                 state_store: ImpactStateStore = None, chunk_rows: int = CHUNK_ROWS):
+        """
+        Export analytics history to date-partitioned Parquet from a watermark
+
+        Parameters:
+        -----------
+        directory: str, optional
+            Export root; defaults to ANALYTICS_EXPORT_DIR
+        connection_factory: callable, optional
+            Returns a DB-API connection; defaults to `dealer_data.connect`
+        redis_client: redis.Redis, optional
+            Source of the rollup counters; the counters dataset is skipped without one
+        state_store: ImpactStateStore, optional
+            Source of the impact results
+        chunk_rows: int
+            Rows fetched from Postgres and written per record batch
+        """
+        self.directory = directory or EXPORT_DIR
+        self.connection_factory = connection_factory or connect
+        self.redis_client = redis_client
+        self.state_store = state_store or ImpactStateStore()
+        self.chunk_rows = chunk_rows
+        self._watermark_path = os.path.join(self.directory, WATERMARK_FILE)
+        self.watermarks = self._load_watermarks()
+
+    def _load_watermarks(self):
+        if not os.path.exists(self._watermark_path):
+            return {}
+        with open(self._watermark_path) as f:
+            return json.load(f)
+
+    def _save_watermark(self, dataset, value):
+        self.watermarks[dataset] = value
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._watermark_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.watermarks, f, indent=2)
+        os.replace(tmp_path, self._watermark_path)
+
+    def _first_day(self, conn, since, query=FIRST_DAY_QUERY):
+        if since is not None:
+            return since
+        with conn.cursor() as cur:
+            cur.execute(query)
+            first = cur.fetchone()[0]
+        conn.rollback()
+        return first.astimezone(timezone.utc).date() if first is not None else None
+
+    def _stream(self, conn, name, query, params):
+        """Yield lists of at most `chunk_rows` rows from a server-side cursor"""
+        with conn.cursor(name=name) as cur:
+            cur.itersize = self.chunk_rows
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        conn.rollback()
+
+    def export_events(self, conn, since: date = None, now: datetime = None) -> int:
+        """
+        Export analytics_events rows inserted more than EVENT_EXPORT_DELAY ago
+
+        The watermark is on ingested_at and advances one UTC day at a time.
+        Each window's rows go to the date partitions of their own timestamps,
+        one file per date and window.
+        """
+        until = (now or datetime.now(timezone.utc)) - EVENT_EXPORT_DELAY
+        if "events" in self.watermarks:
+            start = datetime.fromisoformat(self.watermarks["events"])
+        else:
+            first_day = self._first_day(conn, since, FIRST_INGESTED_QUERY)
+            if first_day is None:
+                return 0
+            start = _day_start(first_day)
+
+        exported = 0
+        while start < until:
+            end = min(_day_start(start.date() + timedelta(days=1)), until)
+            chunks = self._stream(conn, "export_events", EVENTS_QUERY, {"start": start, "end": end})
+            for day, runs in itertools.groupby(_split_by_day(chunks), key=lambda run: run[0]):
+                path = os.path.join(self.directory, "events", f"date={day.isoformat()}",
+                                    f"part-{start.strftime('%Y%m%dT%H%M%S')}.parquet")
+                exported += _write_atomic(path, EVENT_SCHEMA, (_event_batch(rows) for _, rows in runs))
+            self._save_watermark("events", end.isoformat())
+            start = end
+        return exported
+
+    def export_dealer_daily(self, conn, since: date = None, now: datetime = None) -> int:
+        """Export per-dealer daily leads, sales and events for completed UTC days"""
+        today = (now or datetime.now(timezone.utc)).date()
+        if "dealer_daily" in self.watermarks:
+            day = min(date.fromisoformat(self.watermarks["dealer_daily"]), today - timedelta(days=DEALER_RESTATE_DAYS))
+        else:
+            day = self._first_day(conn, since)
+            if day is None:
+                return 0
+
+        exported = 0
+        while day < today:
+            path = os.path.join(self.directory, "dealer_daily", f"date={day.isoformat()}", "part-0.parquet")
+            params = {"start": _day_start(day), "end": _day_start(day + timedelta(days=1))}
+            batches = (_dealer_daily_batch(rows) for rows in
+                       self._stream(conn, "export_dealer_daily", DEALER_DAILY_QUERY, params))
+            exported += _write_atomic(path, DEALER_DAILY_SCHEMA, batches)
+            day += timedelta(days=1)
+            self._save_watermark("dealer_daily", day.isoformat())
+        return exported
+
+    def export_dealers(self, conn) -> int:
+        """Snapshot every dealer's state and first subscription; small enough to rewrite on every run"""
+        path = os.path.join(self.directory, "dealers", "part-0.parquet")
+        batches = (_dealer_batch(rows) for rows in self._stream(conn, "export_dealers", DEALERS_QUERY, {}))
+        return _write_atomic(path, DEALER_SCHEMA, batches)
+
+    def export_counters(self, since: date = None) -> int:
+        """Export compacted daily event counters; days still being compacted are left for the next run"""
+        compacted = self.redis_client.hget(WATERMARK_KEY, "day")
+        if not compacted:
+            return 0
+        end = datetime.strptime(compacted, "%Y-%m-%d %H:%M").date()
+
+        if "counters" in self.watermarks:
+            day = date.fromisoformat(self.watermarks["counters"])
+        elif since is not None:
+            day = since
+        else:
+            # First run: start from the oldest daily bucket
+            days = [key.rsplit(":", 1)[-1] for key in self.redis_client.scan_iter(match=f"{DAILY_KEY}:*", count=1000)]
+            if not days:
+                return 0
+            day = date.fromisoformat(min(days))
+
+        exported = 0
+        while day < end:
+            # One pipelined round trip per chunk of days
+            days = [day + timedelta(days=i) for i in range(min(100, (end - day).days))]
+            pipe = self.redis_client.pipeline(transaction=False)
+            for d in days:
+                pipe.hgetall(daily_key(d))
+            for d, counts in zip(days, pipe.execute()):
+                if counts:
+                    batch = pa.RecordBatch.from_arrays([
+                        pa.array(list(counts.keys()), pa.string()).dictionary_encode(),
+                        pa.array([int(c) for c in counts.values()], pa.int64())
+                    ], schema=COUNTER_SCHEMA)
+                    path = os.path.join(self.directory, "counters", f"date={d.isoformat()}", "part-0.parquet")
+                    exported += _write_atomic(path, COUNTER_SCHEMA, [batch])
+            day = days[-1] + timedelta(days=1)
+            self._save_watermark("counters", day.isoformat())
+        return exported
+
+    def export_impact(self) -> int:
+        """Export impact model results saved since the last run, one file per dealer and intervention date"""
+        exported = 0
+        for mtime, state in self.state_store.iter_states(modified_after=self.watermarks.get("impact")):
+            data = state.to_result().data
+            n_pre = len(state.pre_dates)
+            period = np.where(np.arange(len(data)) < n_pre, "pre", "post")
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array([state.dealer_id] * len(data), pa.string()),
+                 pa.array(data.index.date, pa.date32()),
+                 pa.array(period, pa.string()).dictionary_encode()]
+                + [pa.array(data[column].to_numpy(), pa.float64()) for column in IMPACT_SCHEMA.names[3:]],
+                schema=IMPACT_SCHEMA
+            )
+            safe_dealer_id = re.sub(r'[^A-Za-z0-9_-]', '_', state.dealer_id)
+            path = os.path.join(self.directory, "impact", f"intervention_date={state.intervention_date}",
+                                f"{safe_dealer_id}.parquet")
+            exported += _write_atomic(path, IMPACT_SCHEMA, [batch])
+            self._save_watermark("impact", mtime)
+        return exported
+
+    def run(self, datasets=DATASETS, since: date = None):
+        """Export every requested dataset from its watermark; returns rows written per dataset"""
+        results = {}
+        conn = self.connection_factory() if {"events", "dealer_daily", "dealers"} & set(datasets) else None
+        try:
+            if "events" in datasets:
+                results["events"] = self.export_events(conn, since)
+            if "dealer_daily" in datasets:
+                results["dealer_daily"] = self.export_dealer_daily(conn, since)
+            if "dealers" in datasets:
+                results["dealers"] = self.export_dealers(conn)
+        finally:
+            if conn is not None:
+                conn.close()
+        if "counters" in datasets and self.redis_client is not None:
+            results["counters"] = self.export_counters(since)
+        if "impact" in datasets:
+            results["impact"] = self.export_impact()
+        return results
+
+
+class ParquetDealerDataLoader:
+    def __init__(self, directory: str = None):
+        """
+        Load daily dealer series from an analytics export instead of Postgres
+
+        Offers the same `load_daily_series` / `load_dealer_data` interface as
+        `dealer_data.DealerDataLoader`, plus `load_all_dealers` to read every
+        dealer's series in one pass for batch impact analysis. The baseline
+        covariate is built as `DealerDataLoader` builds it, from the `dealers`
+        and `dealer_daily` datasets: the mean daily sales of the dealer's
+        peers (same state, not subscribed by the end of the window, with
+        sales in it).
+
+        Parameters:
+        -----------
+        directory: str, optional
+            Export root; defaults to ANALYTICS_EXPORT_DIR
+        """
+        self.directory = directory or EXPORT_DIR
+
+    def _read(self, start_date, end_date, dealer_ids=None) -> pd.DataFrame:
+        dataset = ds.dataset(
+            os.path.join(self.directory, "dealer_daily"),
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("date", pa.date32())]), flavor="hive")
+        )
+        condition = (ds.field("date") >= date.fromisoformat(start_date)) & (ds.field("date") <= date.fromisoformat(end_date))
+        if dealer_ids is not None:
+            condition &= ds.field("dealer_id").isin([str(d) for d in dealer_ids])
+        return dataset.to_table(filter=condition).to_pandas()
+
+    def _dense(self, rows: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+        daily = rows.set_index(pd.DatetimeIndex(pd.to_datetime(rows['date'])))[['leads', 'sales', 'events']]
+        return daily.reindex(pd.date_range(start=start_date, end=end_date), fill_value=0).astype('int64')
+
+    def _dealers(self, end_date) -> pd.DataFrame:
+        """Exported dealers indexed by id, with `unaffected` set for those not subscribed by the end of the window"""
+        path = os.path.join(self.directory, "dealers", "part-0.parquet")
+        if not os.path.exists(path):
+            raise ValueError(f"{path} not found; export the dealers dataset to build peer baselines")
+        dealers = pq.read_table(path).to_pandas().set_index('dealer_id')
+        window_end = pd.Timestamp(_day_start(date.fromisoformat(end_date) + timedelta(days=1)))
+        dealers['unaffected'] = dealers['subscribed_from'].isna() | (dealers['subscribed_from'] >= window_end)
+        return dealers
+
+    def _peer_sales(self, rows: pd.DataFrame, dealers: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+        """Days x dealers sales of the unaffected dealers among `rows` that sold anything in the window"""
+        rows = rows[rows['dealer_id'].map(dealers['unaffected']).fillna(False).astype(bool)]
+        sales = rows.pivot_table(index=pd.to_datetime(rows['date']), columns='dealer_id', values='sales', aggfunc='sum')
+        sales = sales.reindex(pd.date_range(start=start_date, end=end_date), fill_value=0).fillna(0)
+        return sales.loc[:, sales.sum() > 0]
+
+    def load_daily_series(self, dealer_id, start_date, end_date):
+        """Daily leads, sales and events for one dealer, in the format of `DealerDataLoader.load_daily_series`"""
+        return self._dense(self._read(start_date, end_date, [dealer_id]), start_date, end_date)
+
+    def load_dealer_data(self, dealer_id, start_date, end_date):
+        """
+        Dealer data in the format expected by DealerImpactAnalyzer
+
+        Raises:
+        -------
+        ValueError
+            If the dealer has no peers to build the baseline from
+        """
+        dealer_id = str(dealer_id)
+        dealers = self._dealers(end_date)
+        state = dealers['state'].get(dealer_id)
+        peer_ids = dealers.index[(dealers['state'] == state) & (dealers.index != dealer_id)] if pd.notna(state) else []
+
+        rows = self._read(start_date, end_date, [dealer_id, *peer_ids])
+        series = self._dense(rows[rows['dealer_id'] == dealer_id], start_date, end_date)
+        peers = self._peer_sales(rows[rows['dealer_id'] != dealer_id], dealers, start_date, end_date)
+        if not len(peers.columns):
+            raise ValueError(f"No unaffected peer dealers found for dealer {dealer_id}")
+        return {
+            "dates": series.index,
+            "leads": series['leads'].to_numpy(),
+            "sales": series['sales'].to_numpy(),
+            "baseline_sales": peers.mean(axis=1).to_numpy()
+        }
+
+    def load_all_dealers(self, start_date, end_date, dealer_ids=None):
+        """
+        Series for every dealer in the export over a window
+
+        Every dealer's rows are read once; each dealer's baseline is its
+        state's peer sales total minus its own, over the remaining peers.
+        Dealers without peers are left out.
+
+        Returns:
+        --------
+        dict
+            dealer_id -> DataFrame with a dense daily DatetimeIndex and leads,
+            sales and baseline_sales columns, accepted directly by
+            DealerImpactAnalyzer.prepare_data / analyze_dealer_impact
+        """
+        dealers = self._dealers(end_date)
+        rows = self._read(start_date, end_date)
+        peers = self._peer_sales(rows, dealers, start_date, end_date)
+        peer_states = dealers['state'].reindex(peers.columns)
+        state_sales = peers.T.groupby(peer_states).sum().T
+        state_peers = peer_states.value_counts()
+
+        if dealer_ids is not None:
+            rows = rows[rows['dealer_id'].isin([str(d) for d in dealer_ids])]
+        results = {}
+        for dealer_id, group in rows.groupby('dealer_id', sort=False):
+            state = dealers['state'].get(dealer_id)
+            if state not in state_sales.columns:
+                continue
+            total, count = state_sales[state], state_peers[state]
+            if dealer_id in peers.columns:
+                total, count = total - peers[dealer_id], count - 1
+            if not count:
+                continue
+            series = self._dense(group, start_date, end_date)[['leads', 'sales']]
+            series['baseline_sales'] = (total / count).to_numpy()
+            results[dealer_id] = series
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export analytics history to date-partitioned Parquet")
+    parser.add_argument("--output-dir", default=EXPORT_DIR)
+    parser.add_argument("--datasets", default=",".join(DATASETS), help="Comma-separated subset of " + ", ".join(DATASETS))
+    parser.add_argument("--since", type=date.fromisoformat, help="First day to export when a dataset has no watermark yet")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    redis_client = None
+    if os.getenv("REDIS_HOST"):
+        import redis
+        redis_client = redis.Redis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT", 6379), decode_responses=True)
+
+    exporter = AnalyticsExporter(args.output_dir, redis_client=redis_client, chunk_rows=args.chunk_rows)
+    for dataset, rows in exporter.run(args.datasets.split(","), args.since).items():
+        print(f"{dataset}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
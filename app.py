@@ -2,8 +2,7 @@ from typing import Optional
 
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel
-import numpy as np
+from pydantic import BaseModel, Field
 
 # Security dependencies
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -76,32 +75,114 @@ async def read_items(current_user: dict = Depends(get_current_user)):
 async def create_car_report(car_report: CarReport, current_user: dict = Depends(required_scopes(["write"]))):
     return {"message": f"Car report created for {car_report.make} {car_report.model}"}
 
-from causal_impact import DealerImpactAnalyzer
-import pandas as pd
+import os
+import uuid
 from datetime import datetime, timedelta
 
+from services.common.latency import LatencyMiddleware, LatencyRecorder
+
+# Per-route latency histograms, flushed to Redis (and reported by the analytics
+# service's /analytics/api) when REDIS_HOST is configured
+_latency_redis = None
+if os.getenv("REDIS_HOST"):
+    import redis
+    _latency_redis = redis.Redis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT", 6379), decode_responses=True)
+app.add_middleware(LatencyMiddleware, recorder=LatencyRecorder("app", _latency_redis))
+
+# numpy, pandas and causalimpact (statsmodels) are imported on first use by the
+# impact endpoint so that the auth and item routes start without them
+
+# Read dealer series from Postgres when a database is configured, otherwise fall back to mock data
+USE_DEALER_DATABASE = os.getenv("POSTGRES_HOST") is not None
+_dealer_data_loader = None
+_peer_control_selector = None
+
+def get_dealer_data_loader():
+    """Create the dealer data loader on first use; it caches series across requests"""
+    global _dealer_data_loader
+    if _dealer_data_loader is None:
+        from dealer_data import DealerDataLoader
+        _dealer_data_loader = DealerDataLoader()
+    return _dealer_data_loader
+
+def get_peer_control_selector():
+    """Create the peer control selector on first use; it caches peer sets per dealer"""
+    global _peer_control_selector
+    if _peer_control_selector is None:
+        from peer_controls import PeerControlSelector
+        _peer_control_selector = PeerControlSelector(get_dealer_data_loader())
+    return _peer_control_selector
+
 class DealerImpactRequest(BaseModel):
-    dealer_id: int
+    dealer_id: str  # Dealer UUID when a dealer database is configured
     start_date: Optional[str] = None
     end_date: Optional[str] = None
     intervention_date: Optional[str] = None
     average_order_value: Optional[float] = 45000.0
     average_margin: Optional[float] = 3000.0
+    max_chart_points: Optional[int] = Field(None, ge=3)  # Downsample long windows to about this many points
+    chart_encoding: Optional[str] = "json"  # "json" or "columnar"
+    robustness_checks: Optional[bool] = False  # Add placebo test and bootstrap interval to the summary
+    control_mode: Optional[str] = "baseline"  # "baseline" (mean peer sales with a database) or "peers" (most correlated peer dealers' sales as controls, needs the database)
 
 class DealerImpactResponse(BaseModel):
     summary: dict
     chart_data: dict
     report_text: str
 
+def generate_mock_dealer_data(start_date: str, end_date: str, intervention_date: str) -> dict:
+    """Generate mock dealer data with a 30% CarReport effect after the intervention"""
+    import numpy as np
+    import pandas as pd
+    
+    date_range = pd.date_range(start=start_date, end=end_date)
+    n_days = len(date_range)
+    intervention_idx = date_range.get_loc(pd.Timestamp(intervention_date))
+    
+    rng = np.random.default_rng(42)  # For reproducibility
+    days = np.arange(n_days)
+    
+    # Baseline sales (what would happen without CarReport)
+    baseline_sales = 10 + days * 0.1 + rng.normal(0, 2, n_days)
+    
+    # After intervention, sales increase by 30% on average
+    days_since = np.maximum(days - intervention_idx, 0)
+    effect = baseline_sales * 0.3 * (1 - np.exp(-days_since / 10))
+    noise = np.where(days >= intervention_idx, rng.normal(0, 2, n_days), 0.0)
+    sales = baseline_sales + effect + noise
+    
+    # Generate leads data (approximately 3x sales)
+    leads = sales * 3 + rng.normal(0, 5, n_days)
+    
+    return {
+        "dates": date_range,
+        "leads": leads,
+        "sales": sales,
+        "baseline_sales": baseline_sales
+    }
+
 @app.post("/dealers/{dealer_id}/impact", response_model=DealerImpactResponse)
 async def analyze_dealer_impact(
-    dealer_id: int,
+    dealer_id: str,
     request: DealerImpactRequest,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Analyze the causal impact of CarReport on dealer sales
     """
+    if request.chart_encoding not in ("json", "columnar"):
+        raise HTTPException(status_code=400, detail="chart_encoding must be 'json' or 'columnar'")
+    if request.control_mode not in ("baseline", "peers"):
+        raise HTTPException(status_code=400, detail="control_mode must be 'baseline' or 'peers'")
+    if request.control_mode == "peers" and not USE_DEALER_DATABASE:
+        raise HTTPException(status_code=400, detail="control_mode 'peers' requires a dealer database")
+    if USE_DEALER_DATABASE:
+        # dealers.id is a UUID; reject anything else before it reaches a query
+        try:
+            dealer_id = str(uuid.UUID(dealer_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="dealer_id must be a UUID")
+    
     # Set default dates if not provided
     end_date = request.end_date or datetime.utcnow().strftime('%Y-%m-%d')
     
@@ -121,44 +202,22 @@ async def analyze_dealer_impact(
     else:
         intervention_date = request.intervention_date
     
-    # In a real application, we would fetch this data from the database
-    # For this example, we'll generate mock data
-    
-    # Generate dates
-    date_range = pd.date_range(start=start_date, end=end_date)
-    dates = date_range.strftime('%Y-%m-%d').tolist()
-    
-    # Generate mock data
-    np.random.seed(42)  # For reproducibility
-    
-    # Baseline sales (what would happen without CarReport)
-    baseline_sales = [10 + i * 0.1 + np.random.normal(0, 2) for i in range(len(dates))]
-    
-    # Actual sales (with CarReport effect after intervention)
-    sales = []
-    intervention_idx = dates.index(intervention_date)
-    
-    for i in range(len(dates)):
-        if i < intervention_idx:
-            # Before intervention, sales follow baseline
-            sales.append(baseline_sales[i])
-        else:
-            # After intervention, sales increase by 30% on average
-            effect = baseline_sales[i] * 0.3 * (1 - np.exp(-(i - intervention_idx) / 10))
-            sales.append(baseline_sales[i] + effect + np.random.normal(0, 2))
-    
-    # Generate leads data (approximately 3x sales)
-    leads = [s * 3 + np.random.normal(0, 5) for s in sales]
+    if USE_DEALER_DATABASE:
+        try:
+            dealer_data = get_dealer_data_loader().load_dealer_data(dealer_id, start_date, end_date)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    else:
+        dealer_data = generate_mock_dealer_data(start_date, end_date, intervention_date)
     
-    # Create dealer data dictionary
-    dealer_data = {
-        "dates": dates,
-        "leads": leads,
-        "sales": sales,
-        "baseline_sales": baseline_sales
-    }
+    controls = None
+    if request.control_mode == "peers":
+        import pandas as pd
+        target_sales = pd.Series(dealer_data["sales"], index=dealer_data["dates"])
+        controls = get_peer_control_selector().build_controls(dealer_id, target_sales, start_date, end_date, intervention_date)
     
     # Run causal impact analysis
+    from causal_impact import DealerImpactAnalyzer
     analyzer = DealerImpactAnalyzer()
     result = analyzer.analyze_dealer_impact(
         dealer_data,
@@ -166,7 +225,11 @@ async def analyze_dealer_impact(
         end_date,
         intervention_date,
         request.average_order_value,
-        request.average_margin
+        request.average_margin,
+        max_chart_points=request.max_chart_points,
+        chart_encoding=request.chart_encoding,
+        robustness_checks=request.robustness_checks,
+        controls=controls
     )
     
     return result
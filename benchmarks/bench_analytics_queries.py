@@ -0,0 +1,120 @@
+"""
+Benchmark analytics range queries against Redis
+
+Seeds --seed-days of counters through the analytics service's own ingest
+path, then times the metric functions behind the /analytics endpoints for
+each --days window and reports p50/p99 latency. "overview" computes every
+metric family live, as /analytics/overview does for non-standard windows;
+"overview_snapshot" reads the precomputed blob served for the standard ones.
+
+Requires a running Redis (REDIS_HOST / REDIS_PORT). Keys are written to
+--db, which should be a scratch database; it is flushed before seeding and
+--flush empties it afterwards.
+
+Usage:
+    python benchmarks/bench_analytics_queries.py --days 1,7,30,365,3650
+    python benchmarks/bench_analytics_queries.py --seed-days 730 --repeat 500 --output queries.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "analytics_service"))
+
+import main as analytics  # noqa: E402
+import rollups  # noqa: E402
+import snapshots  # noqa: E402
+
+QUERIES = {
+    "reports": analytics.get_report_metrics,
+    "users": analytics.get_user_metrics,
+    "searches": analytics.get_search_metrics,
+    "overview": analytics.get_overview_metrics,
+}
+
+
+def seed(client, seed_days, events_per_day, rng):
+    """Write events_per_day report and search events for each of the last seed_days days"""
+    now = datetime.utcnow()
+    for day in range(seed_days):
+        timestamp = now - timedelta(days=day)
+        events = [
+            (analytics.REPORT_EVENT_TYPE, {"vin": f"VIN{int(v):08d}", "user_id": int(u), "dealer_id": int(d)})
+            for v, u, d in zip(rng.integers(0, 50000, events_per_day), rng.integers(0, 5000, events_per_day), rng.integers(0, 500, events_per_day))
+        ]
+        # Zipf-distributed search terms so a few makes, models and cities dominate
+        events += [
+            (analytics.SEARCH_EVENT_TYPE, {"make": f"make{int(m)}", "model": f"model{int(o)}", "location": f"city{int(c)}"})
+            for m, o, c in zip(rng.zipf(1.5, events_per_day) % 60, rng.zipf(1.3, events_per_day) % 2000, rng.zipf(1.3, events_per_day) % 5000)
+        ]
+        pipe = client.pipeline(transaction=False)
+        analytics.queue_events(pipe, events, timestamp)
+        if day:
+            # History is seeded straight into the daily tier, as the compactor would leave it
+            counts = {}
+            for event_type, _ in events:
+                counts[event_type] = counts.get(event_type, 0) + 1
+            for event_type, count in counts.items():
+                pipe.hincrby(rollups.daily_key(timestamp), event_type, count)
+        pipe.execute()
+    rollups.compact(client)
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=parse_int_list, default=[1, 7, 30, 365, 3650], help="Query windows in days")
+    parser.add_argument("--seed-days", type=int, default=365)
+    parser.add_argument("--events-per-day", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", type=int, default=15, help="Scratch Redis database; it is flushed")
+    parser.add_argument("--flush", action="store_true", help="FLUSHDB the benchmark database afterwards")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=os.getenv("REDIS_PORT", 6379), db=args.db, decode_responses=True)
+    client.flushdb()
+    analytics.redis_client = client
+    seed(client, args.seed_days, args.events_per_day, np.random.default_rng(args.seed))
+
+    snapshots.build_snapshots(client, analytics.build_overview_snapshot)
+    queries = dict(QUERIES)
+    queries["overview_snapshot"] = lambda time_range: snapshots.read_snapshot(client, (time_range.end_date - time_range.start_date).days)
+
+    results = []
+    for name, query in queries.items():
+        for days in args.days:
+            if name == "overview_snapshot" and days not in snapshots.SNAPSHOT_WINDOWS:
+                continue
+            time_range = analytics.get_date_range(days)
+            query(time_range)  # warm up
+            samples = np.empty(args.repeat)
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                query(time_range)
+                samples[i] = (time.perf_counter() - start) * 1000
+            result = {"query": name, "days": days, "p50_ms": float(np.percentile(samples, 50)), "p99_ms": float(np.percentile(samples, 99))}
+            results.append(result)
+            print(f"{name:>10} days={days:<5} p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms", flush=True)
+
+    if args.flush:
+        client.flushdb()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
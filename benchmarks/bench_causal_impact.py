@@ -0,0 +1,241 @@
+"""
+Benchmark the dealer causal impact pipeline
+
+Times each stage of DealerImpactAnalyzer (prepare_data, the model fit,
+generate_impact_summary and generate_impact_data_for_chart) over synthetic
+dealer series, and records peak traced memory and allocation counts for a
+sample of dealers. Everything runs offline on CPU with a fixed seed.
+
+Usage:
+    python benchmarks/bench_causal_impact.py --days 90,365,1825 --dealers 1,10,100 --output results.json
+    python benchmarks/bench_causal_impact.py --model fast --dealers 1,100,10000 --output fast.json
+    python benchmarks/bench_causal_impact.py --compare results.json --output new.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from causal_impact import DealerImpactAnalyzer  # noqa: E402
+from impact_model import ImpactModelState  # noqa: E402
+
+STAGES = ["prepare_data", "run_causal_impact_analysis", "generate_impact_summary", "generate_impact_data_for_chart"]
+START_DATE = "2019-01-01"
+
+
+def synthetic_dealer(rng, n_days, input_format="lists"):
+    """Generate one dealer series with a ramping 30% effect after 70% of the window"""
+    dates = pd.date_range(start=START_DATE, periods=n_days)
+    intervention_idx = int(n_days * 0.7)
+    days = np.arange(n_days)
+
+    baseline_sales = 10 + rng.uniform(0, 20) + days * 0.01 + rng.normal(0, 2, n_days)
+    effect = baseline_sales * 0.3 * (1 - np.exp(-np.maximum(days - intervention_idx, 0) / 10))
+    sales = baseline_sales + np.where(days >= intervention_idx, effect, 0.0) + rng.normal(0, 1, n_days)
+    leads = sales * 3 + rng.normal(0, 5, n_days)
+
+    if input_format == "frame":
+        dealer_data = pd.DataFrame({"leads": leads, "sales": sales, "baseline_sales": baseline_sales}, index=dates)
+    elif input_format == "arrays":
+        dealer_data = {"dates": dates, "leads": leads, "sales": sales, "baseline_sales": baseline_sales}
+    else:
+        dealer_data = {
+            "dates": dates.strftime('%Y-%m-%d').tolist(),
+            "leads": leads.tolist(),
+            "sales": sales.tolist(),
+            "baseline_sales": baseline_sales.tolist()
+        }
+    return dealer_data, dates[0].strftime('%Y-%m-%d'), dates[-1].strftime('%Y-%m-%d'), dates[intervention_idx].strftime('%Y-%m-%d')
+
+
+def make_stages(analyzer, model):
+    """Return the four stage callables for the chosen model"""
+    def prepare(dealer_data, start_date, end_date, intervention_date):
+        return analyzer.prepare_data(dealer_data, start_date, end_date, intervention_date)
+
+    def fit(data, start_date, end_date, intervention_date):
+        pre_end = (pd.to_datetime(intervention_date) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        if model == "fast":
+            n_pre = int(data.index.searchsorted(pd.Timestamp(intervention_date)))
+            state = ImpactModelState.fit("bench", intervention_date, data.index[:n_pre], data['sales'].to_numpy()[:n_pre], data['baseline_sales'].to_numpy()[:n_pre])
+            state.append(data.index[n_pre:], data['sales'].to_numpy()[n_pre:], data['baseline_sales'].to_numpy()[n_pre:])
+            return state.to_result()
+        return analyzer.run_causal_impact_analysis(data, [start_date, pre_end], [intervention_date, end_date])
+
+    def summarize(ci):
+        return analyzer.generate_impact_summary(ci, 45000.0, 3000.0)
+
+    def chart(ci):
+        return analyzer.generate_impact_data_for_chart(ci)
+
+    return prepare, fit, summarize, chart
+
+
+def run_pipeline(stages, dealer, timings):
+    prepare, fit, summarize, chart = stages
+    dealer_data, start_date, end_date, intervention_date = dealer
+
+    t0 = time.perf_counter()
+    data = prepare(dealer_data, start_date, end_date, intervention_date)
+    t1 = time.perf_counter()
+    ci = fit(data, start_date, end_date, intervention_date)
+    t2 = time.perf_counter()
+    summarize(ci)
+    t3 = time.perf_counter()
+    chart(ci)
+    t4 = time.perf_counter()
+
+    if timings is not None:
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            timings[stage].append(elapsed)
+
+
+def measure_memory(stages, dealer):
+    """Peak traced bytes and net allocated blocks per stage for one dealer"""
+    prepare, fit, summarize, chart = stages
+    dealer_data, start_date, end_date, intervention_date = dealer
+    results = {}
+    carried = {}
+
+    def traced(stage, func):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        value = func()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        allocations = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'lineno'))
+        results[stage] = {"peak_kib": peak / 1024, "allocations": allocations}
+        return value
+
+    carried['data'] = traced("prepare_data", lambda: prepare(dealer_data, start_date, end_date, intervention_date))
+    carried['ci'] = traced("run_causal_impact_analysis", lambda: fit(carried['data'], start_date, end_date, intervention_date))
+    traced("generate_impact_summary", lambda: summarize(carried['ci']))
+    traced("generate_impact_data_for_chart", lambda: chart(carried['ci']))
+    return results
+
+
+def benchmark(n_days, n_dealers, model, memory_samples, seed, input_format="lists", dtype="float64"):
+    rng = np.random.default_rng(seed)
+    dealers = [synthetic_dealer(rng, n_days, input_format) for _ in range(n_dealers)]
+    stages = make_stages(DealerImpactAnalyzer(dtype=dtype), model)
+
+    # Warm up imports and caches outside the measured region
+    run_pipeline(stages, dealers[0], None)
+
+    timings = {stage: [] for stage in STAGES}
+    wall_start = time.perf_counter()
+    for dealer in dealers:
+        run_pipeline(stages, dealer, timings)
+    wall_total = time.perf_counter() - wall_start
+
+    memory = [measure_memory(stages, dealer) for dealer in dealers[:memory_samples]]
+
+    result = {"days": n_days, "dealers": n_dealers, "model": model, "input": input_format, "dtype": dtype, "wall_s": wall_total, "stages": {}}
+    for stage in STAGES:
+        samples = np.array(timings[stage]) * 1000
+        result["stages"][stage] = {
+            "total_s": float(samples.sum() / 1000),
+            "mean_ms": float(samples.mean()),
+            "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)),
+            "peak_kib": float(max(m[stage]["peak_kib"] for m in memory)) if memory else None,
+            "allocations": int(np.mean([m[stage]["allocations"] for m in memory])) if memory else None
+        }
+    return result
+
+
+def environment_info(seed):
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print per-stage mean time ratios and return the number of regressions"""
+    def key(result):
+        return (result["days"], result["dealers"], result["model"], result.get("input", "lists"), result.get("dtype", "float64"))
+
+    baseline_by_key = {key(r): r for r in baseline["results"]}
+    regressions = 0
+    print(f"{'days':>6} {'dealers':>8} {'model':>12} {'stage':<32} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for result in current["results"]:
+        base = baseline_by_key.get(key(result))
+        if base is None:
+            continue
+        for stage in STAGES:
+            old = base["stages"][stage]["mean_ms"]
+            new = result["stages"][stage]["mean_ms"]
+            ratio = new / old if old else float('inf')
+            flag = " REGRESSION" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"{result['days']:>6} {result['dealers']:>8} {result['model']:>12} {stage:<32} {old:>10.3f} {new:>10.3f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=parse_int_list, default=[90, 365, 1825], help="Series lengths in days")
+    parser.add_argument("--dealers", type=parse_int_list, default=[1, 10, 100], help="Dealer counts (up to 10000)")
+    parser.add_argument("--model", choices=["causalimpact", "fast"], default="causalimpact",
+                        help="'causalimpact' runs run_causal_impact_analysis, 'fast' the closed-form impact_model fit")
+    parser.add_argument("--input", choices=["lists", "arrays", "frame"], default="lists",
+                        help="Shape of dealer_data passed to prepare_data")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64", help="DealerImpactAnalyzer storage dtype")
+    parser.add_argument("--memory-samples", type=int, default=3, help="Dealers traced for memory and allocations per case")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON to compare mean stage times against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Ratio above which a stage counts as a regression")
+    args = parser.parse_args()
+
+    report = {"environment": environment_info(args.seed), "results": []}
+    for n_days in args.days:
+        for n_dealers in args.dealers:
+            result = benchmark(n_days, n_dealers, args.model, args.memory_samples, args.seed, args.input, args.dtype)
+            report["results"].append(result)
+            stage_summary = ", ".join(f"{stage}={result['stages'][stage]['mean_ms']:.2f}ms" for stage in STAGES)
+            print(f"days={n_days} dealers={n_dealers} model={args.model} input={args.input} dtype={args.dtype} wall={result['wall_s']:.2f}s {stage_summary}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
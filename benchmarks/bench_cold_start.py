@@ -0,0 +1,111 @@
+"""
+Measure cold-start cost of each Python entry point
+
+Every entry point is imported in a fresh interpreter with `-X importtime`.
+The script reports import wall time and peak RSS per entry point (median
+over --runs), plus the slowest imports by cumulative time as an import-time
+profile.
+
+Usage:
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --runs 10 --top 15 --output cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# (name, working directory, module) -- Lambda handlers import `main` relative to their own directory
+ENTRY_POINTS = [
+    ("app", ".", "app"),
+    ("auth_service", "services/auth_service", "lambda_handler"),
+    ("report_service", "services/report_service", "lambda_handler"),
+    ("ai_agent_service", "services/ai_agent_service", "lambda_handler"),
+    ("dealer_service", "services/dealer_service", "lambda_handler"),
+    ("crm_service", "services/crm_service", "lambda_handler"),
+    ("analytics_service", "services/analytics_service", "lambda_handler"),
+    ("event_processor", "services/event_processor", "lambda_handler"),
+]
+
+CHILD = """
+import json, resource, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative microseconds} from -X importtime output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def run_once(workdir, module):
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # The services import their shared code as services.common, from the repository root
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.abspath(ROOT), env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(module=module)],
+        cwd=os.path.join(ROOT, workdir),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per entry point")
+    parser.add_argument("--only", help="Comma-separated entry point names")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    selected = set(args.only.split(",")) if args.only else None
+    report = {}
+    for name, workdir, module in ENTRY_POINTS:
+        if selected and name not in selected:
+            continue
+        try:
+            runs = [run_once(workdir, module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name}: failed ({e})")
+            report[name] = {"error": str(e)}
+            continue
+
+        imports = runs[-1]["imports"]
+        top = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        report[name] = {
+            "import_s": statistics.median(r["import_s"] for r in runs),
+            "max_rss_mib": statistics.median(r["max_rss_kib"] for r in runs) / 1024,
+            "slowest_imports_ms": {module_name: us / 1000 for module_name, us in top}
+        }
+
+        print(f"{name}: import {report[name]['import_s'] * 1000:.0f} ms, RSS {report[name]['max_rss_mib']:.1f} MiB")
+        for module_name, ms in report[name]["slowest_imports_ms"].items():
+            print(f"    {ms:8.1f} ms  {module_name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
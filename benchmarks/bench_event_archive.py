@@ -0,0 +1,120 @@
+"""
+Benchmark the analytics event archiver (pub/sub -> stream relay -> Postgres COPY)
+
+Publishes --events events across the archived channels from --publishers
+threads and measures end-to-end throughput until every event has been
+relayed into the event stream and archived by --archivers archivers in the
+same consumer group, plus their lag and flush statistics.
+
+Requires a running Redis (REDIS_HOST / REDIS_PORT) and Postgres (POSTGRES_*)
+with the schema loaded. The stream lives in --db, a scratch Redis database
+that is flushed first. Rows go to an UNLOGGED scratch copy of
+analytics_events (--table) that is created if missing and truncated first.
+
+Usage:
+    python benchmarks/bench_event_archive.py --events 200000
+    python benchmarks/bench_event_archive.py --events 500000 --batch-size 10000 --archivers 4 --output archive.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "analytics_service"))
+
+from event_archiver import ARCHIVE_CHANNELS, EventArchiver, connect_postgres  # noqa: E402
+from event_stream import ChannelRelay  # noqa: E402
+
+
+def prepare_table(table):
+    conn = connect_postgres()
+    try:
+        with conn.cursor() as cur:
+            # LIKE copies columns and defaults but not the foreign keys
+            cur.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {table} (LIKE analytics_events INCLUDING DEFAULTS)")
+            cur.execute(f"TRUNCATE {table}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def publish(client, start, stop):
+    pipe = client.pipeline(transaction=False)
+    for i in range(start, stop):
+        event = {"event_type": "report_generated", "report_id": str(i), "vin": f"1HGCM82633A{i % 1000000:06d}",
+                 "timestamp": datetime.utcnow().isoformat()}
+        pipe.publish(ARCHIVE_CHANNELS[i % len(ARCHIVE_CHANNELS)], json.dumps(event))
+        if len(pipe) >= 500:
+            pipe.execute()
+    pipe.execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--publishers", type=int, default=4)
+    parser.add_argument("--archivers", type=int, default=1, help="Archivers sharing the consumer group")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--table", default="analytics_events_bench")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--db", type=int, default=15, help="Scratch Redis database; it is flushed")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=os.getenv("REDIS_PORT", 6379), db=args.db, decode_responses=True)
+    client.flushdb()
+    prepare_table(args.table)
+
+    relay = ChannelRelay(client, ARCHIVE_CHANNELS)
+    archivers = [
+        EventArchiver(client, table=args.table, batch_size=args.batch_size, flush_interval=args.flush_interval,
+                      consumer=f"bench-{i}")
+        for i in range(args.archivers)
+    ]
+    relay.start()
+    for archiver in archivers:
+        archiver.start()
+    time.sleep(1.0)  # let the relay take the lock and subscribe
+
+    start = time.perf_counter()
+    step = -(-args.events // args.publishers)
+    publishers = [
+        threading.Thread(target=publish, args=(redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=os.getenv("REDIS_PORT", 6379)), i, min(i + step, args.events)))
+        for i in range(0, args.events, step)
+    ]
+    for thread in publishers:
+        thread.start()
+    for thread in publishers:
+        thread.join()
+    published = time.perf_counter() - start
+
+    max_lag = 0.0
+    archived = 0
+    while archived < args.events and time.perf_counter() - start < args.timeout:
+        max_lag = max([max_lag] + [archiver.lag_seconds for archiver in archivers])
+        archived = sum(archiver.archived for archiver in archivers)
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    relay.stop()
+    for archiver in archivers:
+        archiver.stop()
+
+    result = {"events": args.events, "relayed": relay.relayed, "archived": archived, "publish_s": published,
+              "total_s": elapsed, "events_per_s": archived / elapsed, "max_lag_s": max_lag,
+              "stats": [archiver.stats() for archiver in archivers]}
+    print(f"archived {archived}/{args.events} ({relay.relayed} relayed) in {elapsed:.2f}s "
+          f"({result['events_per_s']:.0f} events/s) by {args.archivers} archivers, max lag {max_lag:.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "result": result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark event processor throughput against batch size and concurrency
+
+Invokes the SQS handler with batches of lead_created events spread over
+--keys dealers (each dealer is one ordering key) and reports invocation time
+and records per second for every combination of --batch-sizes and
+--concurrency. Each record blocks for --io-ms before it is processed,
+standing in for the downstream calls a handler makes (CRM, notifications).
+Lead events write nothing to DynamoDB, so no AWS endpoint is needed.
+
+Usage:
+    python benchmarks/bench_event_concurrency.py
+    python benchmarks/bench_event_concurrency.py --batch-sizes 10,100 --concurrency 1,8,32 --keys 5 --output concurrency.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+# boto3 clients are created at import; no requests are made
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "event_processor"))
+
+import lambda_handler  # noqa: E402
+
+
+def make_event(batch_size, keys, rng):
+    return {"Records": [
+        {
+            "messageId": str(uuid.uuid4()),
+            "body": json.dumps({
+                "event_type": "lead_created",
+                "lead_id": str(uuid.uuid4()),
+                "dealer_id": f"dealer-{int(rng.integers(0, keys))}"
+            })
+        }
+        for _ in range(batch_size)
+    ]}
+
+
+def with_io(process_event, io_seconds):
+    def process(event_data, put_item=None):
+        time.sleep(io_seconds)
+        return process_event(event_data, put_item)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="10,100,1000", help="Comma-separated records per invocation")
+    parser.add_argument("--concurrency", default="1,4,8,16,32", help="Comma-separated thread counts")
+    parser.add_argument("--keys", type=int, default=200, help="Distinct dealer ids (ordering keys) per batch")
+    parser.add_argument("--io-ms", type=float, default=20.0, help="Simulated blocking I/O per record")
+    parser.add_argument("--invocations", type=int, default=5, help="Timed invocations per combination")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    lambda_handler.logger.setLevel("WARNING")
+    lambda_handler.process_event = with_io(lambda_handler.process_event, args.io_ms / 1000)
+    rng = np.random.default_rng(args.seed)
+
+    results = []
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            lambda_handler.MAX_CONCURRENCY = concurrency
+            samples = np.empty(args.invocations)
+            for i in range(args.invocations):
+                event = make_event(batch_size, args.keys, rng)
+                start = time.perf_counter()
+                failures = lambda_handler.handler(event, None)["batchItemFailures"]
+                samples[i] = time.perf_counter() - start
+                if failures:
+                    raise RuntimeError(f"{len(failures)} records failed")
+            result = {"batch_size": batch_size, "concurrency": concurrency,
+                      "p50_ms": float(np.percentile(samples, 50) * 1000),
+                      "records_per_second": float(batch_size / samples.mean())}
+            results.append(result)
+            print(f"{batch_size:>5} records x {concurrency:>3} threads: p50={result['p50_ms']:.0f}ms, "
+                  f"{result['records_per_second']:.0f} records/s", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "keys": args.keys, "io_ms": args.io_ms,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark analytics event ingestion throughput
+
+Measures events per second for one worker writing to Redis with:
+  legacy     four round trips per event (HINCRBY x2, HMSET, EXPIRE), as log_event used to
+  single     log_event, one pipelined round trip per event
+  batch      log_events, one pipelined round trip per --batch-size events
+  http       POST /analytics/events/batch through the FastAPI app in-process
+
+Requires a running Redis (REDIS_HOST / REDIS_PORT). Keys are written to
+--db, which should be a scratch database; --flush empties it afterwards.
+
+Usage:
+    python benchmarks/bench_event_ingest.py --events 20000 --batch-size 100
+    python benchmarks/bench_event_ingest.py --modes single,batch --batch-size 500 --output ingest.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "analytics_service"))
+
+import main as analytics  # noqa: E402
+
+MODES = ["legacy", "single", "batch", "http"]
+
+
+def make_events(n_events):
+    """Deterministic mix of event types and payloads"""
+    event_types = ["report_generated", "search", "lead_created", "page_view"]
+    return [
+        (event_types[i % len(event_types)], {"vin": f"1HGCM82633A{i % 1000000:06d}", "dealer_id": i % 500, "make": "Honda"})
+        for i in range(n_events)
+    ]
+
+
+def legacy_log_event(client, event_type, data):
+    """Previous log_event: one round trip per command"""
+    now = datetime.utcnow()
+    date_key = now.strftime("%Y-%m-%d")
+    hour_key = now.strftime("%H")
+    client.hincrby(f"analytics:daily:{date_key}", event_type, 1)
+    client.hincrby(f"analytics:hourly:{date_key}:{hour_key}", event_type, 1)
+    event_id = str(uuid.uuid4())
+    client.hset(f"analytics:event:{event_id}", mapping={
+        "id": event_id,
+        "type": event_type,
+        "timestamp": now.isoformat(),
+        "data": json.dumps(data)
+    })
+    client.expire(f"analytics:event:{event_id}", analytics.REDIS_EXPIRY)
+
+
+def run_mode(mode, events, batch_size, client):
+    batches = [events[i:i + batch_size] for i in range(0, len(events), batch_size)]
+
+    if mode == "http":
+        from fastapi.testclient import TestClient
+        http = TestClient(analytics.app)
+        headers = {"Authorization": "Bearer benchmark"}
+        payloads = [{"events": [{"event_type": t, "data": d} for t, d in batch]} for batch in batches]
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        for event_type, data in events:
+            legacy_log_event(client, event_type, data)
+    elif mode == "single":
+        for event_type, data in events:
+            analytics.log_event(event_type, data)
+    elif mode == "batch":
+        for batch in batches:
+            analytics.log_events(batch)
+    elif mode == "http":
+        for payload in payloads:
+            response = http.post("/analytics/events/batch", json=payload, headers=headers)
+            response.raise_for_status()
+    elapsed = time.perf_counter() - start
+
+    return {"mode": mode, "events": len(events), "batch_size": batch_size if mode in ("batch", "http") else 1,
+            "seconds": elapsed, "events_per_s": len(events) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated subset of " + ",".join(MODES))
+    parser.add_argument("--db", type=int, default=15, help="Redis database to write to")
+    parser.add_argument("--flush", action="store_true", help="FLUSHDB the benchmark database afterwards")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=os.getenv("REDIS_PORT", 6379), db=args.db, decode_responses=True)
+    client.ping()
+    analytics.redis_client = client
+
+    events = make_events(args.events)
+    results = []
+    for mode in args.modes.split(","):
+        result = run_mode(mode, events, min(args.batch_size, analytics.MAX_EVENT_BATCH), client)
+        results.append(result)
+        print(f"{mode:>7}: {result['events_per_s']:>10.0f} events/s ({result['seconds']:.2f}s, batch={result['batch_size']})", flush=True)
+
+    if args.flush:
+        client.flushdb()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
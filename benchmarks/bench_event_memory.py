@@ -0,0 +1,91 @@
+"""
+Compare Redis memory per million analytics events: per-event hashes vs stream
+
+  hashes   the previous layout, one `analytics:event:{uuid}` hash with a TTL per event
+  stream   entries appended to the `analytics:events` stream
+
+Each layout is written into an empty scratch database (--db, flushed before
+and after each run) and measured as the change in INFO used_memory,
+extrapolated to one million events.
+
+Usage:
+    python benchmarks/bench_event_memory.py --events 200000
+    python benchmarks/bench_event_memory.py --events 1000000 --output memory.json
+"""
+import argparse
+import json
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "analytics_service"))
+
+from event_stream import EVENT_STREAM, queue_stream_events  # noqa: E402
+
+REDIS_EXPIRY = 60 * 60 * 24 * 7
+CHUNK = 1000
+
+
+def make_events(n_events):
+    event_types = ["report_generated", "search", "lead_created", "page_view"]
+    return [
+        (event_types[i % len(event_types)], {"vin": f"1HGCM82633A{i % 1000000:06d}", "dealer_id": i % 500, "make": "Honda"})
+        for i in range(n_events)
+    ]
+
+
+def write_hashes(client, events):
+    for start in range(0, len(events), CHUNK):
+        pipe = client.pipeline(transaction=False)
+        now = datetime.utcnow().isoformat()
+        for event_type, data in events[start:start + CHUNK]:
+            event_id = str(uuid.uuid4())
+            pipe.hset(f"analytics:event:{event_id}", mapping={"id": event_id, "type": event_type, "timestamp": now, "data": json.dumps(data)})
+            pipe.expire(f"analytics:event:{event_id}", REDIS_EXPIRY)
+        pipe.execute()
+
+
+def write_stream(client, events):
+    for start in range(0, len(events), CHUNK):
+        pipe = client.pipeline(transaction=False)
+        queue_stream_events(pipe, events[start:start + CHUNK], datetime.utcnow())
+        pipe.execute()
+
+
+def measure(client, writer, events):
+    client.flushdb()
+    before = client.info("memory")["used_memory"]
+    writer(client, events)
+    after = client.info("memory")["used_memory"]
+    keys = client.dbsize()
+    client.flushdb()
+    used = after - before
+    return {"events": len(events), "keys": keys, "used_bytes": used, "bytes_per_event": used / len(events),
+            "mib_per_million": used / len(events) * 1_000_000 / (1024 * 1024)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--db", type=int, default=15, help="Scratch Redis database; it is flushed")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=os.getenv("REDIS_PORT", 6379), db=args.db, decode_responses=True)
+    events = make_events(args.events)
+
+    results = {"hashes": measure(client, write_hashes, events), "stream": measure(client, write_stream, events)}
+    for layout, result in results.items():
+        print(f"{layout:>7}: {result['bytes_per_event']:8.1f} B/event, {result['mib_per_million']:8.1f} MiB per million events ({result['keys']} keys)")
+    print(f"stream uses {results['stream']['used_bytes'] / results['hashes']['used_bytes']:.2%} of the hash layout ({EVENT_STREAM})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark the SQS event processor's DynamoDB writes per batch size
+
+Builds SQS events of report_generated messages at each --batch-sizes and
+times handler invocations two ways: "put_item" writes every record with its
+own PutItem as the processor used to, "batched" is the current handler,
+which buffers the invocation's writes and sends them with BatchWriteItem.
+
+Needs a local DynamoDB stand-in, e.g.
+    docker run -p 8010:8000 amazon/dynamodb-local
+The cache table is created there if it does not exist.
+
+Usage:
+    DYNAMODB_ENDPOINT_URL=http://localhost:8010 python benchmarks/bench_event_processor.py
+    DYNAMODB_ENDPOINT_URL=http://localhost:8010 python benchmarks/bench_event_processor.py --batch-sizes 10,100 --output event_processor.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+# DynamoDB Local accepts any credentials and region
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "event_processor"))
+
+import lambda_handler  # noqa: E402
+
+
+def ensure_table():
+    client = lambda_handler.dynamodb.meta.client
+    if lambda_handler.TABLE_NAME in client.list_tables()["TableNames"]:
+        return
+    client.create_table(
+        TableName=lambda_handler.TABLE_NAME,
+        AttributeDefinitions=[{"AttributeName": "key", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "key", "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST"
+    )
+    client.get_waiter("table_exists").wait(TableName=lambda_handler.TABLE_NAME)
+
+
+def make_event(batch_size):
+    return {"Records": [
+        {
+            "messageId": str(uuid.uuid4()),
+            "body": json.dumps({
+                "event_type": "report_generated",
+                "report_id": str(uuid.uuid4()),
+                "vin": "1HGCM82633A004352",
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        }
+        for _ in range(batch_size)
+    ]}
+
+
+def put_item_handler(event):
+    """The processor before write buffering: one PutItem per record"""
+    for record in event["Records"]:
+        lambda_handler.process_event(json.loads(record["body"]))
+
+
+def batched_handler(event):
+    failures = lambda_handler.handler(event, None)["batchItemFailures"]
+    if failures:
+        raise RuntimeError(f"{len(failures)} records failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="1,10,100,1000", help="Comma-separated records per invocation")
+    parser.add_argument("--invocations", type=int, default=20, help="Timed invocations per batch size and mode")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if not os.environ.get("DYNAMODB_ENDPOINT_URL"):
+        parser.error("set DYNAMODB_ENDPOINT_URL to a local DynamoDB endpoint")
+    ensure_table()
+
+    results = []
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        result = {"batch_size": batch_size}
+        for mode, run in (("put_item", put_item_handler), ("batched", batched_handler)):
+            run(make_event(batch_size))  # Warm up connections
+            samples = np.empty(args.invocations)
+            for i in range(args.invocations):
+                event = make_event(batch_size)
+                start = time.perf_counter()
+                run(event)
+                samples[i] = (time.perf_counter() - start) * 1000
+            result[mode] = {"p50_ms": float(np.percentile(samples, 50)), "p99_ms": float(np.percentile(samples, 99)),
+                            "records_per_second": float(batch_size * 1000 / samples.mean())}
+        results.append(result)
+        print(f"{batch_size:>5} records: put_item p50={result['put_item']['p50_ms']:.1f}ms, "
+              f"batched p50={result['batched']['p50_ms']:.1f}ms "
+              f"({result['put_item']['p50_ms'] / result['batched']['p50_ms']:.1f}x)", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "endpoint": os.environ["DYNAMODB_ENDPOINT_URL"],
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
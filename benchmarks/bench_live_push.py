@@ -0,0 +1,101 @@
+"""
+Benchmark WebSocket fan-out of live metric deltas in one worker
+
+Attaches --connections in-process subscribers (fake WebSockets that only
+count what they are sent) to a LiveHub spread over --dealers dealer topics
+plus the global topic, feeds --events events per push, and times how long
+one push takes to reduce, serialize and deliver to every subscriber. No
+network or Redis is involved, so this is the hub's own per-push CPU cost.
+
+Usage:
+    python benchmarks/bench_live_push.py --connections 1000,5000,10000
+    python benchmarks/bench_live_push.py --connections 10000 --dealers 2000 --output live_push.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from services.common.live_push import GLOBAL_TOPIC, LiveHub, dealer_topic  # noqa: E402
+
+
+class CountingWebSocket:
+    def __init__(self):
+        self.received = 0
+        self._closed = asyncio.Event()
+
+    async def send_text(self, text):
+        self.received += 1
+
+    async def receive(self):
+        await self._closed.wait()
+        return {"type": "websocket.disconnect"}
+
+    async def close(self, code=1000):
+        self._closed.set()
+
+
+async def run(connections, dealers, events, pushes, rng):
+    hub = LiveHub("localhost", 6379, ())
+    sockets = [CountingWebSocket() for _ in range(connections)]
+    # One in ten connections is an admin dashboard on the global topic, the rest are dealer dashboards
+    topics = [GLOBAL_TOPIC if i % 10 == 0 else dealer_topic(f"dealer-{i % dealers}") for i in range(connections)]
+    servers = [asyncio.create_task(hub.serve(ws, topic)) for ws, topic in zip(sockets, topics)]
+    await asyncio.sleep(0.1)
+
+    samples = np.empty(pushes)
+    for p in range(pushes):
+        event_dealers = rng.integers(0, dealers, events)
+        batch = [{"event_type": "lead_created", "dealer_id": f"dealer-{int(d)}", "lead_id": str(i), "status": "new"}
+                 for i, d in enumerate(event_dealers)]
+        start = time.perf_counter()
+        for event in batch:
+            hub._accumulate(event)
+        pending, hub._pending = hub._pending, {}
+        for topic, delta in pending.items():
+            hub._publish(topic, json.dumps(delta.payload(topic)))
+        await asyncio.sleep(0)  # let the sender tasks drain their queues
+        while any(not s.queue.empty() for subs in hub._subscribers.values() for s in subs):
+            await asyncio.sleep(0)
+        samples[p] = (time.perf_counter() - start) * 1000
+
+    delivered = sum(ws.received for ws in sockets) - connections  # minus the "subscribed" greetings
+    for ws in sockets:
+        await ws.close()
+    await asyncio.gather(*servers)
+    return {"connections": connections, "dealers": dealers, "events_per_push": events,
+            "p50_ms": float(np.percentile(samples, 50)), "p99_ms": float(np.percentile(samples, 99)),
+            "messages_delivered": delivered, "slow_clients_closed": hub.slow_clients}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", default="1000,5000,10000", help="Comma-separated connection counts")
+    parser.add_argument("--dealers", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=500, help="Events per push interval")
+    parser.add_argument("--pushes", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for connections in (int(c) for c in args.connections.split(",")):
+        result = asyncio.run(run(connections, args.dealers, args.events, args.pushes, np.random.default_rng(args.seed)))
+        results.append(result)
+        print(f"{connections:>6} connections: push p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms, "
+              f"{result['messages_delivered']} messages delivered", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
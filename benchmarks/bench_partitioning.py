@@ -0,0 +1,203 @@
+"""
+Benchmark monthly partitioning + BRIN against a single B-tree indexed table
+
+Loads the same synthetic analytics events (--rows spread evenly over
+--months, in time order as the archiver writes them) into two scratch
+schemas:
+
+    bench_heap  analytics_events as one table with B-tree indexes on
+                timestamp and (event_type, timestamp) - the old layout
+    bench_part  analytics_events partitioned by month with a BRIN index on
+                timestamp and a B-tree on (event_type, timestamp)
+
+and reports, for each layout:
+    - wall time and shared buffers touched (EXPLAIN ANALYZE, BUFFERS) for
+      the 1-day, 7-day and 30-day range queries the analytics service runs
+    - total index size
+    - time to remove the oldest month (DELETE vs DROP of its partition)
+
+Requires Postgres (POSTGRES_*) with the schema loaded, for the partition
+functions. The default of 100M rows needs roughly 20 GB of disk; use --rows
+for a quicker run.
+
+Usage:
+    python benchmarks/bench_partitioning.py --rows 10000000
+    python benchmarks/bench_partitioning.py --rows 100000000 --months 24 --output partitioning.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "analytics_service"))
+
+from event_archiver import connect_postgres  # noqa: E402
+
+EVENT_TYPES = ("report_generated", "search", "page_view", "lead_created", "message_sent")
+
+LAYOUTS = {
+    "bench_heap": """
+        CREATE TABLE {schema}.analytics_events (
+            id UUID NOT NULL,
+            event_type VARCHAR(50) NOT NULL,
+            user_id UUID,
+            dealer_id UUID,
+            data JSONB,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (id)
+        )
+    """,
+    "bench_part": """
+        CREATE TABLE {schema}.analytics_events (
+            id UUID NOT NULL,
+            event_type VARCHAR(50) NOT NULL,
+            user_id UUID,
+            dealer_id UUID,
+            data JSONB,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """
+}
+
+INDEXES = {
+    "bench_heap": [
+        "CREATE INDEX ON {schema}.analytics_events (timestamp)",
+        "CREATE INDEX ON {schema}.analytics_events (event_type, timestamp)"
+    ],
+    "bench_part": [
+        "CREATE INDEX ON {schema}.analytics_events USING BRIN (timestamp)",
+        "CREATE INDEX ON {schema}.analytics_events (event_type, timestamp)"
+    ]
+}
+
+# Queries over the most recent data, as the analytics dashboards issue them
+QUERIES = {
+    "1d_count": "SELECT count(*) FROM {schema}.analytics_events WHERE timestamp >= %(end)s - INTERVAL '1 day' AND timestamp < %(end)s",
+    "7d_by_type": "SELECT event_type, count(*) FROM {schema}.analytics_events WHERE timestamp >= %(end)s - INTERVAL '7 days' AND timestamp < %(end)s GROUP BY event_type",
+    "30d_one_type": "SELECT date_trunc('day', timestamp), count(*) FROM {schema}.analytics_events WHERE event_type = 'report_generated' AND timestamp >= %(end)s - INTERVAL '30 days' AND timestamp < %(end)s GROUP BY 1"
+}
+
+
+def load(conn, schema, rows, start, end):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(LAYOUTS[schema].format(schema=schema))
+        if schema == "bench_part":
+            cur.execute(f"SELECT create_monthly_partitions('{schema}.analytics_events'::regclass, 0, %s)", (start.date(),))
+        conn.commit()
+
+        started = time.perf_counter()
+        span = (end - start).total_seconds()
+        cur.execute(f"""
+            INSERT INTO {schema}.analytics_events (id, event_type, user_id, dealer_id, data, timestamp)
+            SELECT md5(i::text)::uuid,
+                   (%(types)s::text[])[1 + i %% %(n_types)s],
+                   NULL,
+                   md5((i %% 5000)::text)::uuid,
+                   jsonb_build_object('seq', i),
+                   %(start)s::timestamptz + (i * %(span)s / %(rows)s) * INTERVAL '1 second'
+            FROM generate_series(0, %(rows)s - 1) AS i
+        """, {"types": list(EVENT_TYPES), "n_types": len(EVENT_TYPES), "start": start, "span": span, "rows": rows})
+        load_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for statement in INDEXES[schema]:
+            cur.execute(statement.format(schema=schema))
+        index_s = time.perf_counter() - started
+        conn.commit()
+
+    # VACUUM cannot run inside a transaction block
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"VACUUM ANALYZE {schema}.analytics_events")
+    conn.autocommit = False
+    return {"load_s": load_s, "index_build_s": index_s}
+
+
+def index_size(conn, schema):
+    with conn.cursor() as cur:
+        # Partitioned indexes have no storage; sum the indexes of every table in the schema
+        cur.execute("""
+            SELECT COALESCE(sum(pg_relation_size(i.indexrelid)), 0)
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indrelid JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s
+        """, (schema,))
+        return int(cur.fetchone()[0])
+
+
+def explain(conn, schema, query, end, repeat):
+    timings = []
+    buffers = None
+    with conn.cursor() as cur:
+        for _ in range(repeat):
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.format(schema=schema), {"end": end})
+            plan = cur.fetchone()[0][0]
+            timings.append(plan["Execution Time"])
+            buffers = plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0)
+    conn.rollback()
+    timings.sort()
+    return {"median_ms": timings[len(timings) // 2], "min_ms": timings[0], "shared_buffers": buffers}
+
+
+def drop_oldest_month(conn, schema, start):
+    month_end = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        if schema == "bench_part":
+            cur.execute(f"DROP TABLE {schema}.analytics_events_{start.strftime('%Y_%m')}")
+        else:
+            cur.execute(f"DELETE FROM {schema}.analytics_events WHERE timestamp < %s", (month_end,))
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the median is reported")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schemas afterwards")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    # Whole UTC months ending at the start of the current month
+    end = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    start = end
+    for _ in range(args.months):
+        start = (start - timedelta(days=1)).replace(day=1)
+
+    conn = connect_postgres()
+    results = {}
+    try:
+        for schema in LAYOUTS:
+            print(f"loading {args.rows} rows into {schema}...")
+            result = load(conn, schema, args.rows, start, end)
+            result["index_bytes"] = index_size(conn, schema)
+            result["queries"] = {name: explain(conn, schema, query, end, args.repeat) for name, query in QUERIES.items()}
+            result["drop_oldest_month_s"] = drop_oldest_month(conn, schema, start)
+            results[schema] = result
+
+            print(f"  load {result['load_s']:.1f}s, index build {result['index_build_s']:.1f}s, "
+                  f"indexes {result['index_bytes'] / 2 ** 20:.1f} MB, drop oldest month {result['drop_oldest_month_s']:.2f}s")
+            for name, timing in result["queries"].items():
+                print(f"  {name:<14} {timing['median_ms']:9.2f} ms  {timing['shared_buffers']:>9} buffers")
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                for schema in LAYOUTS:
+                    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            conn.commit()
+        conn.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "rows": args.rows, "months": args.months,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
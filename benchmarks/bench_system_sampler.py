@@ -0,0 +1,66 @@
+"""
+Benchmark the cost of the analytics service's system metrics sampler
+
+Takes --samples samples back to back and reports CPU time and wall time per
+sample, then the CPU overhead that implies at each sampling interval
+(--intervals) as a percentage of one CPU. The budget is 0.5%.
+
+Usage:
+    python benchmarks/bench_system_sampler.py
+    python benchmarks/bench_system_sampler.py --samples 20000 --intervals 0.5,1,5 --output sampler.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "analytics_service"))
+
+from system_sampler import SAMPLE_INTERVAL, SystemSampler  # noqa: E402
+
+OVERHEAD_BUDGET_PERCENT = 0.5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--intervals", default=f"0.1,1,{SAMPLE_INTERVAL:g}", help="Comma-separated sampling intervals in seconds")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    sampler = SystemSampler()
+    sampler.sample()  # Prime the CPU counters
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    for _ in range(args.samples):
+        sampler.sample()
+    cpu_per_sample = (time.process_time() - cpu_started) / args.samples
+    wall_per_sample = (time.perf_counter() - wall_started) / args.samples
+
+    overhead = {}
+    for interval in (float(i) for i in args.intervals.split(",")):
+        overhead[f"{interval:g}s"] = 100.0 * cpu_per_sample / interval
+
+    result = {
+        "samples": args.samples,
+        "cgroup_version": sampler.cgroup_version,
+        "cpu_us_per_sample": cpu_per_sample * 1e6,
+        "wall_us_per_sample": wall_per_sample * 1e6,
+        "overhead_percent": overhead
+    }
+    print(f"{result['cpu_us_per_sample']:.1f} us CPU / {result['wall_us_per_sample']:.1f} us wall per sample "
+          f"(cgroup v{sampler.cgroup_version})")
+    for interval, percent in overhead.items():
+        verdict = "ok" if percent < OVERHEAD_BUDGET_PERCENT else "over budget"
+        print(f"  every {interval:>5}: {percent:.4f}% CPU ({verdict})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timestamp": datetime.utcnow().isoformat(), "result": result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 import pandas as pd
 import numpy as np
-from causalimpact import CausalImpact
 from datetime import datetime, timedelta
 import json
+from impact_model import CAUSALIMPACT_ESTIMATOR, IncrementalImpact, ImpactStateStore, update_impact_state
+from chart_encoding import encode_arrow, encode_columnar, lttb_indices
+from impact_robustness import run_robustness_checks
+
+SERIES_COLUMNS = ['leads', 'sales', 'baseline_sales']
 
 class DealerImpactAnalyzer:
-    def __init__(self):
-        pass
+    def __init__(self, dtype=np.float64):
+        """
+        Parameters:
+        -----------
+        dtype: numpy dtype
+            Storage dtype for prepared series. np.float32 halves the memory of
+            the prepared frame; model fits still accumulate in float64.
+        """
+        self.dtype = np.dtype(dtype)
     
     def prepare_data(self, dealer_data, start_date, end_date, intervention_date):
         """
@@ -14,8 +25,10 @@ class DealerImpactAnalyzer:
         
         Parameters:
         -----------
-        dealer_data: dict
+        dealer_data: dict or pd.DataFrame
             Dictionary containing 'dates', 'leads', 'sales', and 'baseline_sales'
+            as lists or NumPy arrays, or a DataFrame with a DatetimeIndex and
+            leads, sales and baseline_sales columns
         start_date: str
             Start date for analysis in format 'YYYY-MM-DD'
         end_date: str
@@ -28,26 +41,37 @@ class DealerImpactAnalyzer:
         pd.DataFrame
             DataFrame with dates as index and leads, sales, and baseline_sales as columns
         """
-        df = pd.DataFrame({
-            'date': pd.to_datetime(dealer_data['dates']),
-            'leads': dealer_data['leads'],
-            'sales': dealer_data['sales'],
-            'baseline_sales': dealer_data['baseline_sales']
-        })
-        
-        df.set_index('date', inplace=True)
-        df = df.sort_index()
-        
-        # Ensure we have data for the full date range
+        if isinstance(dealer_data, pd.DataFrame):
+            index = pd.DatetimeIndex(dealer_data.index)
+            if list(dealer_data.columns) == SERIES_COLUMNS and (dealer_data.dtypes == self.dtype).all():
+                df = dealer_data
+            else:
+                df = pd.DataFrame(dealer_data[SERIES_COLUMNS].to_numpy(dtype=self.dtype), index=index, columns=SERIES_COLUMNS)
+        else:
+            dates = dealer_data['dates']
+            index = dates if isinstance(dates, pd.DatetimeIndex) else pd.DatetimeIndex(pd.to_datetime(dates))
+            # One 2-D block in the target dtype instead of one array per column
+            values = np.empty((len(index), len(SERIES_COLUMNS)), dtype=self.dtype)
+            for i, column in enumerate(SERIES_COLUMNS):
+                values[:, i] = dealer_data[column]
+            df = pd.DataFrame(values, index=index, columns=SERIES_COLUMNS, copy=False)
+        
+        # Dense, ordered input that already spans the range is used as-is
         date_range = pd.date_range(start=start_date, end=end_date)
-        df = df.reindex(date_range)
+        if not df.index.equals(date_range):
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index()
+            
+            # Ensure we have data for the full date range
+            df = df.reindex(date_range)
         
         # Fill missing values with interpolation
-        df = df.interpolate(method='linear')
+        if df.isna().to_numpy().any():
+            df = df.interpolate(method='linear')
         
         return df
     
-    def run_causal_impact_analysis(self, data, pre_period, post_period):
+    def run_causal_impact_analysis(self, data, pre_period, post_period, controls=None):
         """
         Run causal impact analysis
         
@@ -59,24 +83,44 @@ class DealerImpactAnalyzer:
             List of two dates [start_date, intervention_date - 1 day]
         post_period: list
             List of two dates [intervention_date, end_date]
+        controls: pd.DataFrame, optional
+            Peer dealer sales aligned to data.index (see PeerControlSelector),
+            used as covariates x1..xk instead of baseline_sales
             
         Returns:
         --------
         CausalImpact
             CausalImpact object with analysis results
         """
-        # Prepare data for CausalImpact
-        impact_data = pd.DataFrame({
-            'y': data['sales'],
-            'x1': data['baseline_sales']
-        })
+        # Imported here so the closed-form paths never load statsmodels
+        from causalimpact import CausalImpact
+        
+        # Prepare data for CausalImpact. When sales and baseline_sales are
+        # adjacent (as prepare_data lays them out) a positional slice avoids
+        # copying them into a new frame.
+        columns = list(data.columns)
+        if controls is not None and len(controls.columns):
+            impact_data = pd.concat([data['sales'].rename('y'), controls], axis=1)
+        elif columns[1:3] == ['sales', 'baseline_sales']:
+            impact_data = data.iloc[:, 1:3].set_axis(['y', 'x1'], axis=1)
+        else:
+            impact_data = pd.DataFrame({
+                'y': data['sales'],
+                'x1': data['baseline_sales']
+            })
         
         # Run causal impact analysis
         ci = CausalImpact(impact_data, pre_period, post_period)
         
         return ci
     
-    def generate_impact_summary(self, ci, average_order_value, average_margin):
+    def _covariates(self, data, controls):
+        """Covariate matrix for the closed-form paths: peer controls when given, else baseline_sales"""
+        if controls is not None and len(controls.columns):
+            return controls.reindex(data.index, fill_value=0).to_numpy(dtype=np.float64)
+        return data['baseline_sales'].to_numpy()
+    
+    def generate_impact_summary(self, ci, average_order_value, average_margin, robustness=None):
         """
         Generate a summary of the causal impact analysis
         
@@ -88,6 +132,8 @@ class DealerImpactAnalyzer:
             Average order value for the dealer
         average_margin: float
             Average margin per sale for the dealer
+        robustness: dict, optional
+            Result of run_robustness_checks to include in the summary
             
         Returns:
         --------
@@ -123,12 +169,25 @@ class DealerImpactAnalyzer:
             "average_order_value": float(average_order_value),
             "average_margin": float(average_margin),
             "p_value": float(summary_data.loc["average", "p"]),
-            "is_statistically_significant": float(summary_data.loc["average", "p"]) < 0.05
+            # 95% interval of additional_sales_from_carreport, from the same model
+            "additional_sales_interval": [
+                float(summary_data.loc["lower", "abs_effect"]) * len(ci.params["post_period_response"]),
+                float(summary_data.loc["upper", "abs_effect"]) * len(ci.params["post_period_response"])
+            ],
+            "is_statistically_significant": float(summary_data.loc["average", "p"]) < 0.05,
+            # Which model produced the counterfactual; compare results only within one estimator
+            "estimator": ci.estimator if isinstance(ci, IncrementalImpact) else CAUSALIMPACT_ESTIMATOR
         }
         
+        if robustness is not None:
+            # The placebo test and bootstrap always fit OLS; their point estimate and
+            # interval are reported together under robustness, labelled with that estimator
+            summary["placebo_p_value"] = robustness["placebo_p_value"]
+            summary["robustness"] = robustness
+        
         return summary
     
-    def generate_impact_data_for_chart(self, ci):
+    def generate_impact_data_for_chart(self, ci, max_points=None, encoding="json"):
         """
         Generate data for charting the causal impact
         
@@ -136,41 +195,60 @@ class DealerImpactAnalyzer:
         -----------
         ci: CausalImpact
             CausalImpact object with analysis results
+        max_points: int, optional
+            Target number of points, at least 3. Longer windows are
+            downsampled with LTTB on the actual and predicted series; the
+            intervention date is always kept.
+        encoding: str
+            'json' for lists, 'columnar' for base64 epoch-day offsets and
+            float32 arrays, or 'arrow' for Arrow IPC stream bytes
             
         Returns:
         --------
-        dict
-            Dictionary with data for charts
+        dict or bytes
+            Dictionary with data for charts, or Arrow IPC bytes
         """
         # Extract data from the causal impact analysis
         data = ci.data
+        intervention_date = ci.params["pre_period"][1]
+        
+        # Pick the points to keep before converting anything for serialization
+        if max_points and len(data) > max_points:
+            # LTTB keeps every point when asked for fewer than 3, so each series gets at least 3
+            half = max(max_points // 2, 3)
+            rest = max(max_points - half, 3)
+            intervention_idx = min(int(data.index.searchsorted(pd.Timestamp(intervention_date))), len(data) - 1)
+            indices = np.union1d(
+                lttb_indices(data['y'].to_numpy(), half),
+                lttb_indices(data['preds'].to_numpy(), rest)
+            )
+            indices = np.union1d(indices, [intervention_idx])
+            data = data.iloc[indices]
+        
+        columns = {
+            "actual": data['y'].to_numpy(),
+            "predicted": data['preds'].to_numpy(),
+            "lower_bound": data['preds_lower'].to_numpy(),
+            "upper_bound": data['preds_upper'].to_numpy(),
+            "point_effects": data['point_effects'].to_numpy(),
+            "cumulative_effects": data['cum_effects'].to_numpy()
+        }
+        
+        if encoding in ("columnar", "arrow"):
+            epoch_days = data.index.values.astype('datetime64[D]').astype(np.int64)
+            if encoding == "arrow":
+                return encode_arrow(epoch_days, columns, intervention_date)
+            return encode_columnar(epoch_days, columns, intervention_date)
         
         # Convert to lists for JSON serialization
-        dates = data.index.strftime('%Y-%m-%d').tolist()
-        actual = data['y'].tolist()
-        predicted = data['preds'].tolist()
-        point_effects = data['point_effects'].tolist()
-        cumulative_effects = data['cum_effects'].tolist()
-        
-        # Get confidence intervals
-        lower_bound = data['preds_lower'].tolist()
-        upper_bound = data['preds_upper'].tolist()
-        
-        # Create chart data dictionary
-        chart_data = {
-            "dates": dates,
-            "actual": actual,
-            "predicted": predicted,
-            "lower_bound": lower_bound,
-            "upper_bound": upper_bound,
-            "point_effects": point_effects,
-            "cumulative_effects": cumulative_effects,
-            "intervention_date": ci.params["pre_period"][1]
-        }
+        chart_data = {"dates": data.index.strftime('%Y-%m-%d').tolist()}
+        for name, values in columns.items():
+            chart_data[name] = values.tolist()
+        chart_data["intervention_date"] = intervention_date
         
         return chart_data
     
-    def analyze_dealer_impact(self, dealer_data, start_date, end_date, intervention_date, average_order_value, average_margin):
+    def analyze_dealer_impact(self, dealer_data, start_date, end_date, intervention_date, average_order_value, average_margin, max_chart_points=None, chart_encoding="json", robustness_checks=False, controls=None):
         """
         Analyze the causal impact of CarReport on dealer sales
         
@@ -188,6 +266,14 @@ class DealerImpactAnalyzer:
             Average order value for the dealer
         average_margin: float
             Average margin per sale for the dealer
+        max_chart_points: int, optional
+            Target number of chart points, see generate_impact_data_for_chart
+        chart_encoding: str
+            Chart payload encoding, see generate_impact_data_for_chart
+        robustness_checks: bool
+            Run the placebo test and bootstrap and add them to the summary
+        controls: pd.DataFrame, optional
+            Peer dealer sales used as covariates, see run_causal_impact_analysis
             
         Returns:
         --------
@@ -202,11 +288,15 @@ class DealerImpactAnalyzer:
         post_period = [intervention_date, end_date]
         
         # Run causal impact analysis
-        ci = self.run_causal_impact_analysis(data, pre_period, post_period)
+        ci = self.run_causal_impact_analysis(data, pre_period, post_period, controls)
+        
+        robustness = None
+        if robustness_checks:
+            robustness = run_robustness_checks(data.index, data['sales'].to_numpy(), self._covariates(data, controls), intervention_date)
         
         # Generate summary and chart data
-        summary = self.generate_impact_summary(ci, average_order_value, average_margin)
-        chart_data = self.generate_impact_data_for_chart(ci)
+        summary = self.generate_impact_summary(ci, average_order_value, average_margin, robustness)
+        chart_data = self.generate_impact_data_for_chart(ci, max_chart_points, chart_encoding)
         
         # Combine results
         result = {
@@ -216,7 +306,81 @@ class DealerImpactAnalyzer:
         }
         
         return result
-    
+
+    def update_dealer_impact(self, dealer_id, dealer_data, start_date, end_date, intervention_date, average_order_value, average_margin, state_store=None, max_chart_points=None, chart_encoding="json", robustness_checks=False, controls=None):
+        """
+        Incrementally update the impact analysis for a dealer
+
+        The fitted pre-period state is persisted per dealer and intervention
+        date. While the pre-period data is unchanged, new post-period days are
+        appended and scored without refitting; a full refit only happens when
+        the pre-period changes.
+
+        The counterfactual is an OLS regression on the covariates, not the
+        structural time series model of analyze_dealer_impact, so the two
+        give different estimates for the same data. The summary reports
+        `estimator` as "ols" (analyze_dealer_impact reports "causalimpact").
+
+        Parameters:
+        -----------
+        dealer_id: str
+            Dealer identifier used as the state key
+        dealer_data: dict
+            Dictionary containing 'dates', 'leads', 'sales', and 'baseline_sales'
+        start_date: str
+            Start date for analysis in format 'YYYY-MM-DD'
+        end_date: str
+            End date for analysis in format 'YYYY-MM-DD'
+        intervention_date: str
+            Date when CarReport integration started in format 'YYYY-MM-DD'
+        average_order_value: float
+            Average order value for the dealer
+        average_margin: float
+            Average margin per sale for the dealer
+        state_store: ImpactStateStore, optional
+            Where fitted states are persisted; defaults to IMPACT_STATE_DIR
+        max_chart_points: int, optional
+            Target number of chart points, see generate_impact_data_for_chart
+        chart_encoding: str
+            Chart payload encoding, see generate_impact_data_for_chart
+        robustness_checks: bool
+            Run the placebo test and bootstrap and add them to the summary
+        controls: pd.DataFrame, optional
+            Peer dealer sales used as covariates, see run_causal_impact_analysis
+
+        Returns:
+        --------
+        dict
+            Dictionary with summary and chart data in the layout of analyze_dealer_impact
+        """
+        state_store = state_store or ImpactStateStore()
+        data = self.prepare_data(dealer_data, start_date, end_date, intervention_date)
+
+        state = state_store.load(dealer_id, intervention_date)
+        state = update_impact_state(
+            state,
+            dealer_id,
+            intervention_date,
+            data.index,
+            data['sales'].to_numpy(),
+            self._covariates(data, controls)
+        )
+        state_store.save(state)
+
+        robustness = None
+        if robustness_checks:
+            robustness = run_robustness_checks(data.index, data['sales'].to_numpy(), self._covariates(data, controls), intervention_date)
+
+        ci = state.to_result()
+        summary = self.generate_impact_summary(ci, average_order_value, average_margin, robustness)
+        chart_data = self.generate_impact_data_for_chart(ci, max_chart_points, chart_encoding)
+
+        return {
+            "summary": summary,
+            "chart_data": chart_data,
+            "report_text": self.generate_report_text(summary, intervention_date, end_date)
+        }
+
     def generate_report_text(self, summary, intervention_date, end_date):
         """
         Generate a human-readable report text
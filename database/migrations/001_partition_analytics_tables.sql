@@ -0,0 +1,198 @@
+-- Monthly range partitioning for analytics_events and api_metrics
+--
+-- Both tables become declaratively partitioned by month on "timestamp".
+-- Range scans then only touch the months they need, retention drops whole
+-- partitions instead of running DELETE, and BRIN indexes replace the
+-- B-tree timestamp indexes (rows arrive in time order, so a BRIN summary
+-- per block range is a few KB instead of a multi-GB B-tree).
+--
+-- Partitions are created ahead of time by create_monthly_partitions();
+-- the analytics event archiver calls it daily, and it can also be scheduled
+-- with pg_cron:
+--   SELECT cron.schedule('0 0 * * *', $$SELECT create_monthly_partitions('analytics_events'), create_monthly_partitions('api_metrics')$$);
+-- A DEFAULT partition catches rows outside the created months; when a month
+-- is created later, its rows are moved out of DEFAULT. A month that cannot be
+-- created is skipped with a WARNING and retried on the next run.
+--
+-- Retention:
+--   SELECT drop_old_partitions('analytics_events', 24);  -- keep 24 months
+
+BEGIN;
+
+-- Partition maintenance -------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(
+    parent REGCLASS,
+    months_ahead INTEGER DEFAULT 3,
+    from_month DATE DEFAULT date_trunc('month', now() AT TIME ZONE 'UTC')::date
+) RETURNS INTEGER AS $$
+DECLARE
+    parent_schema TEXT;
+    parent_name TEXT;
+    key_column TEXT;
+    default_partition REGCLASS;
+    month_start DATE;
+    last_month DATE;
+    lower_bound TIMESTAMPTZ;
+    upper_bound TIMESTAMPTZ;
+    partition_name TEXT;
+    has_rows BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    SELECT n.nspname, c.relname INTO parent_schema, parent_name
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.oid = parent;
+
+    SELECT a.attname, NULLIF(p.partdefid, 0)::regclass INTO key_column, default_partition
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = parent;
+
+    month_start := date_trunc('month', from_month)::date;
+    last_month := (date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => months_ahead))::date;
+
+    WHILE month_start <= last_month LOOP
+        partition_name := parent_name || '_' || to_char(month_start, 'YYYY_MM');
+        -- Month boundaries are UTC
+        lower_bound := month_start::timestamp AT TIME ZONE 'UTC';
+        upper_bound := (month_start + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+
+        IF to_regclass(format('%I.%I', parent_schema, partition_name)) IS NULL THEN
+            -- One subtransaction per month, so a failure skips that month instead of the whole run
+            BEGIN
+                has_rows := FALSE;
+                IF default_partition IS NOT NULL THEN
+                    EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s WHERE %I >= %L AND %I < %L)',
+                                   default_partition, key_column, lower_bound, key_column, upper_bound)
+                    INTO has_rows;
+                END IF;
+
+                IF has_rows THEN
+                    -- Postgres refuses to create a partition whose range has rows in DEFAULT:
+                    -- detach DEFAULT, create the month, move its rows over and re-attach
+                    EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', parent, default_partition);
+                END IF;
+
+                EXECUTE format(
+                    'CREATE TABLE %I.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                    parent_schema, partition_name, parent, lower_bound, upper_bound
+                );
+
+                IF has_rows THEN
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING *) '
+                        'INSERT INTO %I.%I SELECT * FROM moved',
+                        default_partition, key_column, lower_bound, key_column, upper_bound,
+                        parent_schema, partition_name
+                    );
+                    EXECUTE format('ALTER TABLE %s ATTACH PARTITION %s DEFAULT', parent, default_partition);
+                END IF;
+
+                created := created + 1;
+            EXCEPTION WHEN OTHERS THEN
+                RAISE WARNING 'create_monthly_partitions: could not create %.%: % (%)',
+                    parent_schema, partition_name, SQLERRM, SQLSTATE;
+            END;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION drop_old_partitions(
+    parent REGCLASS,
+    keep_months INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => keep_months))::date;
+    child RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    -- Monthly partitions are named <parent>_YYYY_MM; the DEFAULT partition is never dropped
+    FOR child IN
+        SELECT c.oid::regclass AS relation, c.relname
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent AND c.relname ~ '_[0-9]{4}_[0-9]{2}$'
+    LOOP
+        IF to_date(right(child.relname, 7), 'YYYY_MM') < cutoff THEN
+            EXECUTE format('DROP TABLE %s', child.relation);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- analytics_events ------------------------------------------------------------
+
+ALTER TABLE analytics_events RENAME TO analytics_events_unpartitioned;
+ALTER TABLE analytics_events_unpartitioned RENAME CONSTRAINT analytics_events_pkey TO analytics_events_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_analytics_events_event_type;
+DROP INDEX IF EXISTS idx_analytics_events_timestamp;
+DROP INDEX IF EXISTS idx_analytics_events_dealer_timestamp;
+
+-- The partition key has to be part of the primary key
+CREATE TABLE analytics_events (
+    id UUID NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    user_id UUID REFERENCES users(id),
+    dealer_id UUID REFERENCES dealers(id),
+    data JSONB,
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE analytics_events_default PARTITION OF analytics_events DEFAULT;
+SELECT create_monthly_partitions(
+    'analytics_events',
+    3,
+    (SELECT COALESCE(min(timestamp), now())::date FROM analytics_events_unpartitioned)
+);
+
+INSERT INTO analytics_events (id, event_type, user_id, dealer_id, data, timestamp)
+SELECT id, event_type, user_id, dealer_id, data, COALESCE(timestamp, now())
+FROM analytics_events_unpartitioned;
+
+DROP TABLE analytics_events_unpartitioned;
+
+CREATE INDEX idx_analytics_events_timestamp_brin ON analytics_events USING BRIN (timestamp);
+CREATE INDEX idx_analytics_events_event_type_timestamp ON analytics_events(event_type, timestamp);
+CREATE INDEX idx_analytics_events_dealer_timestamp ON analytics_events(dealer_id, timestamp);
+
+-- api_metrics -----------------------------------------------------------------
+
+ALTER TABLE api_metrics RENAME TO api_metrics_unpartitioned;
+ALTER TABLE api_metrics_unpartitioned RENAME CONSTRAINT api_metrics_pkey TO api_metrics_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_api_metrics_endpoint;
+DROP INDEX IF EXISTS idx_api_metrics_timestamp;
+
+CREATE TABLE api_metrics (
+    id UUID NOT NULL,
+    endpoint VARCHAR(255) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    status_code INTEGER NOT NULL,
+    response_time INTEGER NOT NULL, -- in milliseconds
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE api_metrics_default PARTITION OF api_metrics DEFAULT;
+SELECT create_monthly_partitions(
+    'api_metrics',
+    3,
+    (SELECT COALESCE(min(timestamp), now())::date FROM api_metrics_unpartitioned)
+);
+
+INSERT INTO api_metrics (id, endpoint, method, status_code, response_time, timestamp)
+SELECT id, endpoint, method, status_code, response_time, COALESCE(timestamp, now())
+FROM api_metrics_unpartitioned;
+
+DROP TABLE api_metrics_unpartitioned;
+
+CREATE INDEX idx_api_metrics_timestamp_brin ON api_metrics USING BRIN (timestamp);
+CREATE INDEX idx_api_metrics_endpoint_timestamp ON api_metrics(endpoint, timestamp);
+
+COMMIT;
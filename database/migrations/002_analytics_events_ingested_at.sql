@@ -0,0 +1,22 @@
+-- Insert time for analytics_events
+--
+-- The Parquet export (analytics_export.py) advances its events watermark on
+-- ingested_at instead of the event's own timestamp. Client timestamps and
+-- archiver backlogs can put rows far behind a timestamp watermark, and
+-- those rows were never exported; every row is inserted after the previous
+-- ingested_at watermark, whatever its timestamp.
+--
+-- Existing rows take their event timestamp, so an export watermark written
+-- before this migration stays valid and nothing is exported twice.
+
+BEGIN;
+
+ALTER TABLE analytics_events ADD COLUMN ingested_at TIMESTAMP WITH TIME ZONE;
+UPDATE analytics_events SET ingested_at = timestamp;
+ALTER TABLE analytics_events ALTER COLUMN ingested_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE analytics_events ALTER COLUMN ingested_at SET NOT NULL;
+
+-- Rows arrive in ingested_at order, so a BRIN summary is enough
+CREATE INDEX idx_analytics_events_ingested_at_brin ON analytics_events USING BRIN (ingested_at);
+
+COMMIT;
@@ -222,34 +222,158 @@ CREATE TABLE crm_sync_logs (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
--- Analytics Events
+-- Monthly partition maintenance for the append-only analytics tables.
+-- create_monthly_partitions() creates <table>_YYYY_MM partitions (UTC months)
+-- through `months_ahead` months from now, moving any rows for a new month out
+-- of the DEFAULT partition; the event archiver runs it daily.
+-- drop_old_partitions() implements retention by dropping whole months.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(
+    parent REGCLASS,
+    months_ahead INTEGER DEFAULT 3,
+    from_month DATE DEFAULT date_trunc('month', now() AT TIME ZONE 'UTC')::date
+) RETURNS INTEGER AS $$
+DECLARE
+    parent_schema TEXT;
+    parent_name TEXT;
+    key_column TEXT;
+    default_partition REGCLASS;
+    month_start DATE;
+    last_month DATE;
+    lower_bound TIMESTAMPTZ;
+    upper_bound TIMESTAMPTZ;
+    partition_name TEXT;
+    has_rows BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    SELECT n.nspname, c.relname INTO parent_schema, parent_name
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.oid = parent;
+
+    SELECT a.attname, NULLIF(p.partdefid, 0)::regclass INTO key_column, default_partition
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = parent;
+
+    month_start := date_trunc('month', from_month)::date;
+    last_month := (date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => months_ahead))::date;
+
+    WHILE month_start <= last_month LOOP
+        partition_name := parent_name || '_' || to_char(month_start, 'YYYY_MM');
+        -- Month boundaries are UTC
+        lower_bound := month_start::timestamp AT TIME ZONE 'UTC';
+        upper_bound := (month_start + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+
+        IF to_regclass(format('%I.%I', parent_schema, partition_name)) IS NULL THEN
+            -- One subtransaction per month, so a failure skips that month instead of the whole run
+            BEGIN
+                has_rows := FALSE;
+                IF default_partition IS NOT NULL THEN
+                    EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s WHERE %I >= %L AND %I < %L)',
+                                   default_partition, key_column, lower_bound, key_column, upper_bound)
+                    INTO has_rows;
+                END IF;
+
+                IF has_rows THEN
+                    -- Postgres refuses to create a partition whose range has rows in DEFAULT:
+                    -- detach DEFAULT, create the month, move its rows over and re-attach
+                    EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', parent, default_partition);
+                END IF;
+
+                EXECUTE format(
+                    'CREATE TABLE %I.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                    parent_schema, partition_name, parent, lower_bound, upper_bound
+                );
+
+                IF has_rows THEN
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING *) '
+                        'INSERT INTO %I.%I SELECT * FROM moved',
+                        default_partition, key_column, lower_bound, key_column, upper_bound,
+                        parent_schema, partition_name
+                    );
+                    EXECUTE format('ALTER TABLE %s ATTACH PARTITION %s DEFAULT', parent, default_partition);
+                END IF;
+
+                created := created + 1;
+            EXCEPTION WHEN OTHERS THEN
+                RAISE WARNING 'create_monthly_partitions: could not create %.%: % (%)',
+                    parent_schema, partition_name, SQLERRM, SQLSTATE;
+            END;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION drop_old_partitions(
+    parent REGCLASS,
+    keep_months INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => keep_months))::date;
+    child RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    -- Monthly partitions are named <parent>_YYYY_MM; the DEFAULT partition is never dropped
+    FOR child IN
+        SELECT c.oid::regclass AS relation, c.relname
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent AND c.relname ~ '_[0-9]{4}_[0-9]{2}$'
+    LOOP
+        IF to_date(right(child.relname, 7), 'YYYY_MM') < cutoff THEN
+            EXECUTE format('DROP TABLE %s', child.relation);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Analytics Events (partitioned by month; the partition key is part of the primary key)
 CREATE TABLE analytics_events (
-    id UUID PRIMARY KEY,
+    id UUID NOT NULL,
     event_type VARCHAR(50) NOT NULL,
     user_id UUID REFERENCES users(id),
     dealer_id UUID REFERENCES dealers(id),
     data JSONB,
-    timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ingested_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP, -- insert time; the Parquet export's watermark
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
 
--- API Metrics
+CREATE TABLE analytics_events_default PARTITION OF analytics_events DEFAULT;
+SELECT create_monthly_partitions('analytics_events');
+
+-- API Metrics (partitioned by month)
 CREATE TABLE api_metrics (
-    id UUID PRIMARY KEY,
+    id UUID NOT NULL,
     endpoint VARCHAR(255) NOT NULL,
     method VARCHAR(10) NOT NULL,
     status_code INTEGER NOT NULL,
     response_time INTEGER NOT NULL, -- in milliseconds
-    timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE api_metrics_default PARTITION OF api_metrics DEFAULT;
+SELECT create_monthly_partitions('api_metrics');
 
 -- Create indexes for performance
 CREATE INDEX idx_vehicles_vin ON vehicles(vin);
 CREATE INDEX idx_reports_vin ON reports(vin);
 CREATE INDEX idx_reports_user_id ON reports(user_id);
 CREATE INDEX idx_leads_dealer_id ON leads(dealer_id);
+-- Covering index for the daily per-dealer leads/sales aggregation
+CREATE INDEX idx_leads_dealer_created_status ON leads(dealer_id, created_at, status);
 CREATE INDEX idx_messages_conversation_id ON messages(conversation_id);
-CREATE INDEX idx_analytics_events_event_type ON analytics_events(event_type);
-CREATE INDEX idx_analytics_events_timestamp ON analytics_events(timestamp);
-CREATE INDEX idx_api_metrics_endpoint ON api_metrics(endpoint);
-CREATE INDEX idx_api_metrics_timestamp ON api_metrics(timestamp);
+-- Rows arrive in time order, so BRIN covers time range scans at a fraction of a B-tree's size
+CREATE INDEX idx_analytics_events_timestamp_brin ON analytics_events USING BRIN (timestamp);
+CREATE INDEX idx_analytics_events_ingested_at_brin ON analytics_events USING BRIN (ingested_at);
+CREATE INDEX idx_analytics_events_event_type_timestamp ON analytics_events(event_type, timestamp);
+CREATE INDEX idx_analytics_events_dealer_timestamp ON analytics_events(dealer_id, timestamp);
+CREATE INDEX idx_api_metrics_timestamp_brin ON api_metrics USING BRIN (timestamp);
+CREATE INDEX idx_api_metrics_endpoint_timestamp ON api_metrics(endpoint, timestamp);
 
@@ -0,0 +1,240 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+# One round trip per dealer: leads/sales and analytics events are bucketed by
+# UTC day inside Postgres and merged with a single outer GROUP BY. The leads
+# branch is answered from idx_leads_dealer_created_status (index-only scan).
+DAILY_SERIES_QUERY = """
+SELECT day, SUM(leads) AS leads, SUM(sales) AS sales, SUM(events) AS events
+FROM (
+    SELECT (created_at AT TIME ZONE 'UTC')::date AS day,
+           COUNT(*) AS leads,
+           COUNT(*) FILTER (WHERE status = 'sold') AS sales,
+           0 AS events
+    FROM leads
+    WHERE dealer_id = %(dealer_id)s
+      AND created_at >= %(start)s
+      AND created_at < %(end)s
+    GROUP BY 1
+    UNION ALL
+    SELECT (timestamp AT TIME ZONE 'UTC')::date AS day,
+           0 AS leads,
+           0 AS sales,
+           COUNT(*) AS events
+    FROM analytics_events
+    WHERE dealer_id = %(dealer_id)s
+      AND timestamp >= %(start)s
+      AND timestamp < %(end)s
+    GROUP BY 1
+) daily
+GROUP BY day
+ORDER BY day
+"""
+
+SERIES_COLUMNS = ['leads', 'sales', 'events']
+
+# Daily sold-lead counts for every dealer in the target dealer's state that had
+# not integrated CarReport by the end of the window, in one grouped query
+PEER_SALES_QUERY = """
+SELECT l.dealer_id, (l.created_at AT TIME ZONE 'UTC')::date AS day, COUNT(*) AS sales
+FROM leads l
+JOIN dealers d ON d.id = l.dealer_id
+WHERE d.state = (SELECT state FROM dealers WHERE id = %(dealer_id)s)
+  AND d.id <> %(dealer_id)s
+  AND NOT EXISTS (
+      SELECT 1 FROM dealer_subscriptions s
+      WHERE s.dealer_id = d.id AND s.start_date < %(end)s
+  )
+  AND l.status = 'sold'
+  AND l.created_at >= %(start)s
+  AND l.created_at < %(end)s
+  AND (%(peer_ids)s::uuid[] IS NULL OR l.dealer_id = ANY(%(peer_ids)s::uuid[]))
+GROUP BY 1, 2
+"""
+
+
+def connect():
+    """Open a Postgres connection using the standard service environment variables"""
+    return psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=os.getenv("POSTGRES_PORT", 5432),
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", "postgres"),
+        dbname=os.getenv("POSTGRES_DB", "carreport")
+    )
+
+
+class DealerDataLoader:
+    def __init__(self, connection_factory=None):
+        """
+        Load daily dealer time series from Postgres
+
+        Parameters:
+        -----------
+        connection_factory: callable, optional
+            Returns a DB-API connection; defaults to `connect`
+        """
+        self.connection_factory = connection_factory or connect
+        self._cache = {}
+        self._cache_day = None
+
+    def _fetch_daily_rows(self, dealer_id, start, end):
+        conn = self.connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(DAILY_SERIES_QUERY, {
+                    'dealer_id': dealer_id,
+                    'start': start,
+                    'end': end
+                })
+                return cur.fetchall()
+        finally:
+            conn.close()
+
+    def load_daily_series(self, dealer_id, start_date, end_date):
+        """
+        Build the daily leads, sales and events series for a dealer
+
+        Parameters:
+        -----------
+        dealer_id: str
+            Dealer identifier
+        start_date: str
+            First day of the series in format 'YYYY-MM-DD'
+        end_date: str
+            Last day of the series (inclusive) in format 'YYYY-MM-DD'
+
+        Returns:
+        --------
+        pd.DataFrame
+            DataFrame with a dense daily DatetimeIndex and integer leads, sales
+            and events columns; days without activity are zero
+        """
+        self._roll_cache()
+        cache_key = (str(dealer_id), start_date, end_date)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        start = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        end = datetime.strptime(end_date, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+        rows = self._fetch_daily_rows(str(dealer_id), start, end)
+
+        daily = pd.DataFrame.from_records(rows, columns=['day'] + SERIES_COLUMNS)
+        daily.index = pd.DatetimeIndex(pd.to_datetime(daily.pop('day')))
+
+        # Fill days without leads or events in one vectorized reindex
+        date_range = pd.date_range(start=start_date, end=end_date)
+        series = daily.reindex(date_range, fill_value=0).astype('int64')
+
+        self._cache[cache_key] = series
+        return series
+
+    def _roll_cache(self):
+        # Results are cached per dealer and window until the UTC day rolls over
+        today = datetime.now(timezone.utc).date()
+        if self._cache_day != today:
+            self._cache = {}
+            self._cache_day = today
+
+    def load_peer_sales(self, dealer_id, start_date, end_date, peer_ids=None):
+        """
+        Build the daily sales matrix of candidate peer dealers
+
+        Parameters:
+        -----------
+        dealer_id: str
+            Dealer whose region the peers are drawn from
+        start_date: str
+            First day of the series in format 'YYYY-MM-DD'
+        end_date: str
+            Last day of the series (inclusive) in format 'YYYY-MM-DD'
+        peer_ids: list, optional
+            Restrict the query to these dealers
+
+        Returns:
+        --------
+        pd.DataFrame
+            Dense daily DatetimeIndex with one column of sales per peer dealer
+        """
+        self._roll_cache()
+        cache_key = ('peers', str(dealer_id), start_date, end_date, tuple(str(p) for p in peer_ids) if peer_ids is not None else None)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        start = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        end = datetime.strptime(end_date, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+
+        conn = self.connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(PEER_SALES_QUERY, {
+                    'dealer_id': str(dealer_id),
+                    'start': start,
+                    'end': end,
+                    'peer_ids': [str(p) for p in peer_ids] if peer_ids is not None else None
+                })
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+
+        date_range = pd.date_range(start=start_date, end=end_date)
+        if not rows:
+            peers = pd.DataFrame(index=date_range, dtype='int64')
+            self._cache[cache_key] = peers
+            return peers
+
+        # Scatter (dealer, day, sales) rows into a days x peers matrix in one vectorized assignment
+        records = pd.DataFrame.from_records(rows, columns=['dealer_id', 'day', 'sales'])
+        dealer_codes, dealers = pd.factorize(records['dealer_id'].astype(str))
+        day_codes = date_range.get_indexer(pd.to_datetime(records['day']))
+        matrix = np.zeros((len(date_range), len(dealers)), dtype=np.int64)
+        matrix[day_codes, dealer_codes] = records['sales'].to_numpy()
+
+        peers = pd.DataFrame(matrix, index=date_range, columns=dealers)
+        self._cache[cache_key] = peers
+        return peers
+
+    def load_dealer_data(self, dealer_id, start_date, end_date):
+        """
+        Load dealer data in the format expected by DealerImpactAnalyzer
+
+        Parameters:
+        -----------
+        dealer_id: str
+            Dealer identifier
+        start_date: str
+            Start date for analysis in format 'YYYY-MM-DD'
+        end_date: str
+            End date for analysis in format 'YYYY-MM-DD'
+
+        Returns:
+        --------
+        dict
+            Dictionary containing 'dates', 'leads', 'sales', and 'baseline_sales'.
+            The baseline covariate is the mean daily sales of the dealer's
+            peers (same state, not integrated with CarReport by the end of
+            the window), which the intervention cannot affect; the dealer's
+            own activity, such as its analytics events, can.
+
+        Raises:
+        -------
+        ValueError
+            If the dealer has no peers to build the baseline from
+        """
+        series = self.load_daily_series(dealer_id, start_date, end_date)
+        peers = self.load_peer_sales(dealer_id, start_date, end_date)
+        if not len(peers.columns):
+            raise ValueError(f"No unaffected peer dealers found for dealer {dealer_id}")
+
+        return {
+            "dates": series.index,
+            "leads": series['leads'].to_numpy(),
+            "sales": series['sales'].to_numpy(),
+            "baseline_sales": peers.mean(axis=1).to_numpy()
+        }
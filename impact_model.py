@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import re
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Two-sided 95% interval, matching the default alpha used by CausalImpact
+Z_95 = NormalDist().inv_cdf(0.975)
+
+# Reported as summary["estimator"]; results from different estimators are not comparable
+CAUSALIMPACT_ESTIMATOR = "causalimpact"  # Bayesian structural time series (analyze_dealer_impact)
+OLS_ESTIMATOR = "ols"  # Pre-period OLS regression (update_dealer_impact)
+
+
+def design_matrix(covariates):
+    """Prepend an intercept column to a (n,) or (n, k) covariate array"""
+    covariates = np.asarray(covariates, dtype=np.float64)
+    if covariates.ndim == 1:
+        covariates = covariates[:, None]
+    return np.column_stack([np.ones(len(covariates)), covariates])
+
+
+def pre_period_signature(dates, y, covariates):
+    """Hash the pre-period so a state is only reused while its training data is unchanged"""
+    digest = hashlib.sha1()
+    digest.update(np.asarray(dates, dtype='datetime64[D]').tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(covariates, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class IncrementalImpact:
+    """
+    Result object with the same `data`, `params` and `summary_data` layout as
+    CausalImpact, so it can be passed to `generate_impact_summary` and
+    `generate_impact_data_for_chart`. The counterfactual comes from an OLS
+    regression rather than CausalImpact's structural time series model, so
+    it is labelled with its own `estimator`.
+    """
+
+    estimator = OLS_ESTIMATOR
+
+    def __init__(self, data, pre_period, post_period, cum_effect_std):
+        self.data = data
+        post = data.loc[post_period[0]:post_period[1]]
+        self.params = {
+            "pre_period": pre_period,
+            "post_period": post_period,
+            "post_period_response": post['y'].tolist()
+        }
+        self.summary_data = self._build_summary(post, cum_effect_std)
+
+    @staticmethod
+    def _build_summary(post, cum_effect_std):
+        n = max(len(post), 1)
+        actual = post['y'].mean()
+        pred = post['preds'].mean()
+        abs_effect = actual - pred
+        abs_std = cum_effect_std / n
+
+        if cum_effect_std > 0:
+            z = abs_effect / abs_std
+            p_value = 2 * (1 - NormalDist().cdf(abs(z)))
+        else:
+            p_value = 1.0
+
+        lower = abs_effect - Z_95 * abs_std
+        upper = abs_effect + Z_95 * abs_std
+        return pd.DataFrame(
+            {
+                "actual": [actual, actual, actual],
+                "pred": [pred, pred - Z_95 * abs_std, pred + Z_95 * abs_std],
+                "abs_effect": [abs_effect, lower, upper],
+                "rel_effect": [abs_effect / pred, lower / pred, upper / pred] if pred else [0.0, 0.0, 0.0],
+                "p": [p_value, p_value, p_value]
+            },
+            index=["average", "lower", "upper"]
+        )
+
+
+class ImpactModelState:
+    """
+    Fitted pre-period counterfactual for one dealer and intervention date.
+
+    The counterfactual is an OLS regression of sales on the covariates over the
+    pre-period. Everything needed to score a new post-period day is kept
+    (coefficients, (X'X)^-1, residual scale), so appending a day costs O(k^2)
+    and never touches the pre-period again.
+    """
+
+    def __init__(self, dealer_id, intervention_date, signature, pre_dates, pre_y, pre_x,
+                 coef, xtx_inv, sigma):
+        self.dealer_id = str(dealer_id)
+        self.intervention_date = intervention_date
+        self.signature = signature
+        self.pre_dates = pd.DatetimeIndex(pre_dates)
+        self.pre_y = np.asarray(pre_y, dtype=np.float64)
+        self.pre_x = np.asarray(pre_x, dtype=np.float64).reshape(len(self.pre_y), -1)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.xtx_inv = np.asarray(xtx_inv, dtype=np.float64)
+        self.sigma = float(sigma)
+        self.reset_post_period()
+
+    @classmethod
+    def fit(cls, dealer_id, intervention_date, pre_dates, pre_y, pre_x):
+        """Fit the pre-period regression"""
+        X = design_matrix(pre_x)
+        y = np.asarray(pre_y, dtype=np.float64)
+        coef = np.linalg.lstsq(X, y, rcond=None)[0]
+        residuals = y - X @ coef
+        dof = max(len(y) - X.shape[1], 1)
+        sigma = np.sqrt(residuals @ residuals / dof)
+        xtx_inv = np.linalg.pinv(X.T @ X)
+        signature = pre_period_signature(pre_dates, y, pre_x)
+        return cls(dealer_id, intervention_date, signature, pre_dates, y, pre_x, coef, xtx_inv, sigma)
+
+    def reset_post_period(self):
+        """Drop all post-period observations, keeping the pre-period fit"""
+        k = self.pre_x.shape[1]
+        self.post_dates = pd.DatetimeIndex([])
+        self.post_y = np.empty(0)
+        self.post_x = np.empty((0, k))
+        # Running column sums of the post-period design matrix, used for the
+        # variance of the cumulative effect
+        self.post_x_sum = np.zeros(k + 1)
+
+    def predict(self, covariates):
+        """Return predictions and pointwise 95% bounds for covariate rows"""
+        X = design_matrix(covariates)
+        preds = X @ self.coef
+        leverage = np.einsum('ij,jk,ik->i', X, self.xtx_inv, X)
+        std = self.sigma * np.sqrt(1 + leverage)
+        return preds, preds - Z_95 * std, preds + Z_95 * std
+
+    def append(self, dates, y, covariates):
+        """Append post-period observations without refitting"""
+        covariates = np.asarray(covariates, dtype=np.float64).reshape(len(y), -1)
+        self.post_dates = self.post_dates.append(pd.DatetimeIndex(dates))
+        self.post_y = np.concatenate([self.post_y, np.asarray(y, dtype=np.float64)])
+        self.post_x = np.vstack([self.post_x, covariates])
+        self.post_x_sum += design_matrix(covariates).sum(axis=0)
+
+    def cumulative_effect_std(self):
+        """Standard deviation of the cumulative post-period effect"""
+        n = len(self.post_y)
+        s = self.post_x_sum
+        return float(self.sigma * np.sqrt(n + s @ self.xtx_inv @ s))
+
+    def to_result(self):
+        """Build an IncrementalImpact result from the current state"""
+        pre_preds, pre_lower, pre_upper = self.predict(self.pre_x)
+        post_preds, post_lower, post_upper = self.predict(self.post_x)
+        point_effects = np.concatenate([self.pre_y - pre_preds, self.post_y - post_preds])
+        cum_effects = np.concatenate([np.zeros(len(self.pre_y)), np.cumsum(self.post_y - post_preds)])
+
+        data = pd.DataFrame(
+            {
+                "y": np.concatenate([self.pre_y, self.post_y]),
+                "preds": np.concatenate([pre_preds, post_preds]),
+                "preds_lower": np.concatenate([pre_lower, post_lower]),
+                "preds_upper": np.concatenate([pre_upper, post_upper]),
+                "point_effects": point_effects,
+                "cum_effects": cum_effects
+            },
+            index=self.pre_dates.append(self.post_dates)
+        )
+        pre_period = [self.pre_dates[0].strftime('%Y-%m-%d'), self.pre_dates[-1].strftime('%Y-%m-%d')]
+        post_end = self.post_dates[-1].strftime('%Y-%m-%d') if len(self.post_dates) else self.intervention_date
+        post_period = [self.intervention_date, post_end]
+        return IncrementalImpact(data, pre_period, post_period, self.cumulative_effect_std())
+
+
+def update_impact_state(state, dealer_id, intervention_date, dates, y, covariates):
+    """
+    Bring a fitted state up to date with the latest series
+
+    Parameters:
+    -----------
+    state: ImpactModelState or None
+        Previously persisted state, if any
+    dealer_id: str
+        Dealer identifier
+    intervention_date: str
+        Date when CarReport integration started in format 'YYYY-MM-DD'
+    dates: pd.DatetimeIndex
+        Daily index covering the pre and post periods
+    y: np.ndarray
+        Observed sales
+    covariates: np.ndarray
+        Control series, shape (n,) or (n, k)
+
+    Returns:
+    --------
+    ImpactModelState
+        The updated state. The pre-period is only refit when its data changed;
+        otherwise new post-period days are appended.
+    """
+    dates = pd.DatetimeIndex(dates)
+    y = np.asarray(y, dtype=np.float64)
+    covariates = np.asarray(covariates, dtype=np.float64).reshape(len(y), -1)
+    n_pre = int(dates.searchsorted(pd.Timestamp(intervention_date)))
+
+    signature = pre_period_signature(dates[:n_pre], y[:n_pre], covariates[:n_pre])
+    if state is None or state.signature != signature:
+        state = ImpactModelState.fit(dealer_id, intervention_date, dates[:n_pre], y[:n_pre], covariates[:n_pre])
+
+    post_dates = dates[n_pre:]
+    post_y = y[n_pre:]
+    post_x = covariates[n_pre:]
+
+    # Restated post-period history is rescored from the existing fit
+    n_known = len(state.post_dates)
+    if (n_known > len(post_dates)
+            or not post_dates[:n_known].equals(state.post_dates)
+            or not np.array_equal(post_y[:n_known], state.post_y)
+            or not np.array_equal(post_x[:n_known], state.post_x)):
+        state.reset_post_period()
+        n_known = 0
+
+    if n_known < len(post_dates):
+        state.append(post_dates[n_known:], post_y[n_known:], post_x[n_known:])
+
+    return state
+
+
+class ImpactStateStore:
+    """Persist ImpactModelState objects as one .npz file per dealer and intervention date"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv("IMPACT_STATE_DIR", ".impact_state")
+
+    def _path(self, dealer_id, intervention_date):
+        safe_dealer_id = re.sub(r'[^A-Za-z0-9_-]', '_', str(dealer_id))
+        return os.path.join(self.directory, f"{safe_dealer_id}_{intervention_date}.npz")
+
+    def load(self, dealer_id, intervention_date):
+        path = self._path(dealer_id, intervention_date)
+        if not os.path.exists(path):
+            return None
+        return self._read(path)
+
+    def iter_states(self, modified_after=None):
+        """Yield (modification time, state) for every stored state, optionally only those saved after a timestamp"""
+        if not os.path.isdir(self.directory):
+            return
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.stat().st_mtime):
+            if not entry.name.endswith('.npz'):
+                continue
+            mtime = entry.stat().st_mtime
+            if modified_after is None or mtime > modified_after:
+                yield mtime, self._read(entry.path)
+
+    def _read(self, path):
+        with np.load(path, allow_pickle=False) as stored:
+            meta = json.loads(str(stored['meta']))
+            state = ImpactModelState(
+                meta['dealer_id'],
+                meta['intervention_date'],
+                meta['signature'],
+                stored['pre_dates'],
+                stored['pre_y'],
+                stored['pre_x'],
+                stored['coef'],
+                stored['xtx_inv'],
+                meta['sigma']
+            )
+            if len(stored['post_y']):
+                state.append(stored['post_dates'], stored['post_y'], stored['post_x'])
+        return state
+
+    def save(self, state):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(state.dealer_id, state.intervention_date)
+        meta = {
+            "dealer_id": state.dealer_id,
+            "intervention_date": state.intervention_date,
+            "signature": state.signature,
+            "sigma": state.sigma
+        }
+        # Write to a temporary file first so readers never see a partial state
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(meta)),
+                pre_dates=state.pre_dates.values.astype('datetime64[D]'),
+                pre_y=state.pre_y,
+                pre_x=state.pre_x,
+                coef=state.coef,
+                xtx_inv=state.xtx_inv,
+                post_dates=state.post_dates.values.astype('datetime64[D]'),
+                post_y=state.post_y,
+                post_x=state.post_x
+            )
+        os.replace(tmp_path, path)
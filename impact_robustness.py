@@ -0,0 +1,156 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from impact_model import OLS_ESTIMATOR, design_matrix
+
+# Fewest training days a placebo fit is allowed to use
+MIN_PLACEBO_TRAINING_DAYS = 14
+
+
+def _solve(xtx, xty):
+    """Solve a stack of normal equations; pinv keeps near-singular prefixes finite"""
+    return (np.linalg.pinv(xtx) @ xty[..., None])[..., 0]
+
+
+def _placebo_chunk(X, y, fake_indices, window, n_pre, xtx_prefix, xty_prefix):
+    """Average daily effect for each fake intervention index, fitted on the days before it"""
+    coef = _solve(xtx_prefix[fake_indices - 1], xty_prefix[fake_indices - 1])
+
+    # Evaluate each placebo on up to `window` days, without crossing into the real post-period
+    offsets = np.arange(window)
+    rows = fake_indices[:, None] + offsets[None, :]
+    valid = rows < n_pre
+    rows = np.minimum(rows, n_pre - 1)
+
+    preds = np.einsum('mwp,mp->mw', X[rows], coef)
+    effects = np.where(valid, y[rows] - preds, 0.0)
+    return effects.sum(axis=1) / valid.sum(axis=1)
+
+
+def _bootstrap_chunk(X_pre, y_pre, X_post, y_post, seeds):
+    """Cumulative post-period effect for each bootstrap replicate"""
+    n_pre, p = X_pre.shape
+    n_post = len(y_post)
+
+    weights = np.empty((len(seeds), n_pre))
+    noise = np.empty(len(seeds))
+    for i, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        weights[i] = rng.multinomial(n_pre, np.full(n_pre, 1 / n_pre))
+        noise[i] = rng.standard_normal()
+
+    # Resampling rows with replacement is the same as weighting them by their counts,
+    # so every replicate is fitted in one batched solve
+    xtx = np.einsum('bn,ni,nj->bij', weights, X_pre, X_pre)
+    xty = weights @ (X_pre * y_pre[:, None])
+    coef = _solve(xtx, xty)
+
+    residuals = y_pre[None, :] - coef @ X_pre.T
+    sigma = np.sqrt((weights * residuals ** 2).sum(axis=1) / max(n_pre - p, 1))
+
+    # Sum of n_post independent forecast errors
+    predicted_total = coef @ X_post.sum(axis=0) + noise * sigma * np.sqrt(n_post)
+    return y_post.sum() - predicted_total
+
+
+def _chunks(values, n_chunks):
+    return [chunk for chunk in np.array_split(values, n_chunks) if len(chunk)]
+
+
+def run_robustness_checks(dates, y, covariates, intervention_date, n_placebos=100, n_bootstrap=200, seed=42, max_workers=None):
+    """
+    In-time placebo test and bootstrap of the cumulative effect
+
+    Both use a pre-period OLS regression (`estimator` "ols"), whatever model
+    produced the main estimate, and report that regression's own point
+    estimate next to the bootstrap interval.
+
+    Parameters:
+    -----------
+    dates: pd.DatetimeIndex
+        Daily index covering the pre and post periods
+    y: np.ndarray
+        Observed sales
+    covariates: np.ndarray
+        Control series, shape (n,) or (n, k)
+    intervention_date: str
+        Date when CarReport integration started in format 'YYYY-MM-DD'
+    n_placebos: int
+        Number of fake intervention dates spread across the pre-period
+    n_bootstrap: int
+        Number of bootstrap replicates
+    seed: int
+        Root seed; replicate i always uses the i-th spawned child seed, so
+        results do not depend on worker count or scheduling
+    max_workers: int, optional
+        Size of the worker pool
+
+    Returns:
+    --------
+    dict
+        OLS average daily and cumulative effects, placebo distribution and
+        empirical p-value, and the bootstrap interval of the cumulative effect
+    """
+    dates = pd.DatetimeIndex(dates)
+    y = np.asarray(y, dtype=np.float64)
+    X = design_matrix(covariates)
+    n_pre = int(dates.searchsorted(pd.Timestamp(intervention_date)))
+    n_post = len(y) - n_pre
+
+    X_pre, y_pre = X[:n_pre], y[:n_pre]
+    X_post, y_post = X[n_pre:], y[n_pre:]
+
+    # Observed effect from the full pre-period fit
+    coef = np.linalg.lstsq(X_pre, y_pre, rcond=None)[0]
+    observed_effect = float((y_post - X_post @ coef).mean()) if n_post else 0.0
+
+    # Prefix sums of the normal equations let every placebo reuse the same pass over the data
+    xtx_prefix = np.cumsum(X_pre[:, :, None] * X_pre[:, None, :], axis=0)
+    xty_prefix = np.cumsum(X_pre * y_pre[:, None], axis=0)
+
+    min_train = max(MIN_PLACEBO_TRAINING_DAYS, 3 * X.shape[1])
+    fake_indices = np.unique(np.linspace(min_train, n_pre - 1, n_placebos).astype(np.int64)) if n_pre - 1 > min_train else np.empty(0, dtype=np.int64)
+    window = max(min(n_post, n_pre - min_train), 1)
+
+    child_seeds = np.random.SeedSequence(seed).spawn(n_bootstrap)
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        placebo_futures = [
+            executor.submit(_placebo_chunk, X, y, chunk, window, n_pre, xtx_prefix, xty_prefix)
+            for chunk in _chunks(fake_indices, max_workers)
+        ]
+        bootstrap_futures = [
+            executor.submit(_bootstrap_chunk, X_pre, y_pre, X_post, y_post, list(chunk))
+            for chunk in _chunks(np.array(child_seeds, dtype=object), max_workers)
+        ]
+        placebo_effects = np.concatenate([f.result() for f in placebo_futures]) if placebo_futures else np.empty(0)
+        bootstrap_effects = np.concatenate([f.result() for f in bootstrap_futures]) if bootstrap_futures else np.empty(0)
+
+    # Share of placebo effects at least as extreme as the observed one
+    exceedances = int((np.abs(placebo_effects) >= abs(observed_effect)).sum())
+    placebo_p_value = (exceedances + 1) / (len(placebo_effects) + 1)
+
+    if len(bootstrap_effects):
+        lower, upper = np.percentile(bootstrap_effects, [2.5, 97.5])
+        bootstrap_mean = bootstrap_effects.mean()
+    else:
+        lower = upper = bootstrap_mean = None
+
+    return {
+        "estimator": OLS_ESTIMATOR,
+        "observed_average_effect": observed_effect,
+        "observed_cumulative_effect": observed_effect * n_post,
+        "placebo_dates": dates[fake_indices].strftime('%Y-%m-%d').tolist(),
+        "placebo_effects": placebo_effects.tolist(),
+        "placebo_p_value": float(placebo_p_value),
+        "bootstrap_cumulative_effect": {
+            "mean": None if bootstrap_mean is None else float(bootstrap_mean),
+            "lower": None if lower is None else float(lower),
+            "upper": None if upper is None else float(upper),
+            "replicates": len(bootstrap_effects)
+        }
+    }
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+
+def select_peer_columns(target_pre, peers_pre, top_k=10, size_ratio=3.0):
+    """
+    Pick the peer series most correlated with the target over the pre-period
+
+    Parameters:
+    -----------
+    target_pre: np.ndarray
+        Target dealer's pre-period sales, shape (n,)
+    peers_pre: np.ndarray
+        Candidate peers' pre-period sales, shape (n, m)
+    top_k: int
+        Number of peers to keep
+    size_ratio: float
+        Peers whose mean pre-period sales differ from the target's by more
+        than this factor are excluded
+
+    Returns:
+    --------
+    tuple
+        (column indices ordered by descending correlation, their correlations)
+    """
+    target = np.asarray(target_pre, dtype=np.float64)
+    peers = np.asarray(peers_pre, dtype=np.float64)
+
+    # Size filter on pre-period volume
+    target_mean = target.mean()
+    peer_means = peers.mean(axis=0)
+    if target_mean > 0:
+        similar_size = (peer_means >= target_mean / size_ratio) & (peer_means <= target_mean * size_ratio)
+    else:
+        similar_size = np.ones(peers.shape[1], dtype=bool)
+
+    # Pearson correlation of every candidate with the target in one matrix product
+    target_centered = target - target_mean
+    target_norm = np.sqrt(target_centered @ target_centered)
+    peers_centered = peers - peer_means
+    peer_norms = np.sqrt(np.einsum('ij,ij->j', peers_centered, peers_centered))
+
+    valid = similar_size & (peer_norms > 0)
+    if target_norm == 0 or not valid.any():
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    correlations = np.full(peers.shape[1], -np.inf)
+    correlations[valid] = (target_centered @ peers_centered[:, valid]) / (peer_norms[valid] * target_norm)
+
+    k = min(top_k, int(valid.sum()))
+    top = np.argpartition(-correlations, k - 1)[:k]
+    top = top[np.argsort(-correlations[top])]
+    return top, correlations[top]
+
+
+class PeerControlSelector:
+    def __init__(self, loader, top_k=10, size_ratio=3.0):
+        """
+        Build synthetic-control covariates from similar non-integrated dealers
+
+        Parameters:
+        -----------
+        loader: DealerDataLoader
+            Source of the peer sales matrix
+        top_k: int
+            Number of peer series fed to the model as covariates
+        size_ratio: float
+            Maximum ratio between target and peer mean pre-period sales
+        """
+        self.loader = loader
+        self.top_k = top_k
+        self.size_ratio = size_ratio
+        # (dealer_id, start_date, intervention_date) -> selected peer ids
+        self._peer_cache = {}
+
+    def build_controls(self, dealer_id, target_sales, start_date, end_date, intervention_date):
+        """
+        Build the control matrix for a dealer
+
+        Parameters:
+        -----------
+        dealer_id: str
+            Target dealer
+        target_sales: pd.Series
+            Target dealer's daily sales indexed by date
+        start_date: str
+            Start date for analysis in format 'YYYY-MM-DD'
+        end_date: str
+            End date for analysis in format 'YYYY-MM-DD'
+        intervention_date: str
+            Date when CarReport integration started in format 'YYYY-MM-DD'
+
+        Returns:
+        --------
+        pd.DataFrame
+            Columns x1..xk of peer sales aligned to target_sales.index, ordered
+            by descending pre-period correlation. Empty if no peer qualifies.
+        """
+        cache_key = (str(dealer_id), start_date, intervention_date)
+        peer_ids = self._peer_cache.get(cache_key)
+
+        if peer_ids is None:
+            # Selection only depends on the pre-period, so it is computed once
+            # per dealer and intervention date from the full candidate matrix
+            candidates = self.loader.load_peer_sales(dealer_id, start_date, end_date)
+            n_pre = int(candidates.index.searchsorted(pd.Timestamp(intervention_date)))
+            target_pre = target_sales.reindex(candidates.index[:n_pre], fill_value=0).to_numpy()
+            top, _ = select_peer_columns(target_pre, candidates.to_numpy()[:n_pre], self.top_k, self.size_ratio)
+            peer_ids = [str(p) for p in candidates.columns[top]]
+            self._peer_cache[cache_key] = peer_ids
+            peers = candidates[peer_ids] if peer_ids else None
+        else:
+            peers = self.loader.load_peer_sales(dealer_id, start_date, end_date, peer_ids) if peer_ids else None
+
+        if peers is None:
+            return pd.DataFrame(index=target_sales.index)
+
+        controls = peers.reindex(columns=peer_ids, fill_value=0).reindex(target_sales.index, fill_value=0)
+        controls.columns = [f"x{i + 1}" for i in range(len(peer_ids))]
+        return controls
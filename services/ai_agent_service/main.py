@@ -9,6 +9,9 @@ import json
 import os
 import uuid
 
+# Shared service utilities
+from services.common.latency import LatencyMiddleware, LatencyRecorder
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CarReport AI Agent Service",
@@ -25,6 +28,9 @@ redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = os.getenv("REDIS_PORT", 6379)
 redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
 
+# Per-route latency histograms, flushed to Redis and reported by /analytics/api
+app.add_middleware(LatencyMiddleware, recorder=LatencyRecorder("ai_agent_service", redis_client))
+
 # OAuth2 scheme for authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -260,6 +266,11 @@ async def get_report_insights(
             detail=f"Failed to generate insights: {str(e)}"
         )
 
+@app.get("/health")
+async def health():
+    """Liveness probe; dependency checks are aggregated by the analytics service"""
+    return {"status": "healthy", "service": "ai_agent_service"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)
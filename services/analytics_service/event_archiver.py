@@ -0,0 +1,301 @@
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import csv
+import io
+import json
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+
+import redis
+
+from event_stream import StreamConsumer
+
+ARCHIVE_CHANNELS = ("analytics_events", "report_events", "user_events", "crm_events")
+ARCHIVE_COLUMNS = ("id", "event_type", "user_id", "dealer_id", "data", "timestamp")
+ARCHIVE_GROUP = "archivers"
+PARTITION_CHECK_INTERVAL = 60 * 60 * 24  # Seconds between partition maintenance runs
+DEAD_LETTER_KEY = "analytics:archive:dead_letter"
+DEAD_LETTER_MAX = 10000  # Rejected rows kept for inspection
+# Row ids derive from stream entry ids, so a redelivered entry maps to the row already archived
+ENTRY_NAMESPACE = uuid.UUID("6f0c3f7e-5f1d-4a55-9c3e-2b8d7a1e4c90")
+
+
+def connect_postgres(**kwargs):
+    """Open a Postgres connection using the standard service environment variables"""
+    import psycopg2
+    return psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=os.getenv("POSTGRES_PORT", 5432),
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", "postgres"),
+        dbname=os.getenv("POSTGRES_DB", "carreport"),
+        **kwargs
+    )
+
+
+def _uuid_or_none(value) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def _clean(value):
+    """Make a decoded payload storable as jsonb: no NUL characters, no NaN or infinities"""
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {_clean(str(key)): _clean(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clean(item) for item in value]
+    return value
+
+
+def _timestamp(value, default: datetime) -> str:
+    """The event's own ISO timestamp if it parses, otherwise `default`; naive times are UTC"""
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.isoformat()
+    return default.isoformat()
+
+
+def event_row(entry: Dict[str, Any]) -> tuple:
+    """Map a decoded stream entry to an analytics_events row; the full event is kept in data"""
+    event = _clean(entry["data"]) if isinstance(entry["data"], dict) else {"value": _clean(entry["data"])}
+    entry_time = datetime.fromisoformat(entry["timestamp"]).replace(tzinfo=timezone.utc)
+    return (
+        str(uuid.uuid5(ENTRY_NAMESPACE, entry["id"])),
+        _clean(str(event.get("event_type") or entry.get("type") or "unknown"))[:50],
+        _uuid_or_none(event.get("user_id")),
+        _uuid_or_none(event.get("dealer_id")),
+        json.dumps(event),
+        _timestamp(event.get("timestamp"), entry_time)
+    )
+
+
+class EventArchiver:
+    def __init__(self, redis_client: redis.Redis, connection_factory: Callable = connect_postgres,
+                 table: str = "analytics_events", batch_size: int = 5000, flush_interval: float = 1.0,
+                 consumer: Optional[str] = None, retention_months: Optional[int] = None):
+        """
+        Bulk-archive the analytics event stream to Postgres
+
+        Reads the stream as a member of the `archivers` consumer group, so
+        each entry is archived once however many workers run, and writes
+        every read of up to `batch_size` entries (waiting at most
+        `flush_interval` seconds for new ones) with one COPY. Entries are
+        acknowledged only after their batch commits; while Postgres is slow
+        or down they stay in the stream, pending or unread, and the backlog
+        is bounded by the stream's retention rather than this process'
+        memory. Events published on the service channels reach the stream
+        through a ChannelRelay.
+
+        Row ids derive from entry ids, so an entry delivered again (e.g. after
+        a crash between commit and acknowledgement) is skipped. Rows Postgres
+        rejects as invalid data are isolated by splitting the batch and moved
+        to a Redis dead-letter list; the rest of the batch is archived.
+
+        Once a day the archiver also creates upcoming monthly partitions of
+        the table and, with `retention_months`, drops partitions older than
+        that.
+        """
+        self.redis_client = redis_client
+        self.connection_factory = connection_factory
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.retention_months = retention_months
+        self._stream = StreamConsumer(redis_client, ARCHIVE_GROUP, self.consumer, self._archive,
+                                      count=batch_size, block_ms=max(int(flush_interval * 1000), 1))
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._next_partition_check = 0.0
+
+        self.received = 0
+        self.archived = 0
+        self.failed_flushes = 0
+        self.fk_retries = 0
+        self.duplicate_retries = 0
+        self.dead_lettered = 0
+        self.last_flush_rows = 0
+        self.last_flush_seconds = 0.0
+        self.last_flush_at = None
+        self.lag_seconds = 0.0  # Age of the oldest event in the last flushed batch
+        self.partitions_created = 0
+        self.partitions_dropped = 0
+        self.partition_errors = 0
+        self.last_partition_error = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._stream.run, args=(self._stop, self._tick),
+                                        name="archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop after the batch in progress; unread entries stay in the stream"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "group": ARCHIVE_GROUP,
+            "consumer": self.consumer,
+            "received": self.received,
+            "archived": self.archived,
+            "lag_seconds": self.lag_seconds,
+            "failed_flushes": self.failed_flushes,
+            "fk_retries": self.fk_retries,
+            "duplicate_retries": self.duplicate_retries,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_seconds": self.last_flush_seconds,
+            "last_flush_at": self.last_flush_at,
+            "partitions_created": self.partitions_created,
+            "partitions_dropped": self.partitions_dropped,
+            "partition_errors": self.partition_errors,
+            "last_partition_error": self.last_partition_error
+        }
+
+    def _tick(self):
+        if time.monotonic() >= self._next_partition_check:
+            self._maintain_partitions()
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self.connection_factory()
+        return self._conn
+
+    def _rollback(self):
+        import psycopg2
+
+        if self._conn is not None and not self._conn.closed:
+            try:
+                self._conn.rollback()
+            except psycopg2.Error:
+                self._conn.close()
+
+    def _maintain_partitions(self):
+        """Run the schema's partition functions; retried at the next check if Postgres is unavailable"""
+        import psycopg2
+
+        self._next_partition_check = time.monotonic() + PARTITION_CHECK_INTERVAL
+        try:
+            conn = self._connection()
+            del conn.notices[:]
+            with conn.cursor() as cur:
+                cur.execute("SELECT create_monthly_partitions(%s::regclass)", (self.table,))
+                self.partitions_created += cur.fetchone()[0]
+                # Months that could not be created are skipped with a WARNING and retried next check
+                warnings = [notice.strip() for notice in conn.notices if notice.startswith("WARNING:")]
+                if warnings:
+                    self.partition_errors += len(warnings)
+                    self.last_partition_error = warnings[-1]
+                if self.retention_months is not None:
+                    cur.execute("SELECT drop_old_partitions(%s::regclass, %s)", (self.table, self.retention_months))
+                    self.partitions_dropped += cur.fetchone()[0]
+            conn.commit()
+        except psycopg2.Error as e:
+            # Unpartitioned table (e.g. a benchmark copy) or Postgres down; the DEFAULT partition catches rows meanwhile
+            self.partition_errors += 1
+            self.last_partition_error = str(e).strip()
+            self._rollback()
+
+    def _copy(self, rows: List[tuple], skip_duplicates: bool = False):
+        data = io.StringIO()
+        csv.writer(data).writerows(rows)
+        data.seek(0)
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        conn = self._connection()
+        with conn.cursor() as cur:
+            if skip_duplicates:
+                # COPY cannot skip conflicts; stage the rows and insert the new ones. The staging
+                # table has only the archived columns, so columns filled by defaults (ingested_at)
+                # get them on the INSERT rather than a NOT NULL violation in staging
+                cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS archive_staging ON COMMIT DELETE ROWS AS "
+                            f"SELECT {columns} FROM {self.table} WITH NO DATA")
+                cur.copy_expert(f"COPY archive_staging ({columns}) FROM STDIN WITH (FORMAT csv)", data)
+                cur.execute(f"INSERT INTO {self.table} ({columns}) SELECT {columns} FROM archive_staging ON CONFLICT DO NOTHING")
+            else:
+                cur.copy_expert(f"COPY {self.table} ({columns}) FROM STDIN WITH (FORMAT csv)", data)
+        conn.commit()
+
+    def _write(self, rows: List[tuple], skip_duplicates: bool = False):
+        """COPY rows, working around rows the table rejects; connection errors propagate"""
+        import psycopg2
+
+        try:
+            self._copy(rows, skip_duplicates)
+        except psycopg2.errors.ForeignKeyViolation:
+            # One unknown user or dealer fails the whole COPY; archive the batch
+            # without the references (they are still in data) rather than drop it
+            self._rollback()
+            self.fk_retries += 1
+            self._write([(row[0], row[1], None, None, row[4], row[5]) for row in rows], skip_duplicates)
+        except psycopg2.errors.UniqueViolation:
+            # Entries delivered again; keep the rows already archived
+            self._rollback()
+            self.duplicate_retries += 1
+            self._write(rows, skip_duplicates=True)
+        except psycopg2.DataError as e:
+            # Bisect down to the offending rows instead of retrying the batch forever
+            self._rollback()
+            if len(rows) == 1:
+                self._dead_letter(rows[0], e)
+                return
+            middle = len(rows) // 2
+            self._write(rows[:middle], skip_duplicates)
+            self._write(rows[middle:], skip_duplicates)
+
+    def _dead_letter(self, row: tuple, error: Exception):
+        self.dead_lettered += 1
+        record = dict(zip(ARCHIVE_COLUMNS, row))
+        record["error"] = str(error).strip()[:500]
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.lpush(DEAD_LETTER_KEY, json.dumps(record))
+            pipe.ltrim(DEAD_LETTER_KEY, 0, DEAD_LETTER_MAX - 1)
+            pipe.execute()
+        except redis.RedisError:
+            # The row is dropped either way; dead_lettered still counts it
+            pass
+
+    def _archive(self, events: List[Dict[str, Any]]):
+        """Consumer handler; raising leaves the entries pending so they are delivered again"""
+        import psycopg2
+
+        started = time.perf_counter()
+        self.received += len(events)
+        rows = [event_row(event) for event in events]
+        dead_lettered = self.dead_lettered
+        try:
+            self._write(rows)
+        except psycopg2.Error:
+            self.failed_flushes += 1
+            self._rollback()
+            raise
+
+        flushed_at = datetime.now(timezone.utc)
+        oldest = min(datetime.fromisoformat(event["timestamp"]) for event in events).replace(tzinfo=timezone.utc)
+        self.archived += len(rows) - (self.dead_lettered - dead_lettered)
+        self.last_flush_rows = len(rows)
+        self.last_flush_seconds = time.perf_counter() - started
+        self.last_flush_at = flushed_at.isoformat()
+        self.lag_seconds = (flushed_at - oldest).total_seconds()
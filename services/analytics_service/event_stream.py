@@ -0,0 +1,269 @@
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import socket
+import threading
+import time
+
+import redis
+
+# Stream layout: one time-ordered entry per event, id = "<ms>-<seq>"
+EVENT_STREAM = "analytics:events"
+EVENT_RETENTION_MS = int(os.getenv("EVENT_STREAM_RETENTION_DAYS", 7)) * 24 * 60 * 60 * 1000
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", 10_000_000))  # Hard cap on top of time-based retention
+RELAY_LOCK_KEY = "analytics:events:relay:lock"
+RELAY_LOCK_TTL = 10  # Seconds; a relay that stops renewing is replaced after this long
+
+
+def queue_stream_events(pipe, events: List[tuple], now: datetime):
+    """
+    Queue XADDs for a list of (event_type, data) pairs on a pipeline
+
+    Entries older than the retention window are trimmed with an approximate
+    MINID on every append, which lets Redis drop whole macro nodes instead of
+    expiring events key by key. The length cap is applied once per batch.
+    """
+    now_ms = int(now.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    min_id = now_ms - EVENT_RETENTION_MS
+    for event_type, data in events:
+        pipe.xadd(EVENT_STREAM, {"type": event_type, "data": json.dumps(data)}, minid=min_id, approximate=True)
+    pipe.xtrim(EVENT_STREAM, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+
+
+def decode_entry(entry_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+    """Turn a stream entry into an event dict; the timestamp comes from the entry id"""
+    ms = int(entry_id.split("-", 1)[0])
+    try:
+        data = json.loads(fields.get("data") or "{}")
+    except ValueError:
+        # Keep the entry rather than fail every batch it is delivered in
+        data = {"raw": fields.get("data")}
+    return {
+        "id": entry_id,
+        "type": fields.get("type"),
+        "timestamp": datetime.utcfromtimestamp(ms / 1000).isoformat(),
+        "data": data
+    }
+
+
+def ensure_consumer_groups(client: redis.Redis, groups, start_id: str = "0"):
+    """Create consumer groups (and the stream) if they do not exist yet"""
+    for group in groups:
+        try:
+            client.xgroup_create(EVENT_STREAM, group, id=start_id, mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+def stream_info(client: redis.Redis) -> Dict[str, Any]:
+    """Stream length and per-group pending/lag counts"""
+    try:
+        length = client.xlen(EVENT_STREAM)
+        groups = client.xinfo_groups(EVENT_STREAM)
+    except redis.ResponseError:
+        return {"stream": EVENT_STREAM, "length": 0, "groups": []}
+    return {
+        "stream": EVENT_STREAM,
+        "length": length,
+        "groups": [
+            {
+                "name": group["name"],
+                "consumers": group["consumers"],
+                "pending": group["pending"],
+                "lag": group.get("lag"),
+                "last_delivered_id": group["last-delivered-id"]
+            }
+            for group in groups
+        ]
+    }
+
+
+class StreamConsumer:
+    def __init__(self, client: redis.Redis, group: str, consumer: str,
+                 handler: Callable[[List[Dict[str, Any]]], None],
+                 count: int = 500, block_ms: int = 5000, min_idle_ms: int = 60000):
+        """
+        Read the event stream as a member of a consumer group
+
+        `handler` receives a list of decoded events. Entries are acknowledged
+        only after it returns; if it raises they stay pending and are
+        delivered again by `recover`, either to this consumer after a restart
+        or to another one via XAUTOCLAIM once they have been idle for
+        `min_idle_ms`.
+        """
+        self.client = client
+        self.group = group
+        self.consumer = consumer
+        self.handler = handler
+        self.count = count
+        self.block_ms = block_ms
+        self.min_idle_ms = min_idle_ms
+
+    def _process(self, entries) -> int:
+        if not entries:
+            return 0
+        # Pending entries trimmed by retention come back without fields; they are
+        # acknowledged without being handled so they do not stay pending forever
+        events = [decode_entry(entry_id, fields) for entry_id, fields in entries if fields]
+        if events:
+            self.handler(events)
+        self.client.xack(EVENT_STREAM, self.group, *[entry_id for entry_id, _ in entries])
+        return len(events)
+
+    def recover(self) -> int:
+        """Reprocess this consumer's own pending entries, then claim stale ones from others"""
+        processed = 0
+        while True:
+            response = self.client.xreadgroup(self.group, self.consumer, {EVENT_STREAM: "0"}, count=self.count)
+            entries = response[0][1] if response else []
+            if not entries:
+                break
+            processed += self._process(entries)
+
+        start_id = "0-0"
+        while True:
+            # Redis 6.2 replies [next_id, entries]; 7.0+ adds a third element with deleted ids
+            next_id, entries = self.client.xautoclaim(
+                EVENT_STREAM, self.group, self.consumer, self.min_idle_ms, start_id=start_id, count=self.count
+            )[:2]
+            processed += self._process(entries)
+            if next_id in ("0-0", b"0-0"):
+                break
+            start_id = next_id
+        return processed
+
+    def poll(self, block_ms: Optional[int] = None) -> int:
+        """Read and process one batch of new entries"""
+        response = self.client.xreadgroup(
+            self.group, self.consumer, {EVENT_STREAM: ">"},
+            count=self.count, block=self.block_ms if block_ms is None else block_ms
+        )
+        if not response:
+            return 0
+        return self._process(response[0][1])
+
+    def run(self, stop_event: threading.Event, tick: Optional[Callable[[], None]] = None):
+        """
+        Consume until stop_event is set, recovering pending entries first
+
+        `tick()`, if given, is called before every read for periodic work.
+        """
+        last_claim = None
+        while not stop_event.is_set():
+            try:
+                if last_claim is None or time.monotonic() - last_claim > self.min_idle_ms / 1000:
+                    if last_claim is None:
+                        ensure_consumer_groups(self.client, groups=(self.group,))
+                    self.recover()
+                    last_claim = time.monotonic()
+                if tick is not None:
+                    tick()
+                self.poll()
+            except Exception:
+                # Unacknowledged entries stay pending and are retried by recover()
+                stop_event.wait(1)
+
+
+class ChannelRelay:
+    def __init__(self, client: redis.Redis, channels, lock_ttl: int = RELAY_LOCK_TTL, batch_size: int = 500):
+        """
+        Append events published on pub/sub channels to the event stream
+
+        Pub/sub delivers every message to every subscriber and keeps none, so
+        only the worker holding a Redis lock (renewed while it runs) subscribes.
+        It appends what it receives to the stream, where consumer groups read
+        each entry once and a backlog survives slow consumers. Messages
+        published while no worker holds the lock, e.g. during a failover, are
+        not captured. `client` must decode responses.
+        """
+        self.client = client
+        self.channels = tuple(channels)
+        self.lock_ttl = lock_ttl
+        self.batch_size = batch_size
+        self.token = f"{socket.gethostname()}-{os.getpid()}-{id(self)}"
+        self._stop = threading.Event()
+        self._thread = None
+        self.leader = False
+        self.relayed = 0
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="channel-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _renew(self) -> bool:
+        """Extend the lock if this relay still holds it"""
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(RELAY_LOCK_KEY)
+                if pipe.get(RELAY_LOCK_KEY) != self.token:
+                    return False
+                pipe.multi()
+                pipe.expire(RELAY_LOCK_KEY, self.lock_ttl)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def _release(self):
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(RELAY_LOCK_KEY)
+                if pipe.get(RELAY_LOCK_KEY) == self.token:
+                    pipe.multi()
+                    pipe.delete(RELAY_LOCK_KEY)
+                    pipe.execute()
+            except redis.RedisError:
+                pass
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self.client.set(RELAY_LOCK_KEY, self.token, nx=True, ex=self.lock_ttl):
+                    self._stop.wait(self.lock_ttl / 2)
+                    continue
+                self.leader = True
+                self._relay()
+            except redis.RedisError:
+                self._stop.wait(1)
+            finally:
+                if self.leader:
+                    self.leader = False
+                    self._release()
+
+    def _relay(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(*self.channels)
+            renew_at = time.monotonic() + self.lock_ttl / 3
+            while not self._stop.is_set():
+                if time.monotonic() >= renew_at:
+                    if not self._renew():
+                        return
+                    renew_at = time.monotonic() + self.lock_ttl / 3
+                events = []
+                message = pubsub.get_message(timeout=0.5)
+                while message is not None:
+                    try:
+                        event = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        event = None
+                    if isinstance(event, dict):
+                        events.append((str(event.get("event_type") or "unknown"), event))
+                    if len(events) >= self.batch_size:
+                        break
+                    message = pubsub.get_message()
+                if events:
+                    pipe = self.client.pipeline(transaction=False)
+                    queue_stream_events(pipe, events, datetime.utcnow())
+                    pipe.execute()
+                    self.relayed += len(events)
+        finally:
+            pubsub.close()
@@ -0,0 +1,179 @@
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+
+# Services whose /health endpoint is probed: name -> (URL environment variable, default)
+SERVICE_URLS = {
+    "auth_service": ("AUTH_SERVICE_URL", "http://localhost:8000"),
+    "report_service": ("REPORT_SERVICE_URL", "http://localhost:8001"),
+    "ai_agent_service": ("AI_AGENT_SERVICE_URL", "http://localhost:8002"),
+    "dealer_service": ("DEALER_SERVICE_URL", "http://localhost:8003"),
+    "crm_service": ("CRM_SERVICE_URL", "http://localhost:8004")
+}
+
+PROBE_TIMEOUT = 1.0  # Seconds; a dependency slower than this is reported unhealthy
+HEALTH_CACHE_TTL = 5.0  # Seconds a result is reused before probing again
+HEALTHY = "healthy"
+UNHEALTHY = "unhealthy"
+
+
+def service_urls_from_env() -> Dict[str, str]:
+    return {name: os.getenv(env, default).rstrip("/") for name, (env, default) in SERVICE_URLS.items()}
+
+
+class HealthAggregator:
+    def __init__(self, service_urls: Dict[str, str], redis_factory: Optional[Callable] = None,
+                 postgres_factory: Optional[Callable] = None, timeout: float = PROBE_TIMEOUT, ttl: float = HEALTH_CACHE_TTL):
+        """
+        Probe every service and datastore concurrently and cache the result
+
+        All probes run at once with `timeout` each, so a check takes as long as
+        the slowest dependency (at most `timeout`) rather than the sum. HTTP
+        probes share one pooled client. The result is cached for `ttl`
+        seconds, and concurrent callers during a refresh wait for the same
+        probe instead of starting their own, so probe load does not grow with
+        the number of dashboards polling.
+
+        Redis and Postgres are pinged from worker threads over their own
+        connections from `redis_factory` / `postgres_factory`; a ping that
+        outlives `timeout` keeps its thread, and no new ping of that
+        datastore starts until it returns.
+        """
+        self.service_urls = service_urls
+        self.redis_factory = redis_factory
+        self.postgres_factory = postgres_factory
+        self.timeout = timeout
+        self.ttl = ttl
+        self._http = None
+        self._lock = None
+        self._loop = None
+        self._redis = None
+        self._redis_lock = threading.Lock()
+        self._postgres = None
+        self._postgres_lock = threading.Lock()
+        self._result = None
+        self._expires = 0.0
+        self.probes = 0
+
+    async def _bind_loop(self):
+        """The HTTP pool and lock belong to an event loop; recreate them if it changed (e.g. per Lambda invocation)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._http is not None:
+                try:
+                    await self._http.aclose()
+                except Exception:
+                    # Its connections belong to the previous, possibly closed, loop
+                    pass
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=len(self.service_urls) * 2, max_keepalive_connections=len(self.service_urls))
+            )
+
+    async def _timed(self, probe) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            error = await asyncio.wait_for(probe(), self.timeout)
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout:g}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        result = {
+            "status": HEALTHY if error is None else UNHEALTHY,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        if error is not None:
+            result["error"] = error
+        return result
+
+    def _http_probe(self, url: str):
+        async def probe():
+            response = await self._http.get(f"{url}/health")
+            return None if response.status_code == 200 else f"HTTP {response.status_code}"
+        return probe
+
+    def _redis_ping(self):
+        # A hung ping holds a to_thread worker until socket_timeout; do not queue more behind it
+        if not self._redis_lock.acquire(blocking=False):
+            raise RuntimeError("previous probe still running")
+        try:
+            if self._redis is None:
+                self._redis = self.redis_factory()
+            self._redis.ping()
+        except Exception:
+            if self._redis is not None:
+                self._redis.close()
+                self._redis = None
+            raise
+        finally:
+            self._redis_lock.release()
+
+    async def _redis_probe(self):
+        await asyncio.to_thread(self._redis_ping)
+
+    def _postgres_ping(self):
+        # A timed-out probe keeps running in its thread; never let two share the connection
+        if not self._postgres_lock.acquire(blocking=False):
+            raise RuntimeError("previous probe still running")
+        # One kept-open connection, replaced after a failure
+        try:
+            if self._postgres is None or self._postgres.closed:
+                self._postgres = self.postgres_factory()
+            with self._postgres.cursor() as cur:
+                cur.execute("SELECT 1")
+            self._postgres.rollback()
+        except Exception:
+            if self._postgres is not None:
+                self._postgres.close()
+                self._postgres = None
+            raise
+        finally:
+            self._postgres_lock.release()
+
+    async def _postgres_probe(self):
+        await asyncio.to_thread(self._postgres_ping)
+
+    async def _probe_all(self) -> Dict[str, Dict[str, Any]]:
+        probes = {name: self._http_probe(url) for name, url in self.service_urls.items()}
+        if self.redis_factory is not None:
+            probes["redis"] = self._redis_probe
+        if self.postgres_factory is not None:
+            probes["postgres"] = self._postgres_probe
+        results = await asyncio.gather(*(self._timed(probe) for probe in probes.values()))
+        self.probes += 1
+        return dict(zip(probes, results))
+
+    async def check(self) -> Dict[str, Any]:
+        """Latest health of every dependency, probing only when the cached result has expired"""
+        if self._result is not None and time.monotonic() < self._expires:
+            return self._result
+        await self._bind_loop()
+        async with self._lock:
+            # Another caller may have refreshed while this one waited
+            if self._result is None or time.monotonic() >= self._expires:
+                dependencies = await self._probe_all()
+                self._result = {
+                    "checked_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "dependencies": dependencies
+                }
+                self._expires = time.monotonic() + self.ttl
+        return self._result
+
+    async def close(self):
+        """Close the HTTP pool and the datastore probe connections"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._loop = None
+        if self._redis is not None:
+            self._redis.close()
+            self._redis = None
+        if self._postgres is not None:
+            self._postgres.close()
+            self._postgres = None
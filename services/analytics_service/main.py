@@ -1,12 +1,23 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Response, WebSocket, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 import redis
-import json
+import asyncio
 import os
-import uuid
+import random
+
+from event_archiver import ARCHIVE_CHANNELS, EventArchiver, connect_postgres
+from event_stream import ChannelRelay, queue_stream_events, stream_info
+from health import PROBE_TIMEOUT, HealthAggregator, service_urls_from_env
+from rollups import RollupCompactor, get_counts, queue_increments
+from snapshots import SnapshotBuilder, read_snapshot
+from system_sampler import SystemSampler
+
+# Shared service utilities
+from services.common.latency import LATENCY_KEY, MAX_RANGE_DAYS, STATUS_KEY, LatencyMiddleware, LatencyRecorder, histogram_mean, histogram_percentiles
+from services.common.live_push import LiveHub, authorized_topic
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -16,13 +27,40 @@ app = FastAPI(
 )
 
 # Configuration
-REDIS_EXPIRY = 60 * 60 * 24 * 7  # 7 days
+MAX_EVENT_BATCH = 1000  # Largest batch accepted by /analytics/events/batch
+HOURLY_RANGE_DAYS = 2  # Windows up to this long are answered from hourly latency histograms
+REPORT_EVENT_TYPE = "report_generated"
+SKETCH_EXPIRY = 60 * 60 * 24 * (MAX_RANGE_DAYS + 1)  # Per-day sketches outlive the longest queryable range
+
+# Per-day top-K sorted sets of search event fields. Each day keeps at most
+# TOP_K_RETAINED members; trimming runs on roughly 1 in TOP_K_TRIM_EVERY batches.
+SEARCH_EVENT_TYPE = "search"
+TOP_K_DIMENSIONS = {
+    "makes": "make",
+    "models": "model",
+    "locations": "location"
+}
+TOP_K_RESULTS = 5
+TOP_K_RETAINED = 1000
+TOP_K_TRIM_EVERY = 20
+TOP_K_RANGE_TTL = 60  # Seconds a merged range is cached
+
+# Per-day HyperLogLog sketches of distinct values, keyed by the event data field they count.
+# Each sketch is at most 12 KB regardless of traffic; PFCOUNT has a standard error of 0.81%.
+UNIQUE_SKETCHES = {
+    "vins": "vin",
+    "users": "user_id",
+    "dealers": "dealer_id"
+}
 
 # Redis connection
 redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = os.getenv("REDIS_PORT", 6379)
 redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
 
+# Per-route latency histograms, flushed to Redis and reported by /analytics/api
+app.add_middleware(LatencyMiddleware, recorder=LatencyRecorder("analytics_service", redis_client))
+
 # OAuth2 scheme for authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -34,13 +72,16 @@ class TimeRange(BaseModel):
 class ReportMetrics(BaseModel):
     total_reports: int
     unique_vins: int
-    reports_by_day: Dict[str, int]
+    reports_by_day: Dict[str, int]  # Keyed by "YYYY-MM-DD HH:MM" / "YYYY-MM-DD HH:00" when granularity is "minute" / "hour"
+    granularity: str = "day"
     
 class APIMetrics(BaseModel):
     total_requests: int
     average_response_time: float  # in milliseconds
-    error_rate: float  # percentage
+    error_rate: float  # percentage of 5xx responses
     requests_by_endpoint: Dict[str, int]
+    latency_by_endpoint: Dict[str, Dict[str, Optional[float]]] = {}  # p50/p90/p99/p999 in milliseconds, plus "all"
+    status_codes_by_endpoint: Dict[str, Dict[str, int]] = {}
     
 class UserMetrics(BaseModel):
     total_users: int
@@ -59,150 +100,334 @@ class DealerMetrics(BaseModel):
     total_leads: int
     conversion_rate: float
     
+class OverviewMetrics(BaseModel):
+    window_days: int
+    generated_at: str
+    source: str  # "snapshot" (precomputed standard window) or "live"
+    reports: ReportMetrics
+    api: APIMetrics
+    users: UserMetrics
+    searches: SearchMetrics
+    dealers: DealerMetrics
+    
 class SystemMetrics(BaseModel):
-    cpu_usage: float
-    memory_usage: float
-    disk_usage: float
+    # Percentages; None until the sampler has enough samples (CPU needs two)
+    cpu_usage: Optional[float]
+    memory_usage: Optional[float]
+    disk_usage: Optional[float]
     api_health: Dict[str, str]
+    # Per-dependency status, latency_ms and error from the cached health probes
+    dependencies: Dict[str, Dict[str, Any]] = {}
+    health_checked_at: Optional[str] = None
+    memory_bytes: Optional[float] = None
+    load_1m: Optional[float] = None
+    process_rss_bytes: Optional[float] = None
+    sampled_at: Optional[str] = None
+    history: List[Dict[str, Any]] = []
+    sampler: Dict[str, Any] = {}
+
+class AnalyticsEvent(BaseModel):
+    event_type: str
+    data: Dict[str, Any] = {}
+
+class EventBatch(BaseModel):
+    events: List[AnalyticsEvent]
 
 # Helper functions
-def get_date_range(days: int) -> TimeRange:
-    """Get date range for the last N days"""
+def get_date_range(days: int, hours: Optional[int] = None) -> TimeRange:
+    """Get date range for the last N days, or the last N hours when `hours` is given"""
+    if hours is not None:
+        span = timedelta(hours=min(max(hours, 1), MAX_RANGE_DAYS * 24))
+    else:
+        span = timedelta(days=min(max(days, 1), MAX_RANGE_DAYS))
     end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
+    start_date = end_date - span
     return TimeRange(start_date=start_date, end_date=end_date)
 
+def get_counter_buckets(time_range: TimeRange, prefix: str = "analytics") -> tuple:
+    """
+    Counter hash keys and labels covering a time range
+
+    Short windows use the `{prefix}:hourly` hashes, longer ones the
+    `{prefix}:daily` hashes. Returns (granularity, keys, labels).
+    """
+    if time_range.end_date - time_range.start_date <= timedelta(days=HOURLY_RANGE_DAYS):
+        current = time_range.start_date.replace(minute=0, second=0, microsecond=0)
+        step = timedelta(hours=1)
+        granularity = "hour"
+    else:
+        current = time_range.start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        step = timedelta(days=1)
+        granularity = "day"
+    
+    keys = []
+    labels = []
+    while current <= time_range.end_date:
+        date_key = current.strftime("%Y-%m-%d")
+        if granularity == "hour":
+            keys.append(f"{prefix}:hourly:{date_key}:{current.strftime('%H')}")
+            labels.append(f"{date_key} {current.strftime('%H')}:00")
+        else:
+            keys.append(f"{prefix}:daily:{date_key}")
+            labels.append(date_key)
+        current += step
+    return granularity, keys, labels
+
+def get_event_counts(time_range: TimeRange, event_type: str) -> tuple:
+    """
+    Per-bucket counts of one event type from the minute/hour/day rollups
+
+    Returns (granularity, {label: count}).
+    """
+    return get_counts(redis_client, time_range.start_date, time_range.end_date, event_type)
+
+def get_day_keys(time_range: TimeRange, prefix: str) -> List[str]:
+    """Keys of the per-day structures `{prefix}:{YYYY-MM-DD}` for every day the range touches"""
+    first_day = time_range.start_date.date()
+    n_days = (time_range.end_date.date() - first_day).days + 1
+    return [f"{prefix}:{(first_day + timedelta(days=i)).isoformat()}" for i in range(n_days)]
+
+def count_unique(time_range: TimeRange, sketch: str) -> int:
+    """
+    Approximate distinct count over a range from the per-day HyperLogLog sketches
+
+    PFCOUNT over several keys merges the sketches server-side, so the result
+    counts a value once even if it appears on many days. The standard error
+    is 0.81%. Sketches are per UTC day, so windows shorter than a day count
+    the whole days they touch.
+    """
+    return int(redis_client.pfcount(*get_day_keys(time_range, f"analytics:hll:{sketch}")))
+
+def get_top_terms(time_range: TimeRange) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Most frequent search terms per dimension over a range
+
+    Per-day sorted sets are merged with ZUNIONSTORE into a range key that is
+    cached for TOP_K_RANGE_TTL seconds, so repeated queries only read the top
+    of an existing sorted set. Days are trimmed to their TOP_K_RETAINED
+    heaviest terms, so counts of rare terms over long ranges are lower bounds.
+    """
+    first_day = time_range.start_date.strftime("%Y-%m-%d")
+    last_day = time_range.end_date.strftime("%Y-%m-%d")
+    
+    range_keys = {}
+    for dimension in TOP_K_DIMENSIONS:
+        day_keys = get_day_keys(time_range, f"analytics:topk:{dimension}")
+        if len(day_keys) == 1:
+            range_keys[dimension] = (day_keys[0], None)
+        else:
+            range_keys[dimension] = (f"analytics:topk:{dimension}:range:{first_day}:{last_day}", day_keys)
+    
+    # Round trip 1: which merged ranges are already cached
+    pipe = redis_client.pipeline(transaction=False)
+    for range_key, _ in range_keys.values():
+        pipe.exists(range_key)
+    cached = pipe.execute()
+    
+    # Round trip 2: merge the missing ranges and read the top terms
+    pipe = redis_client.pipeline(transaction=False)
+    for (range_key, day_keys), is_cached in zip(range_keys.values(), cached):
+        if day_keys and not is_cached:
+            pipe.zunionstore(range_key, day_keys)
+            pipe.expire(range_key, TOP_K_RANGE_TTL)
+    for range_key, _ in range_keys.values():
+        pipe.zrevrange(range_key, 0, TOP_K_RESULTS - 1, withscores=True)
+    results = pipe.execute()[-len(range_keys):]
+    
+    return {
+        dimension: [{"name": name, "count": int(score)} for name, score in top]
+        for dimension, top in zip(range_keys, results)
+    }
+
 def get_report_metrics(time_range: TimeRange) -> ReportMetrics:
     """Get report generation metrics"""
-    # In a real implementation, you would query Redis or a time-series database
-    # For demo purposes, we're returning mock data
-    
-    # Generate mock data for reports by day
-    reports_by_day = {}
-    current_date = time_range.start_date
-    while current_date <= time_range.end_date:
-        date_str = current_date.strftime("%Y-%m-%d")
-        # Generate a random number between 50 and 200
-        reports_by_day[date_str] = 50 + (hash(date_str) % 150)
-        current_date += timedelta(days=1)
+    granularity, reports_by_day = get_event_counts(time_range, REPORT_EVENT_TYPE)
     
     total_reports = sum(reports_by_day.values())
-    unique_vins = int(total_reports * 0.8)  # Assume 80% unique VINs
+    unique_vins = count_unique(time_range, "vins")
     
     return ReportMetrics(
         total_reports=total_reports,
         unique_vins=unique_vins,
-        reports_by_day=reports_by_day
+        reports_by_day=reports_by_day,
+        granularity=granularity
     )
 
 def get_api_metrics(time_range: TimeRange) -> APIMetrics:
-    """Get API performance metrics"""
-    # Mock data
+    """Get API performance metrics from the latency histograms flushed by every service"""
+    _, latency_keys, _ = get_counter_buckets(time_range, LATENCY_KEY)
+    _, status_keys, _ = get_counter_buckets(time_range, STATUS_KEY)
+    pipe = redis_client.pipeline(transaction=False)
+    for key in latency_keys + status_keys:
+        pipe.hgetall(key)
+    hashes = pipe.execute()
+    
+    # Fields are "{service}|{method} {route}|{bucket or status code}"; merging is adding counts
+    histograms = {}
+    overall = {}
+    for fields in hashes[:len(latency_keys)]:
+        for field, count in fields.items():
+            endpoint, bucket = field.rsplit("|", 1)
+            bucket, count = int(bucket), int(count)
+            histogram = histograms.setdefault(endpoint, {})
+            histogram[bucket] = histogram.get(bucket, 0) + count
+            overall[bucket] = overall.get(bucket, 0) + count
+    
+    status_codes = {}
+    for fields in hashes[len(latency_keys):]:
+        for field, count in fields.items():
+            endpoint, status_code = field.rsplit("|", 1)
+            codes = status_codes.setdefault(endpoint, {})
+            codes[status_code] = codes.get(status_code, 0) + int(count)
+    
+    quantiles = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p999": 0.999}
+    latency_by_endpoint = {}
+    for endpoint, histogram in list(histograms.items()) + [("all", overall)]:
+        latency_by_endpoint[endpoint] = dict(zip(quantiles, histogram_percentiles(histogram, quantiles.values())))
+    
+    requests_by_endpoint = {endpoint: sum(codes.values()) for endpoint, codes in status_codes.items()}
+    total_requests = sum(requests_by_endpoint.values())
+    server_errors = sum(count for codes in status_codes.values() for code, count in codes.items() if code.startswith("5"))
+    
     return APIMetrics(
-        total_requests=15000,
-        average_response_time=120.5,
-        error_rate=1.2,
-        requests_by_endpoint={
-            "/reports/": 8000,
-            "/ai/conversations/": 4000,
-            "/dealers/": 2000,
-            "/auth/": 1000
-        }
+        total_requests=total_requests,
+        average_response_time=histogram_mean(overall) or 0.0,
+        error_rate=server_errors / total_requests * 100 if total_requests else 0.0,
+        requests_by_endpoint=requests_by_endpoint,
+        latency_by_endpoint=latency_by_endpoint,
+        status_codes_by_endpoint=status_codes
     )
 
 def get_user_metrics(time_range: TimeRange) -> UserMetrics:
     """Get user metrics"""
-    # Mock data
+    # total_users and new_users are mock data; registered users live in the auth service database
     return UserMetrics(
         total_users=5000,
-        active_users=2000,
+        active_users=count_unique(time_range, "users"),
         new_users=500
     )
 
 def get_search_metrics(time_range: TimeRange) -> SearchMetrics:
     """Get search metrics"""
-    # Mock data
+    _, searches_by_bucket = get_event_counts(time_range, SEARCH_EVENT_TYPE)
+    top_terms = get_top_terms(time_range)
+    
     return SearchMetrics(
-        total_searches=12000,
-        top_makes=[
-            {"name": "Toyota", "count": 3000},
-            {"name": "Honda", "count": 2500},
-            {"name": "Ford", "count": 2000},
-            {"name": "Chevrolet", "count": 1500},
-            {"name": "BMW", "count": 1000}
-        ],
-        top_models=[
-            {"name": "Camry", "count": 1500},
-            {"name": "Accord", "count": 1200},
-            {"name": "F-150", "count": 1000},
-            {"name": "Civic", "count": 800},
-            {"name": "Silverado", "count": 700}
-        ],
-        top_locations=[
-            {"name": "Los Angeles, CA", "count": 2000},
-            {"name": "New York, NY", "count": 1800},
-            {"name": "Chicago, IL", "count": 1200},
-            {"name": "Houston, TX", "count": 1000},
-            {"name": "Phoenix, AZ", "count": 800}
-        ]
+        total_searches=sum(searches_by_bucket.values()),
+        top_makes=top_terms["makes"],
+        top_models=top_terms["models"],
+        top_locations=top_terms["locations"]
     )
 
 def get_dealer_metrics(time_range: TimeRange) -> DealerMetrics:
     """Get dealer metrics"""
-    # Mock data
+    # Mock data, except active_dealers
     return DealerMetrics(
         total_dealers=500,
-        active_dealers=350,
+        active_dealers=count_unique(time_range, "dealers"),
         total_leads=3000,
         conversion_rate=0.12
     )
 
-def get_system_metrics() -> SystemMetrics:
-    """Get system health metrics"""
-    # Mock data
+def get_overview_metrics(time_range: TimeRange) -> Dict[str, Any]:
+    """Every dashboard metric family for one window"""
+    return {
+        "window_days": (time_range.end_date - time_range.start_date).days,
+        "reports": get_report_metrics(time_range).dict(),
+        "api": get_api_metrics(time_range).dict(),
+        "users": get_user_metrics(time_range).dict(),
+        "searches": get_search_metrics(time_range).dict(),
+        "dealers": get_dealer_metrics(time_range).dict()
+    }
+
+def build_overview_snapshot(days: int) -> Dict[str, Any]:
+    return {**get_overview_metrics(get_date_range(days)), "source": "snapshot"}
+
+def get_system_metrics(health: Dict[str, Any], history_points: int = 60) -> SystemMetrics:
+    """Get system health metrics from the background sampler's ring buffer and the latest health probes"""
+    latest = system_sampler.latest() or {}
+    dependencies = health["dependencies"]
     return SystemMetrics(
-        cpu_usage=45.2,
-        memory_usage=62.8,
-        disk_usage=38.5,
-        api_health={
-            "auth_service": "healthy",
-            "report_service": "healthy",
-            "ai_agent_service": "healthy",
-            "dealer_service": "healthy",
-            "crm_service": "healthy"
-        }
+        cpu_usage=latest.get("cpu_usage"),
+        memory_usage=latest.get("memory_usage"),
+        disk_usage=latest.get("disk_usage"),
+        memory_bytes=latest.get("memory_bytes"),
+        load_1m=latest.get("load_1m"),
+        process_rss_bytes=latest.get("process_rss_bytes"),
+        sampled_at=latest.get("timestamp"),
+        history=system_sampler.history(history_points),
+        sampler=system_sampler.stats(),
+        api_health={name: result["status"] for name, result in dependencies.items()},
+        dependencies=dependencies,
+        health_checked_at=health["checked_at"]
     )
 
-def log_event(event_type: str, data: Dict[str, Any]):
-    """Log event to Redis for analytics"""
-    now = datetime.utcnow()
+def queue_events(pipe, events: List[tuple], now: datetime):
+    """Queue the Redis writes for a list of (event_type, data) pairs on a pipeline"""
     date_key = now.strftime("%Y-%m-%d")
-    hour_key = now.strftime("%H")
     
-    # Increment daily counter
-    redis_client.hincrby(f"analytics:daily:{date_key}", event_type, 1)
+    # Counters are aggregated per event type so a batch sends one HINCRBY per type
+    # into the minute rollup; the compactor builds the hourly and daily buckets
+    counts = {}
+    for event_type, _ in events:
+        counts[event_type] = counts.get(event_type, 0) + 1
+    queue_increments(pipe, counts, now)
     
-    # Increment hourly counter
-    redis_client.hincrby(f"analytics:hourly:{date_key}:{hour_key}", event_type, 1)
+    # One PFADD per sketch per batch with every distinct value seen in it
+    for sketch, field in UNIQUE_SKETCHES.items():
+        values = {str(data[field]) for _, data in events if data.get(field) is not None}
+        if values:
+            sketch_key = f"analytics:hll:{sketch}:{date_key}"
+            pipe.pfadd(sketch_key, *values)
+            pipe.expire(sketch_key, SKETCH_EXPIRY)
     
-    # Store event details if needed
-    event_id = str(uuid.uuid4())
-    event_data = {
-        "id": event_id,
-        "type": event_type,
-        "timestamp": now.isoformat(),
-        "data": json.dumps(data)
-    }
-    redis_client.hmset(f"analytics:event:{event_id}", event_data)
-    redis_client.expire(f"analytics:event:{event_id}", REDIS_EXPIRY)
+    # Search terms are aggregated per batch, one ZINCRBY per distinct value
+    trim = random.randrange(TOP_K_TRIM_EVERY) == 0
+    for dimension, field in TOP_K_DIMENSIONS.items():
+        term_counts = {}
+        for event_type, data in events:
+            if event_type == SEARCH_EVENT_TYPE and data.get(field):
+                term = str(data[field])
+                term_counts[term] = term_counts.get(term, 0) + 1
+        if not term_counts:
+            continue
+        topk_key = f"analytics:topk:{dimension}:{date_key}"
+        for term, count in term_counts.items():
+            pipe.zincrby(topk_key, count, term)
+        if trim:
+            pipe.zremrangebyrank(topk_key, 0, -(TOP_K_RETAINED + 1))
+        pipe.expire(topk_key, SKETCH_EXPIRY)
+    
+    # Append event details to the time-ordered event stream
+    queue_stream_events(pipe, events, now)
+
+def log_events(events: List[tuple]):
+    """Log a batch of (event_type, data) pairs to Redis in a single round trip"""
+    if not events:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    queue_events(pipe, events, datetime.utcnow())
+    pipe.execute()
+
+def log_event(event_type: str, data: Dict[str, Any]):
+    """Log event to Redis for analytics"""
+    log_events([(event_type, data)])
 
 # Routes
 @app.get("/analytics/reports", response_model=ReportMetrics)
 async def get_report_analytics(
     days: int = 30,
+    hours: Optional[int] = None,
     token: str = Depends(oauth2_scheme)
 ):
-    time_range = get_date_range(days)
+    """
+    Reports generated over the last `days` days, or the last `hours` hours
+
+    Windows up to 3 hours are counted per minute, up to 2 days per hour and
+    longer ones per day. unique_vins comes from per-day sketches, so it
+    covers every UTC day the window touches.
+    """
+    time_range = get_date_range(days, hours)
     return get_report_metrics(time_range)
 
 @app.get("/analytics/api", response_model=APIMetrics)
@@ -237,9 +462,49 @@ async def get_dealer_analytics(
     time_range = get_date_range(days)
     return get_dealer_metrics(time_range)
 
+@app.get("/analytics/overview", response_model=OverviewMetrics)
+async def get_overview_analytics(
+    days: int = 30,
+    token: str = Depends(oauth2_scheme)
+):
+    # Standard windows are served as stored by the snapshot builder: one GET, no re-serialization
+    snapshot = read_snapshot(redis_client, days)
+    if snapshot is not None:
+        return Response(content=snapshot, media_type="application/json")
+    return OverviewMetrics(
+        **get_overview_metrics(get_date_range(days)),
+        generated_at=datetime.utcnow().isoformat(),
+        source="live"
+    )
+
+@app.websocket("/analytics/live")
+async def analytics_live(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    dealer_id: Optional[str] = None
+):
+    # Browsers cannot set headers on WebSocket requests, so the token comes as a query parameter
+    topic = authorized_topic(token, dealer_id)
+    if topic is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await live_hub.serve(websocket, topic)
+
+@app.get("/monitoring/live")
+async def get_live_push_status(token: str = Depends(oauth2_scheme)):
+    return live_hub.stats()
+
 @app.get("/monitoring/system", response_model=SystemMetrics)
-async def get_system_health(token: str = Depends(oauth2_scheme)):
-    return get_system_metrics()
+async def get_system_health(
+    history: int = 60,
+    token: str = Depends(oauth2_scheme)
+):
+    return get_system_metrics(await health_aggregator.check(), history)
+
+@app.get("/monitoring/event-stream")
+async def get_event_stream_status(token: str = Depends(oauth2_scheme)):
+    return stream_info(redis_client)
 
 @app.post("/analytics/events", status_code=status.HTTP_202_ACCEPTED)
 async def log_analytics_event(
@@ -250,12 +515,109 @@ async def log_analytics_event(
     log_event(event_type, data)
     return {"status": "accepted"}
 
-# Background task to listen for Redis pub/sub messages
+@app.post("/analytics/events/batch", status_code=status.HTTP_202_ACCEPTED)
+async def log_analytics_events(
+    batch: EventBatch,
+    token: str = Depends(oauth2_scheme)
+):
+    if len(batch.events) > MAX_EVENT_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_EVENT_BATCH} events per batch"
+        )
+    log_events([(event.event_type, event.data) for event in batch.events])
+    return {"status": "accepted", "count": len(batch.events)}
+
+@app.get("/monitoring/archiver")
+async def get_archiver_status(token: str = Depends(oauth2_scheme)):
+    if event_archiver is None:
+        return {"running": False}
+    return {"running": True, "relay_leader": channel_relay.leader, "relayed": channel_relay.relayed,
+            **event_archiver.stats()}
+
+# Background consumer archiving the event stream to Postgres, fed with the
+# service event channels by a single relay (only when a database is configured)
+event_archiver = None
+channel_relay = None
+
+# Background compaction of the minute/hour/day counter rollups
+rollup_compactor = RollupCompactor(redis_client)
+
+# Precomputed /analytics/overview snapshots for the standard windows
+snapshot_builder = SnapshotBuilder(redis_client, build_overview_snapshot)
+
+_live_top_k = {}
+
+async def live_top_k_changes() -> Optional[Dict[str, Any]]:
+    """Today's top search terms per dimension, for the dimensions whose ranking changed since the last push"""
+    def read():
+        date_key = datetime.utcnow().strftime("%Y-%m-%d")
+        pipe = redis_client.pipeline(transaction=False)
+        for dimension in TOP_K_DIMENSIONS:
+            pipe.zrevrange(f"analytics:topk:{dimension}:{date_key}", 0, TOP_K_RESULTS - 1, withscores=True)
+        return dict(zip(TOP_K_DIMENSIONS, pipe.execute()))
+
+    current = await asyncio.to_thread(read)
+    changes = {
+        dimension: [{"term": term, "count": int(count)} for term, count in terms]
+        for dimension, terms in current.items()
+        if terms != _live_top_k.get(dimension)
+    }
+    _live_top_k.update(current)
+    return {"top_k": changes} if changes else None
+
+# WebSocket push of live metric deltas from the service event channels (/analytics/live)
+live_hub = LiveHub(redis_host, redis_port, ARCHIVE_CHANNELS, extras=live_top_k_changes)
+
+# Background CPU, memory and disk sampling for /monitoring/system
+system_sampler = SystemSampler()
+
+def connect_health_probe():
+    # libpq rounds connect timeouts below 2s up to 2s; the probe itself gives up after its own timeout
+    return connect_postgres(connect_timeout=2)
+
+def connect_health_redis():
+    # A separate client with socket timeouts, so a hung Redis fails the ping instead of blocking its thread
+    return redis.Redis(host=redis_host, port=redis_port, socket_timeout=PROBE_TIMEOUT,
+                       socket_connect_timeout=PROBE_TIMEOUT, single_connection_client=True)
+
+# Concurrent, cached probes of the other services and the datastores for /monitoring/system
+health_aggregator = HealthAggregator(
+    service_urls_from_env(),
+    redis_factory=connect_health_redis,
+    postgres_factory=connect_health_probe if os.getenv("POSTGRES_HOST") else None
+)
+
 @app.on_event("startup")
 async def startup_event():
-    # In a real implementation, you would set up a background task to listen for Redis pub/sub messages
-    # For demo purposes, we're not implementing this
-    pass
+    global event_archiver, channel_relay
+    rollup_compactor.start()
+    system_sampler.start()
+    snapshot_builder.start()
+    await live_hub.start()
+    if os.getenv("POSTGRES_HOST"):
+        channel_relay = ChannelRelay(redis_client, ARCHIVE_CHANNELS)
+        channel_relay.start()
+        retention_months = os.getenv("ARCHIVE_RETENTION_MONTHS")
+        event_archiver = EventArchiver(redis_client, retention_months=int(retention_months) if retention_months else None)
+        event_archiver.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    rollup_compactor.stop()
+    system_sampler.stop()
+    snapshot_builder.stop()
+    await live_hub.stop()
+    await health_aggregator.close()
+    if channel_relay is not None:
+        channel_relay.stop()
+    if event_archiver is not None:
+        event_archiver.stop()
+
+@app.get("/health")
+async def health():
+    """Liveness probe; dependency checks are aggregated by the analytics service"""
+    return {"status": "healthy", "service": "analytics_service"}
 
 if __name__ == "__main__":
     import uvicorn
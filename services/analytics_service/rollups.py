@@ -0,0 +1,248 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import calendar
+import threading
+import time
+
+# Event counter tiers. Ingest only increments the minute tier; the compactor
+# merges completed minutes into hours and completed hours into days, then
+# lets the finer buckets expire. Daily buckets are kept indefinitely, so
+# storage is bounded by 48h of minutes + 90d of hours + one hash per day.
+MINUTE_KEY = "analytics:minute"
+HOURLY_KEY = "analytics:hourly"
+DAILY_KEY = "analytics:daily"
+MINUTE_RETENTION = timedelta(hours=48)
+HOURLY_RETENTION = timedelta(days=90)
+
+# Hours are compacted this long after they end so late writes from other workers are included
+COMPACTION_DELAY = timedelta(minutes=2)
+COMPACTION_INTERVAL = 60  # Seconds between compactor runs
+MAX_HOURS_PER_RUN = 72  # Bounds a single run after downtime
+
+# Windows up to these spans are reported at minute / hour granularity
+MINUTE_RANGE = timedelta(hours=3)
+HOURLY_RANGE = timedelta(days=2)
+
+WATERMARK_KEY = "analytics:rollup:watermarks"  # Hash: hour / day -> first bucket not yet compacted
+LOCK_KEY = "analytics:rollup:lock"
+WATERMARK_CACHE_SECONDS = 30
+
+_watermark_cache = {"expires": 0.0, "value": None}
+
+
+def minute_key(ts: datetime) -> str:
+    return f"{MINUTE_KEY}:{ts.strftime('%Y-%m-%d:%H:%M')}"
+
+
+def hourly_key(ts: datetime) -> str:
+    return f"{HOURLY_KEY}:{ts.strftime('%Y-%m-%d:%H')}"
+
+
+def daily_key(ts: datetime) -> str:
+    return f"{DAILY_KEY}:{ts.strftime('%Y-%m-%d')}"
+
+
+def _epoch(ts: datetime) -> int:
+    return calendar.timegm(ts.timetuple())
+
+
+def _floor(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def queue_increments(pipe, counts: Dict[str, int], now: datetime):
+    """Queue HINCRBYs of {event_type: count} into the current minute bucket"""
+    key = minute_key(now)
+    for event_type, count in counts.items():
+        pipe.hincrby(key, event_type, count)
+    # Expiry is a safety net; the compactor normally merges the minute long before
+    pipe.expireat(key, _epoch(_floor(now, "minute") + MINUTE_RETENTION))
+
+
+def get_watermarks(client) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    (hour, day) watermarks: every bucket before them has been compacted
+
+    Cached briefly in process; a stale watermark only makes queries read finer
+    buckets, which are still retained, so results stay correct.
+    """
+    if _watermark_cache["expires"] > time.monotonic():
+        return _watermark_cache["value"]
+    raw = client.hmget(WATERMARK_KEY, ["hour", "day"])
+    value = tuple(datetime.strptime(v, "%Y-%m-%d %H:%M") if v else None for v in raw)
+    _watermark_cache.update(expires=time.monotonic() + WATERMARK_CACHE_SECONDS, value=value)
+    return value
+
+
+def pick_granularity(start: datetime, end: datetime) -> str:
+    span = end - start
+    if span <= MINUTE_RANGE:
+        return "minute"
+    if span <= HOURLY_RANGE:
+        return "hour"
+    return "day"
+
+
+def _hour_keys(hour: datetime, hour_wm: Optional[datetime], now: datetime) -> List[str]:
+    """Keys holding one hour: the hourly bucket if compacted (or its minutes are past retention), else its minutes"""
+    if (hour_wm is not None and hour < hour_wm) or hour + timedelta(hours=1) <= now - MINUTE_RETENTION:
+        return [hourly_key(hour)]
+    # Minutes that have not happened yet hold nothing
+    return [minute_key(hour + timedelta(minutes=m)) for m in range(60) if hour + timedelta(minutes=m) <= now]
+
+
+def _day_keys(day: datetime, hour_wm: Optional[datetime], day_wm: Optional[datetime], now: datetime) -> List[str]:
+    """Keys holding one day: the daily bucket if compacted (or its hours are past retention), else its hours"""
+    if (day_wm is not None and day < day_wm) or day + timedelta(days=1) <= now - HOURLY_RETENTION:
+        return [daily_key(day)]
+    keys = []
+    for h in range(24):
+        keys.extend(_hour_keys(day + timedelta(hours=h), hour_wm, now))
+    return keys
+
+
+def plan_buckets(start: datetime, end: datetime, granularity: str, watermarks, now: datetime) -> Tuple[List[str], List[List[str]]]:
+    """
+    Labels and, for each label, the coarsest keys that together hold that bucket
+
+    Returns (labels, key groups).
+    """
+    hour_wm, day_wm = watermarks
+    labels = []
+    groups = []
+    current = _floor(start, granularity)
+    if granularity == "minute":
+        step = timedelta(minutes=1)
+    elif granularity == "hour":
+        step = timedelta(hours=1)
+    else:
+        step = timedelta(days=1)
+
+    while current <= end:
+        if granularity == "minute":
+            labels.append(current.strftime("%Y-%m-%d %H:%M"))
+            groups.append([minute_key(current)])
+        elif granularity == "hour":
+            labels.append(current.strftime("%Y-%m-%d %H:00"))
+            groups.append(_hour_keys(current, hour_wm, now))
+        else:
+            labels.append(current.strftime("%Y-%m-%d"))
+            groups.append(_day_keys(current, hour_wm, day_wm, now))
+        current += step
+    return labels, groups
+
+
+def get_counts(client, start: datetime, end: datetime, event_type: str, granularity: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+    """
+    Per-bucket counts of one event type over [start, end]
+
+    All keys are read with one pipelined HGET batch. Returns
+    (granularity, {label: count}).
+    """
+    granularity = granularity or pick_granularity(start, end)
+    labels, groups = plan_buckets(start, end, granularity, get_watermarks(client), datetime.utcnow())
+
+    pipe = client.pipeline(transaction=False)
+    for keys in groups:
+        for key in keys:
+            pipe.hget(key, event_type)
+    values = iter(pipe.execute())
+
+    counts = {}
+    for label, keys in zip(labels, groups):
+        counts[label] = sum(int(next(values) or 0) for _ in keys)
+    return granularity, counts
+
+
+def _merge_hashes(hashes) -> Dict[str, int]:
+    merged = {}
+    for fields in hashes:
+        for field, count in fields.items():
+            merged[field] = merged.get(field, 0) + int(count)
+    return merged
+
+
+def _write_rollup(client, key: str, merged: Dict[str, int], expire_at: Optional[datetime], watermark_field: str, watermark: datetime):
+    """Overwrite a coarse bucket and advance the watermark atomically, so re-running is idempotent"""
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(key)
+    if merged:
+        pipe.hset(key, mapping=merged)
+        if expire_at is not None:
+            pipe.expireat(key, _epoch(expire_at))
+    pipe.hset(WATERMARK_KEY, watermark_field, watermark.strftime("%Y-%m-%d %H:%M"))
+    pipe.execute()
+
+
+def compact(client, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Merge completed minutes into hours and completed hours into days
+
+    Returns the number of hours and days compacted in this run.
+    """
+    now = now or datetime.utcnow()
+    # The first run starts compacting from the current hour and day; earlier
+    # buckets were written directly by the previous ingest path
+    pipe = client.pipeline(transaction=False)
+    pipe.hsetnx(WATERMARK_KEY, "hour", _floor(now, "hour").strftime("%Y-%m-%d %H:%M"))
+    pipe.hsetnx(WATERMARK_KEY, "day", _floor(now, "day").strftime("%Y-%m-%d %H:%M"))
+    pipe.hmget(WATERMARK_KEY, ["hour", "day"])
+    hour_wm, day_wm = (datetime.strptime(v, "%Y-%m-%d %H:%M") for v in pipe.execute()[-1])
+
+    hours = 0
+    while hour_wm + timedelta(hours=1) + COMPACTION_DELAY <= now and hours < MAX_HOURS_PER_RUN:
+        pipe = client.pipeline(transaction=False)
+        for m in range(60):
+            pipe.hgetall(minute_key(hour_wm + timedelta(minutes=m)))
+        merged = _merge_hashes(pipe.execute())
+        next_hour = hour_wm + timedelta(hours=1)
+        _write_rollup(client, hourly_key(hour_wm), merged, hour_wm + HOURLY_RETENTION, "hour", next_hour)
+        hour_wm = next_hour
+        hours += 1
+
+    days = 0
+    while day_wm + timedelta(days=1) <= hour_wm:
+        pipe = client.pipeline(transaction=False)
+        for h in range(24):
+            pipe.hgetall(hourly_key(day_wm + timedelta(hours=h)))
+        merged = _merge_hashes(pipe.execute())
+        next_day = day_wm + timedelta(days=1)
+        _write_rollup(client, daily_key(day_wm), merged, None, "day", next_day)
+        day_wm = next_day
+        days += 1
+
+    return {"hours": hours, "days": days}
+
+
+class RollupCompactor:
+    def __init__(self, client, interval: float = COMPACTION_INTERVAL):
+        """
+        Run `compact` periodically in a daemon thread
+
+        A short Redis lock makes sure only one worker compacts at a time.
+        """
+        self.client = client
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="rollup-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.client.set(LOCK_KEY, "1", nx=True, ex=max(int(self.interval), 1)):
+                    self.last_run = compact(self.client)
+            except Exception:
+                # Redis unavailable; the next run picks up from the watermarks
+                pass
@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+import json
+import threading
+
+# Dashboard snapshots: every metric family for each standard window, built on
+# a schedule and stored as one JSON blob per window, so the overview endpoint
+# answers with a single GET and no per-request aggregation.
+SNAPSHOT_KEY = "analytics:snapshot"
+SNAPSHOT_WINDOWS = (1, 7, 30, 90)  # Days
+SNAPSHOT_INTERVAL = 60  # Seconds between rebuilds
+# Snapshots expire if the builder stops, so readers fall back to live queries instead of serving stale data
+SNAPSHOT_TTL = SNAPSHOT_INTERVAL * 5
+LOCK_KEY = "analytics:snapshot:lock"
+
+
+def snapshot_key(days: int) -> str:
+    return f"{SNAPSHOT_KEY}:{days}d"
+
+
+def build_snapshots(client, build: Callable[[int], Dict[str, Any]], windows: Iterable[int] = SNAPSHOT_WINDOWS,
+                    ttl: int = SNAPSHOT_TTL) -> Dict[int, int]:
+    """
+    Build every window with `build(days)` and store them in one pipelined round trip
+
+    Returns the serialized size of each snapshot in bytes.
+    """
+    blobs = {}
+    for days in windows:
+        snapshot = build(days)
+        snapshot["generated_at"] = datetime.utcnow().isoformat()
+        blobs[days] = json.dumps(snapshot, default=str)
+
+    pipe = client.pipeline(transaction=False)
+    for days, blob in blobs.items():
+        pipe.set(snapshot_key(days), blob, ex=ttl)
+    pipe.execute()
+    return {days: len(blob) for days, blob in blobs.items()}
+
+
+def read_snapshot(client, days: int) -> Optional[str]:
+    """The serialized snapshot for a standard window, or None if it is not standard or not built yet"""
+    if days not in SNAPSHOT_WINDOWS:
+        return None
+    return client.get(snapshot_key(days))
+
+
+class SnapshotBuilder:
+    def __init__(self, client, build: Callable[[int], Dict[str, Any]], interval: float = SNAPSHOT_INTERVAL):
+        """
+        Rebuild the dashboard snapshots periodically in a daemon thread
+
+        A Redis lock held for one interval makes sure only one worker builds
+        per interval.
+        """
+        self.client = client
+        self.build = build
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_sizes = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="snapshot-builder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while True:
+            try:
+                if self.client.set(LOCK_KEY, "1", nx=True, ex=max(int(self.interval), 1)):
+                    self.last_sizes = build_snapshots(self.client, self.build)
+            except Exception:
+                # Redis unavailable; readers fall back to live queries until the next build
+                pass
+            if self._stop.wait(self.interval):
+                return
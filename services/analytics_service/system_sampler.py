@@ -0,0 +1,266 @@
+from typing import Any, Dict, List, Optional
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+# Host and container resource usage, sampled from /proc and the cgroup
+# filesystem by one daemon thread into a fixed-size ring buffer. Files are
+# opened once and re-read with pread, so a sample is a handful of syscalls
+# and never allocates more than the parsed values.
+SAMPLE_INTERVAL = 5.0  # Seconds between samples
+HISTORY_SIZE = 720  # One hour of history at the default interval
+FIELDS = ("timestamp", "cpu_usage", "memory_usage", "disk_usage", "memory_bytes", "load_1m", "process_rss_bytes")
+
+UNLIMITED = 1 << 60  # cgroup v1 reports "no memory limit" as a value near 2**63
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+logger = logging.getLogger(__name__)
+
+
+class _StatFile:
+    """A /proc or cgroup file kept open and re-read from offset 0"""
+
+    def __init__(self, path: str):
+        try:
+            self.fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            self.fd = None
+
+    def read(self) -> Optional[str]:
+        if self.fd is None:
+            return None
+        try:
+            return os.pread(self.fd, 65536, 0).decode()
+        except OSError:
+            return None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _read_once(path: str) -> Optional[str]:
+    """Contents of a file read once at startup, such as a cgroup limit"""
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _stat_value(text: Optional[str], key: str) -> Optional[int]:
+    """Value of `key` in a "key value" per line file such as memory.stat"""
+    if text is None:
+        return None
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name == key:
+            return int(value)
+    return None
+
+
+def _meminfo_value(text: str, key: str) -> int:
+    start = text.index(key + ":") + len(key) + 1
+    return int(text[start:text.index("kB", start)]) * 1024
+
+
+class SystemSampler:
+    def __init__(self, interval: float = SAMPLE_INTERVAL, history_size: int = HISTORY_SIZE,
+                 disk_path: str = "/", cgroup_root: str = "/sys/fs/cgroup", proc_root: str = "/proc"):
+        """
+        Sample CPU, memory and disk usage in a background thread
+
+        Inside a container the CPU and memory figures are relative to the
+        cgroup's CPU quota and memory limit, otherwise to the host. Readers
+        only copy from the ring buffer under a short lock, so serving the
+        current values and history never waits for a sample.
+        """
+        self.interval = interval
+        self.disk_path = disk_path
+        self._buffer = np.full((history_size, len(FIELDS)), np.nan)
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._proc_stat = _StatFile(os.path.join(proc_root, "stat"))
+        self._meminfo = _StatFile(os.path.join(proc_root, "meminfo"))
+        self._loadavg = _StatFile(os.path.join(proc_root, "loadavg"))
+        self._statm = _StatFile(os.path.join(proc_root, "self", "statm"))
+        self._open_cgroup(cgroup_root)
+
+        self._last_cpu = None  # (wall seconds, busy seconds or ticks, total ticks)
+        self.started_at = None
+        self.sample_cpu_seconds = 0.0  # CPU time spent sampling
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+
+    def _open_cgroup(self, root: str):
+        """Prefer cgroup v2 (unified) files and fall back to the v1 controllers"""
+        if os.path.exists(os.path.join(root, "cgroup.controllers")):
+            self.cgroup_version = 2
+            self._cpu_usage = _StatFile(os.path.join(root, "cpu.stat"))
+            self._memory_usage = _StatFile(os.path.join(root, "memory.current"))
+            self._memory_stat = _StatFile(os.path.join(root, "memory.stat"))
+            quota = _read_once(os.path.join(root, "cpu.max"))
+            limit = _read_once(os.path.join(root, "memory.max"))
+            if quota and not quota.startswith("max"):
+                value, period = quota.split()
+                self.cpu_capacity = int(value) / int(period)
+            else:
+                self.cpu_capacity = None
+            self.memory_limit = int(limit) if limit and limit.strip() != "max" else None
+        else:
+            self.cgroup_version = 1
+            self._cpu_usage = _StatFile(os.path.join(root, "cpuacct", "cpuacct.usage"))
+            self._memory_usage = _StatFile(os.path.join(root, "memory", "memory.usage_in_bytes"))
+            self._memory_stat = _StatFile(os.path.join(root, "memory", "memory.stat"))
+            quota = _read_once(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+            period = _read_once(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+            limit = _read_once(os.path.join(root, "memory", "memory.limit_in_bytes"))
+            self.cpu_capacity = int(quota) / int(period) if quota and period and int(quota) > 0 else None
+            self.memory_limit = int(limit) if limit and int(limit) < UNLIMITED else None
+
+        if self._cpu_usage.fd is None:
+            self.cgroup_version = None
+        if self.cpu_capacity is None:
+            self.cpu_capacity = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+    def _cgroup_cpu_seconds(self) -> Optional[float]:
+        text = self._cpu_usage.read()
+        if text is None:
+            return None
+        if self.cgroup_version == 2:
+            usec = _stat_value(text, "usage_usec")
+            return usec / 1e6 if usec is not None else None
+        return int(text) / 1e9
+
+    def _cpu_usage_percent(self, wall: float) -> Optional[float]:
+        """CPU use since the previous sample, as a percentage of the CPUs available to us"""
+        if self.cgroup_version is not None:
+            busy = self._cgroup_cpu_seconds()
+            total = None
+        else:
+            # Host-wide: busy and total jiffies from the aggregate cpu line
+            fields = [int(v) for v in self._proc_stat.read().split("\n", 1)[0].split()[1:]]
+            total = sum(fields[:8])
+            busy = total - fields[3] - fields[4]  # minus idle and iowait
+        if busy is None:
+            return None
+
+        previous, self._last_cpu = self._last_cpu, (wall, busy, total)
+        if previous is None:
+            return None
+        if total is None:
+            elapsed = wall - previous[0]
+            return 100.0 * (busy - previous[1]) / (elapsed * self.cpu_capacity) if elapsed > 0 else None
+        return 100.0 * (busy - previous[1]) / (total - previous[2]) if total > previous[2] else None
+
+    def _memory(self):
+        """(bytes in use, percentage of the limit)"""
+        if self.memory_limit is not None:
+            usage = int(self._memory_usage.read())
+            # Page cache that can be reclaimed does not count as used, as in `docker stats`
+            inactive = _stat_value(self._memory_stat.read(), "inactive_file" if self.cgroup_version == 2 else "total_inactive_file") or 0
+            used = max(usage - inactive, 0)
+            return used, 100.0 * used / self.memory_limit
+        text = self._meminfo.read()
+        total = _meminfo_value(text, "MemTotal")
+        used = total - _meminfo_value(text, "MemAvailable")
+        return used, 100.0 * used / total
+
+    def _disk_usage_percent(self) -> float:
+        st = os.statvfs(self.disk_path)
+        used = st.f_blocks - st.f_bfree
+        available = used + st.f_bavail  # Space usable by unprivileged processes, as `df` reports
+        return 100.0 * used / available if available else 0.0
+
+    def sample(self) -> tuple:
+        """Take one sample and append it to the history"""
+        wall = time.time()
+        memory_bytes, memory_usage = self._memory()
+        loadavg = self._loadavg.read()
+        statm = self._statm.read()
+        row = (
+            wall,
+            self._cpu_usage_percent(time.monotonic()),
+            memory_usage,
+            self._disk_usage_percent(),
+            memory_bytes,
+            float(loadavg.split(" ", 1)[0]) if loadavg else None,
+            int(statm.split()[1]) * PAGE_SIZE if statm else None
+        )
+        with self._lock:
+            self._buffer[self._next] = [np.nan if v is None else v for v in row]
+            self._next = (self._next + 1) % len(self._buffer)
+            self._count = min(self._count + 1, len(self._buffer))
+        return row
+
+    @staticmethod
+    def _as_dict(row) -> Dict[str, Any]:
+        values = {field: None if math.isnan(value) else float(value) for field, value in zip(FIELDS, row)}
+        values["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(row[0]))
+        return values
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if not self._count:
+                return None
+            row = self._buffer[self._next - 1].copy()
+        return self._as_dict(row)
+
+    def history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Up to `limit` most recent samples, oldest first"""
+        with self._lock:
+            count = self._count if limit is None else min(max(limit, 0), self._count)
+            rows = self._buffer[np.arange(self._next - count, self._next) % len(self._buffer)]
+        return [self._as_dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Sampler configuration and its own measured cost"""
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        return {
+            "interval_seconds": self.interval,
+            "history_size": len(self._buffer),
+            "samples": self.samples,
+            "cgroup_version": self.cgroup_version,
+            "cpu_capacity": self.cpu_capacity,
+            "memory_limit_bytes": self.memory_limit,
+            "mean_sample_us": 1e6 * self.sample_cpu_seconds / self.samples if self.samples else None,
+            "overhead_percent": 100.0 * self.sample_cpu_seconds / elapsed if elapsed > 0 else None,
+            "errors": self.errors,
+            "last_error": self.last_error
+        }
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="system-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while True:
+            # thread_time only counts this thread, so request handling is not attributed to the sampler
+            started = time.thread_time()
+            try:
+                self.sample()
+            except Exception as e:
+                # Keep sampling and the previous history; log each distinct failure once rather than every interval
+                error = f"{type(e).__name__}: {e}"
+                if error != self.last_error:
+                    logger.exception("System metrics sample failed")
+                self.errors += 1
+                self.last_error = error
+            self.sample_cpu_seconds += time.thread_time() - started
+            self.samples += 1
+            if self._stop.wait(self.interval):
+                return
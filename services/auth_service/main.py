@@ -10,6 +10,9 @@ import redis
 import json
 import uuid
 
+# Shared service utilities
+from services.common.latency import LatencyMiddleware, LatencyRecorder
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CarReport Authentication Service",
@@ -30,6 +33,9 @@ redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = os.getenv("REDIS_PORT", 6379)
 redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
 
+# Per-route latency histograms, flushed to Redis and reported by /analytics/api
+app.add_middleware(LatencyMiddleware, recorder=LatencyRecorder("auth_service", redis_client))
+
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -40,6 +46,8 @@ class User(BaseModel):
     email: str
     full_name: Optional[str] = None
     disabled: Optional[bool] = None
+    is_admin: Optional[bool] = None
+    dealer_ids: List[str] = []  # Dealers whose dashboards (and live pushes) the user may see
     
 class UserInDB(User):
     hashed_password: str
@@ -135,7 +143,8 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "is_admin": bool(user.is_admin), "dealer_ids": user.dealer_ids},
+        expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -223,6 +232,11 @@ async def create_subscription(
     
     return subscription
 
+@app.get("/health")
+async def health():
+    """Liveness probe; dependency checks are aggregated by the analytics service"""
+    return {"status": "healthy", "service": "auth_service"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
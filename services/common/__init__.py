@@ -0,0 +1 @@
+"""Utilities shared by the FastAPI services: latency recording and live WebSocket push"""
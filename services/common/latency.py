@@ -0,0 +1,150 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import math
+import threading
+import time
+
+# Log-bucketed latency histograms. Bucket i covers [GROWTH**i, GROWTH**(i+1))
+# microseconds, so any reported value is within about 2% of the true one. The
+# same bucket scheme is used everywhere, which makes histograms from different
+# workers, services and time periods mergeable by adding counts.
+GROWTH = 1.04
+LOG_GROWTH = math.log(GROWTH)
+
+FLUSH_INTERVAL = 10  # Seconds between flushes to Redis
+MAX_RANGE_DAYS = 730  # Longest window the analytics service serves; longer `days` values are clamped to it
+HOURLY_EXPIRY = 60 * 60 * 24 * 3  # 3 days
+DAILY_EXPIRY = 60 * 60 * 24 * (MAX_RANGE_DAYS + 1)  # Daily histograms outlive the longest queryable range
+
+LATENCY_KEY = "metrics:latency"
+STATUS_KEY = "metrics:status"
+UNMATCHED_ROUTE = "unmatched"  # Requests that matched no route share one label to bound cardinality
+
+
+def bucket_index(seconds: float) -> int:
+    return int(math.log(max(seconds * 1e6, 1.0)) / LOG_GROWTH)
+
+
+def bucket_value_ms(index: int) -> float:
+    """Representative latency of a bucket (its geometric midpoint) in milliseconds"""
+    return GROWTH ** (index + 0.5) / 1000
+
+
+def histogram_percentiles(buckets: Dict[int, int], quantiles: Iterable[float]) -> List[Optional[float]]:
+    """Latency in milliseconds at each quantile of a {bucket index: count} histogram"""
+    total = sum(buckets.values())
+    if not total:
+        return [None for _ in quantiles]
+    ordered = sorted(buckets.items())
+    results = []
+    for q in quantiles:
+        rank = q * total
+        cumulative = 0
+        for index, count in ordered:
+            cumulative += count
+            if cumulative >= rank:
+                results.append(bucket_value_ms(index))
+                break
+    return results
+
+
+def histogram_mean(buckets: Dict[int, int]) -> Optional[float]:
+    total = sum(buckets.values())
+    if not total:
+        return None
+    return sum(bucket_value_ms(index) * count for index, count in buckets.items()) / total
+
+
+class LatencyRecorder:
+    def __init__(self, service: str, redis_client=None, flush_interval: float = FLUSH_INTERVAL):
+        """
+        Per-route latency histograms and status code counts for one service
+
+        Measurements are kept in memory and added to hourly and daily Redis
+        hashes every `flush_interval` seconds by a daemon thread, with one
+        HINCRBY per non-empty bucket. Without a Redis client the counts are
+        only kept in memory.
+        """
+        self.service = service
+        self.redis_client = redis_client
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._latency = {}  # (endpoint, bucket) -> count
+        self._status = {}  # (endpoint, status code) -> count
+        self._flusher = None
+
+    def record(self, method: str, route: str, status_code: int, seconds: float):
+        endpoint = f"{self.service}|{method} {route}"
+        latency_key = (endpoint, bucket_index(seconds))
+        status_key = (endpoint, status_code)
+        with self._lock:
+            self._latency[latency_key] = self._latency.get(latency_key, 0) + 1
+            self._status[status_key] = self._status.get(status_key, 0) + 1
+        if self._flusher is None and self.redis_client is not None:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name=f"{self.service}-latency-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                # Keep recording if Redis is unavailable; the failed interval is lost
+                pass
+
+    def flush(self):
+        """Swap out the in-memory counts and add them to Redis in one pipelined round trip"""
+        with self._lock:
+            latency, self._latency = self._latency, {}
+            status, self._status = self._status, {}
+        if self.redis_client is None or not (latency or status):
+            return
+
+        now = datetime.utcnow()
+        date_key = now.strftime("%Y-%m-%d")
+        hourly_suffix = f"hourly:{date_key}:{now.strftime('%H')}"
+        daily_suffix = f"daily:{date_key}"
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for prefix, counts in ((LATENCY_KEY, latency), (STATUS_KEY, status)):
+            for suffix, expiry in ((hourly_suffix, HOURLY_EXPIRY), (daily_suffix, DAILY_EXPIRY)):
+                key = f"{prefix}:{suffix}"
+                for (endpoint, label), count in counts.items():
+                    pipe.hincrby(key, f"{endpoint}|{label}", count)
+                pipe.expire(key, expiry)
+        pipe.execute()
+
+
+class LatencyMiddleware:
+    def __init__(self, app, recorder: LatencyRecorder):
+        """ASGI middleware recording latency and status code per route template"""
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; use its template, not the raw path
+            route = scope.get("route")
+            self.recorder.record(scope["method"], getattr(route, "path", UNMATCHED_ROUTE), status_code, time.perf_counter() - start)
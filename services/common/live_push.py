@@ -0,0 +1,255 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import asyncio
+import json
+import logging
+import os
+
+import jwt
+import redis.asyncio as aioredis
+
+# Live metric deltas pushed over WebSocket instead of dashboards polling.
+#
+# Each worker holds one Redis pub/sub subscription, whatever the number of
+# clients. Events are reduced into per-topic deltas and pushed once per
+# interval: a delta is serialized once per topic and the same string is
+# queued to every subscriber, so fan-out costs one put_nowait per connection.
+# Each connection has a bounded queue; a client that falls that far behind is
+# closed (code 1013) and should reconnect and resync through the REST API.
+PUSH_INTERVAL = 1.0  # Seconds between pushes
+CLIENT_QUEUE_SIZE = 64  # Pending pushes per connection before it is closed as too slow
+MAX_LEADS_PER_PUSH = 50
+GLOBAL_TOPIC = "global"
+TRY_AGAIN_LATER = 1013
+
+# Subscriptions are authorized with the auth service's access tokens
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
+JWT_ALGORITHM = "HS256"
+
+LEAD_EVENT_TYPES = ("lead_created", "lead_updated")
+# No customer contact details: a dashboard fetches those through the authenticated REST API
+LEAD_FIELDS = ("lead_id", "event_type", "status", "timestamp")
+SEARCH_FIELDS = ("make", "model", "location")
+
+logger = logging.getLogger(__name__)
+
+
+def dealer_topic(dealer_id) -> str:
+    return f"dealer:{dealer_id}"
+
+
+def authorized_topic(token: Optional[str], dealer_id: Optional[str] = None) -> Optional[str]:
+    """
+    The topic an access token may subscribe to, or None if it may not
+
+    A dealer's topic needs the dealer in the token's `dealer_ids` claim or an
+    admin token; the global topic aggregates every dealer and needs an admin
+    token.
+    """
+    if not token:
+        return None
+    try:
+        claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    if claims.get("is_admin") is True:
+        return dealer_topic(dealer_id) if dealer_id else GLOBAL_TOPIC
+    if dealer_id and str(dealer_id) in {str(allowed) for allowed in claims.get("dealer_ids") or []}:
+        return dealer_topic(dealer_id)
+    return None
+
+
+def event_topics(event: Dict[str, Any]) -> List[str]:
+    """Every event counts towards the global topic; events naming a dealer also go to that dealer's topic"""
+    topics = [GLOBAL_TOPIC]
+    if event.get("dealer_id"):
+        topics.append(dealer_topic(event["dealer_id"]))
+    return topics
+
+
+class _Delta:
+    __slots__ = ("counters", "search_terms", "leads", "extra")
+
+    def __init__(self):
+        self.counters = {}
+        self.search_terms = {}
+        self.leads = []
+        self.extra = None
+
+    def add(self, event: Dict[str, Any]):
+        event_type = str(event.get("event_type") or "unknown")
+        self.counters[event_type] = self.counters.get(event_type, 0) + 1
+        if event_type == "search":
+            for field in SEARCH_FIELDS:
+                term = event.get(field)
+                if term and isinstance(term, (str, int, float)):
+                    terms = self.search_terms.setdefault(field, {})
+                    terms[term] = terms.get(term, 0) + 1
+        elif event_type in LEAD_EVENT_TYPES and len(self.leads) < MAX_LEADS_PER_PUSH:
+            self.leads.append({field: event.get(field) for field in LEAD_FIELDS})
+
+    def payload(self, topic: str) -> Dict[str, Any]:
+        payload = {"type": "delta", "topic": topic, "counters": self.counters}
+        if self.search_terms:
+            payload["search_terms"] = self.search_terms
+        # Lead details only go to the dealer they belong to
+        if self.leads and topic != GLOBAL_TOPIC:
+            payload["leads"] = self.leads
+        if self.extra:
+            payload.update(self.extra)
+        return payload
+
+
+class _Subscriber:
+    __slots__ = ("queue", "slow")
+
+    def __init__(self, queue_size: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.slow = False
+
+
+class LiveHub:
+    def __init__(self, redis_host: str, redis_port, channels: Iterable[str],
+                 topics: Callable[[Dict[str, Any]], List[str]] = event_topics,
+                 extras: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None,
+                 interval: float = PUSH_INTERVAL, queue_size: int = CLIENT_QUEUE_SIZE):
+        """
+        Fan Redis pub/sub events out to WebSocket subscribers as periodic deltas
+
+        `topics(event)` names the topics an event counts towards. `extras()`,
+        if given, is awaited once per push while the global topic has
+        subscribers and its result is merged into the global delta.
+        """
+        self.redis_host = redis_host
+        self.redis_port = redis_port
+        self.channels = tuple(channels)
+        self.topics = topics
+        self.extras = extras
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[_Subscriber]] = {}
+        self._pending: Dict[str, _Delta] = {}
+        self._tasks = []
+
+        self.events = 0
+        self.pushes = 0
+        self.slow_clients = 0
+        self.bad_messages = 0
+        self.reader_restarts = 0
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._read_loop()), asyncio.create_task(self._push_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "topics": len(self._subscribers),
+            "events": self.events,
+            "pushes": self.pushes,
+            "slow_clients_closed": self.slow_clients,
+            "bad_messages": self.bad_messages,
+            "reader_restarts": self.reader_restarts
+        }
+
+    async def _read_loop(self):
+        while True:
+            client = aioredis.Redis(host=self.redis_host, port=self.redis_port, decode_responses=True)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(*self.channels)
+                async for message in pubsub.listen():
+                    try:
+                        event = json.loads(message["data"])
+                        if isinstance(event, dict):
+                            self._accumulate(event)
+                    except (TypeError, ValueError):
+                        self.bad_messages += 1
+                    except Exception:
+                        # One malformed event must not end live push for this worker
+                        self.bad_messages += 1
+                        logger.exception("Live push dropped a message from %s", message.get("channel"))
+            except (aioredis.ConnectionError, OSError):
+                await asyncio.sleep(1)
+            except Exception:
+                # Resubscribe rather than leave the worker without live updates
+                self.reader_restarts += 1
+                logger.exception("Live push reader failed; restarting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+                await client.close()
+
+    def _accumulate(self, event: Dict[str, Any]):
+        self.events += 1
+        # Only topics someone is listening to are aggregated
+        for topic in self.topics(event):
+            if topic in self._subscribers:
+                delta = self._pending.get(topic)
+                if delta is None:
+                    delta = self._pending[topic] = _Delta()
+                delta.add(event)
+
+    async def _push_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            pending, self._pending = self._pending, {}
+            if self.extras is not None and GLOBAL_TOPIC in self._subscribers:
+                try:
+                    extra = await self.extras()
+                except Exception:
+                    extra = None
+                if extra:
+                    pending.setdefault(GLOBAL_TOPIC, _Delta()).extra = extra
+            for topic, delta in pending.items():
+                try:
+                    self._publish(topic, json.dumps(delta.payload(topic), default=str))
+                except Exception:
+                    logger.exception("Live push could not publish to %s", topic)
+
+    def _publish(self, topic: str, payload: str):
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return
+        for subscriber in list(subscribers):
+            try:
+                subscriber.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Its sender closes the connection after draining what it already has
+                subscriber.slow = True
+                subscribers.discard(subscriber)
+                self.slow_clients += 1
+        self.pushes += 1
+
+    async def serve(self, websocket, topic: str):
+        """Stream a topic's deltas to an accepted WebSocket until it disconnects"""
+        subscriber = _Subscriber(self.queue_size)
+        subscribers = self._subscribers.setdefault(topic, set())
+        subscribers.add(subscriber)
+        sender = asyncio.create_task(self._send_loop(websocket, subscriber, topic))
+        try:
+            # Clients send nothing meaningful; receiving only detects disconnects
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+        finally:
+            sender.cancel()
+            subscribers.discard(subscriber)
+            if not subscribers and self._subscribers.get(topic) is subscribers:
+                del self._subscribers[topic]
+
+    async def _send_loop(self, websocket, subscriber: _Subscriber, topic: str):
+        try:
+            await websocket.send_text(json.dumps({"type": "subscribed", "topic": topic, "interval": self.interval}))
+            while True:
+                payload = await subscriber.queue.get()
+                if subscriber.slow:
+                    await websocket.close(code=TRY_AGAIN_LATER)
+                    return
+                await websocket.send_text(payload)
+        except Exception:
+            # Connection already gone; serve() cleans up when the disconnect arrives
+            return
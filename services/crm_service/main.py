@@ -10,6 +10,9 @@ import os
 import uuid
 import asyncio
 
+# Shared service utilities
+from services.common.latency import LatencyMiddleware, LatencyRecorder
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CarReport CRM Integration Service",
@@ -27,6 +30,9 @@ redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = os.getenv("REDIS_PORT", 6379)
 redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
 
+# Per-route latency histograms, flushed to Redis and reported by /analytics/api
+app.add_middleware(LatencyMiddleware, recorder=LatencyRecorder("crm_service", redis_client))
+
 # OAuth2 scheme for authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -446,6 +452,11 @@ async def startup_event():
     # For demo purposes, we're not implementing this
     pass
 
+@app.get("/health")
+async def health():
+    """Liveness probe; dependency checks are aggregated by the analytics service"""
+    return {"status": "healthy", "service": "crm_service"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8004)
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, WebSocket, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
@@ -8,6 +8,10 @@ import json
 import os
 import uuid
 
+# Shared service utilities
+from services.common.latency import LatencyMiddleware, LatencyRecorder
+from services.common.live_push import LiveHub, authorized_topic
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CarReport Dealer Dashboard Service",
@@ -23,6 +27,9 @@ redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = os.getenv("REDIS_PORT", 6379)
 redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
 
+# Per-route latency histograms, flushed to Redis and reported by /analytics/api
+app.add_middleware(LatencyMiddleware, recorder=LatencyRecorder("dealer_service", redis_client))
+
 # OAuth2 scheme for authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -194,6 +201,9 @@ def publish_lead_event(lead: Lead, event_type: str):
     }
     redis_client.publish("crm_events", json.dumps(event))
 
+# Pushes each dealer's live counters and new leads to its dashboard (/dealers/{dealer_id}/live)
+live_hub = LiveHub(redis_host, redis_port, ("crm_events", "analytics_events"))
+
 # Routes
 @app.get("/dealers/{dealer_id}", response_model=Dealer)
 async def get_dealer_info(dealer_id: str, token: str = Depends(oauth2_scheme)):
@@ -343,6 +353,29 @@ async def update_lead(
     
     return lead
 
+@app.websocket("/dealers/{dealer_id}/live")
+async def dealer_live(websocket: WebSocket, dealer_id: str, token: Optional[str] = None):
+    # Browsers cannot set headers on WebSocket requests, so the token comes as a query parameter
+    topic = authorized_topic(token, dealer_id)
+    if topic is None or not get_dealer(dealer_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await live_hub.serve(websocket, topic)
+
+@app.on_event("startup")
+async def startup_event():
+    await live_hub.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await live_hub.stop()
+
+@app.get("/health")
+async def health():
+    """Liveness probe; dependency checks are aggregated by the analytics service"""
+    return {"status": "healthy", "service": "dealer_service"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8003)
@@ -1,26 +1,160 @@
 import json
 import os
+import random
+import threading
+import time
 import boto3
 import logging
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
+# Initialize AWS clients (DYNAMODB_ENDPOINT_URL points at a local DynamoDB for development and benchmarks)
 sqs = boto3.client('sqs')
-dynamodb = boto3.resource('dynamodb')
+dynamodb = boto3.resource('dynamodb', endpoint_url=os.environ.get('DYNAMODB_ENDPOINT_URL'))
 
 # Get environment variables
 STAGE = os.environ.get('STAGE', 'dev')
 TABLE_NAME = f"carreport-microservices-{STAGE}-cache"
+DLQ_URL = os.environ.get('DLQ_URL')
 
 # Get DynamoDB table
 table = dynamodb.Table(TABLE_NAME)
 
-def process_event(event_data):
-    """Process an event from the SQS queue"""
+# BatchWriteItem limits and retry policy for unprocessed items
+MAX_BATCH_ITEMS = 25
+MAX_WRITE_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.05  # Seconds; doubled per attempt, with full jitter
+RETRYABLE_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded', 'InternalServerError')
+
+# Record outcomes. Transient failures are reported back to SQS and redelivered;
+# poison messages (malformed or invalid events that can never succeed) go
+# straight to the dead-letter queue instead of being retried.
+PROCESSED = 'processed'
+TRANSIENT = 'transient'
+POISON = 'poison'
+MAX_DLQ_BATCH = 10  # SendMessageBatch limit
+
+# Records of a batch are processed concurrently in per-key lanes: records
+# sharing an ordering key run one after another in delivery order, different
+# keys run in parallel on up to EVENT_PROCESSOR_CONCURRENCY threads.
+MAX_CONCURRENCY = int(os.environ.get('EVENT_PROCESSOR_CONCURRENCY', '8'))
+RECORD_TIMEOUT = float(os.environ.get('RECORD_TIMEOUT', '5'))  # Seconds one record may take before it is retried
+DEADLINE_MARGIN = 2.0  # Seconds kept free before the Lambda timeout to flush writes and report failures
+ORDERING_KEYS = ('dealer_id', 'conversation_id')
+
+class WriteBuffer:
+    """
+    Buffer the DynamoDB puts of one invocation and write them with BatchWriteItem
+
+    Each put is tagged with the SQS message it came from, so after `flush` the
+    messages whose items could not be written are known. Unprocessed items
+    and throttling errors are retried with exponential backoff. When
+    DynamoDB rejects a batch outright (e.g. one item is too large), its
+    items are written one by one so only the rejected ones fail. Two puts of
+    the same key keep the last item (BatchWriteItem rejects duplicate keys
+    in one request) and share its outcome.
+    """
+
+    def __init__(self, resource=None, table_name=TABLE_NAME, key_name='key'):
+        self.resource = resource or dynamodb
+        self.table_name = table_name
+        self.key_name = key_name
+        self._items = {}  # key -> item
+        self._owners = {}  # key -> message ids whose put wrote this key
+        self._lock = threading.Lock()  # Puts arrive from the record processing threads
+        self.requests = 0
+        self.retries = 0
+
+    def put(self, message_id, item):
+        key = item[self.key_name]
+        with self._lock:
+            self._items[key] = item
+            self._owners.setdefault(key, []).append(message_id)
+
+    def __len__(self):
+        return len(self._items)
+
+    def flush(self):
+        """
+        Write everything buffered
+
+        Returns {message_id: (outcome, reason)} for messages with a failed put:
+        TRANSIENT for throttling and connection errors, POISON for items
+        DynamoDB rejects. A message with both is POISON.
+        """
+        with self._lock:
+            items, self._items = self._items, {}
+            owners, self._owners = self._owners, {}
+
+        failed_keys = {}
+        keys = list(items)
+        for start in range(0, len(keys), MAX_BATCH_ITEMS):
+            failed_keys.update(self._write_chunk({key: items[key] for key in keys[start:start + MAX_BATCH_ITEMS]}))
+
+        failed_messages = {}
+        for key, (outcome, reason) in failed_keys.items():
+            for message_id in owners[key]:
+                if failed_messages.get(message_id, (None,))[0] != POISON:
+                    failed_messages[message_id] = (outcome, reason)
+        return failed_messages
+
+    def _write_chunk(self, pending):
+        """Returns {key: (outcome, reason)} for the items that could not be written"""
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            if attempt:
+                self.retries += 1
+                time.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt))
+            try:
+                self.requests += 1
+                response = self.resource.batch_write_item(RequestItems={
+                    self.table_name: [{'PutRequest': {'Item': item}} for item in pending.values()]
+                })
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in RETRYABLE_ERRORS:
+                    continue
+                logger.error(f"Batch of {len(pending)} items rejected, writing them one by one: {str(e)}")
+                return self._write_items(pending)
+            except BotoCoreError as e:
+                # Connection or timeout errors after botocore's own retries; the whole chunk is retried by SQS
+                logger.error(f"Error writing batch of {len(pending)} items: {str(e)}")
+                return {key: (TRANSIENT, str(e)) for key in pending}
+
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            pending = {request['PutRequest']['Item'][self.key_name]: request['PutRequest']['Item'] for request in unprocessed}
+            if not pending:
+                return {}
+
+        logger.error(f"{len(pending)} items still unprocessed after {MAX_WRITE_ATTEMPTS} attempts")
+        return {key: (TRANSIENT, "unprocessed after retries") for key in pending}
+
+    def _write_items(self, pending):
+        """PutItem each item of a rejected batch so only the items DynamoDB refuses are failed"""
+        table = self.resource.Table(self.table_name)
+        failed = {}
+        for key, item in pending.items():
+            try:
+                self.requests += 1
+                table.put_item(Item=item)
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                failed[key] = (TRANSIENT if code in RETRYABLE_ERRORS else POISON, str(e))
+            except BotoCoreError as e:
+                failed[key] = (TRANSIENT, str(e))
+        return failed
+
+def process_event(event_data, put_item=None):
+    """
+    Process an event from the SQS queue
+
+    With `put_item`, DynamoDB writes are handed to it (e.g. a WriteBuffer)
+    instead of being written immediately. Returns False for events that can
+    never be processed; unexpected errors are raised so they can be retried.
+    """
     try:
         event_type = event_data.get('event_type')
         
@@ -32,7 +166,7 @@ def process_event(event_data):
         
         # Handle different event types
         if event_type == 'report_generated':
-            return process_report_generated_event(event_data)
+            return process_report_generated_event(event_data, put_item)
         elif event_type == 'user_created':
             return process_user_created_event(event_data)
         elif event_type == 'lead_created' or event_type == 'lead_updated':
@@ -47,9 +181,9 @@ def process_event(event_data):
     
     except Exception as e:
         logger.error(f"Error processing event: {str(e)}")
-        return False
+        raise
 
-def process_report_generated_event(event_data):
+def process_report_generated_event(event_data, put_item=None):
     """Process a report generated event"""
     report_id = event_data.get('report_id')
     vin = event_data.get('vin')
@@ -62,15 +196,18 @@ def process_report_generated_event(event_data):
     logger.info(f"Report {report_id} generated for VIN {vin}")
     
     # Store in DynamoDB for analytics
+    item = {
+        'key': f"report:{report_id}",
+        'vin': vin,
+        'timestamp': event_data.get('timestamp'),
+        'ttl': int((datetime.now().timestamp() + 60*60*24*30))  # 30 days TTL
+    }
+    if put_item is not None:
+        # Buffered; the write's outcome is attached to the message when the buffer is flushed
+        put_item(item)
+        return True
     try:
-        table.put_item(
-            Item={
-                'key': f"report:{report_id}",
-                'vin': vin,
-                'timestamp': event_data.get('timestamp'),
-                'ttl': int((datetime.now().timestamp() + 60*60*24*30))  # 30 days TTL
-            }
-        )
+        table.put_item(Item=item)
         return True
     except Exception as e:
         logger.error(f"Error storing report event: {str(e)}")
@@ -132,39 +269,198 @@ def process_conversation_message_event(event_data):
     
     return True
 
+def ordering_key(event_data):
+    """Records with the same key are processed in delivery order; None means the record can run in any order"""
+    for field in ORDERING_KEYS:
+        value = event_data.get(field)
+        if value:
+            return (field, value)
+    return None
+
+class _Lane:
+    __slots__ = ('records', 'position', 'started', 'abandoned')
+
+    def __init__(self):
+        self.records = []
+        self.position = 0  # Index of the record being processed
+        self.started = None  # When that record started, None until the lane runs
+        self.abandoned = False
+
+def process_records(records, process, concurrency=None, timeout=None, deadline=None):
+    """
+    Process (message_id, event_data) pairs concurrently, preserving order per ordering key
+
+    `process(message_id, event_data)` returns an (outcome, reason) pair. A
+    record still running after `timeout` seconds, or any record unfinished
+    at the monotonic `deadline`, is counted as TRANSIENT. Its thread cannot be
+    interrupted and is left to finish in the background, and its result is
+    ignored. After a transient failure the rest of that lane is not
+    processed but also reported TRANSIENT, so redelivery keeps the key's
+    order. Returns {message_id: (outcome, reason)}.
+    """
+    concurrency = concurrency or MAX_CONCURRENCY
+    timeout = timeout or RECORD_TIMEOUT
+    lanes = {}
+    for message_id, event_data in records:
+        key = ordering_key(event_data) or ('message', message_id)
+        lanes.setdefault(key, _Lane()).records.append((message_id, event_data))
+
+    results = {}
+    lock = threading.Lock()
+
+    def run_lane(lane):
+        for position, (message_id, event_data) in enumerate(lane.records):
+            with lock:
+                if lane.abandoned:
+                    return
+                lane.position = position
+                lane.started = time.monotonic()
+            result = process(message_id, event_data)
+            with lock:
+                if lane.abandoned:
+                    return
+                results[message_id] = result
+                if result[0] == TRANSIENT:
+                    abandon(lane, position + 1, "an earlier event with the same key failed")
+                    return
+
+    def abandon(lane, position, reason):
+        lane.abandoned = True
+        for message_id, _ in lane.records[position:]:
+            results.setdefault(message_id, (TRANSIENT, reason))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(lanes))))
+    running = {executor.submit(run_lane, lane): lane for lane in lanes.values()}
+    try:
+        while running:
+            now = time.monotonic()
+            with lock:
+                for future, lane in list(running.items()):
+                    if lane.started is not None and now - lane.started >= timeout:
+                        logger.error(f"Event {lane.records[lane.position][0]} timed out after {timeout:g}s")
+                        abandon(lane, lane.position, f"timed out after {timeout:g}s")
+                        del running[future]
+                    elif deadline is not None and now >= deadline:
+                        abandon(lane, lane.position, "invocation deadline reached")
+                        del running[future]
+                started = [lane.started for lane in running.values() if lane.started is not None]
+            if not running:
+                break
+            # Wake up for the next completion, the earliest record timeout or the deadline
+            wake = min(started) + timeout - now if started else timeout
+            if deadline is not None:
+                wake = min(wake, deadline - now)
+            done, _ = wait(running, timeout=max(wake, 0.001), return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+    finally:
+        # Stuck records keep their threads; lanes that never started are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def process_record(message_id, event_data, writes):
+    """Classify one parsed record as PROCESSED, POISON or TRANSIENT, with a reason for failures"""
+    try:
+        # Process the event
+        if process_event(event_data, lambda item: writes.put(message_id, item)):
+            return PROCESSED, None
+        return POISON, f"invalid {event_data.get('event_type') or 'untyped'} event"
+    except Exception as e:
+        logger.error(f"Error processing message {message_id}: {str(e)}")
+        return TRANSIENT, str(e)
+
+def send_to_dlq(records, reasons):
+    """
+    Move poison records to the dead-letter queue; returns the message ids that could not be moved
+
+    Records that are not moved stay failed, so SQS redelivers them and the
+    queue's redrive policy moves them once they reach maxReceiveCount.
+    """
+    if not records:
+        return set()
+    if not DLQ_URL:
+        logger.error(f"DLQ_URL not set; leaving {len(records)} poison messages to the redrive policy")
+        return {record['messageId'] for record in records}
+
+    not_moved = set()
+    for start in range(0, len(records), MAX_DLQ_BATCH):
+        chunk = records[start:start + MAX_DLQ_BATCH]
+        entries = [
+            {
+                'Id': str(index),
+                'MessageBody': record['body'],
+                'MessageAttributes': {
+                    'source_message_id': {'DataType': 'String', 'StringValue': record['messageId']},
+                    'failure_reason': {'DataType': 'String', 'StringValue': reasons[record['messageId']]}
+                }
+            }
+            for index, record in enumerate(chunk)
+        ]
+        try:
+            response = sqs.send_message_batch(QueueUrl=DLQ_URL, Entries=entries)
+            failed_entries = [int(entry['Id']) for entry in response.get('Failed', [])]
+        except Exception as e:
+            logger.error(f"Error sending poison messages to the DLQ: {str(e)}")
+            failed_entries = range(len(chunk))
+        not_moved.update(chunk[index]['messageId'] for index in failed_entries)
+    return not_moved
+
 def handler(event, context):
-    """Lambda handler for processing SQS events"""
+    """
+    Lambda handler for processing SQS events
+
+    Reports partial batch failures: only the message ids in
+    `batchItemFailures` are redelivered, the rest of the batch is deleted.
+    Records are processed concurrently, see `process_records`.
+    """
     if not event or 'Records' not in event:
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Invalid event format'})
         }
     
-    processed_count = 0
-    failed_count = 0
+    # Outcome per SQS message id; DynamoDB writes are buffered and sent together at the end
+    outcomes = {}
+    reasons = {}
+    parsed = []
+    writes = WriteBuffer()
     
     for record in event['Records']:
+        message_id = record['messageId']
         try:
             # Extract message body
             body = json.loads(record['body'])
-            
-            # Process the event
-            success = process_event(body)
-            
-            if success:
-                processed_count += 1
-            else:
-                failed_count += 1
-        
-        except Exception as e:
-            logger.error(f"Error processing record: {str(e)}")
-            failed_count += 1
+            if not isinstance(body, dict):
+                raise ValueError("message body is not a JSON object")
+        except ValueError as e:
+            logger.error(f"Malformed message {message_id}: {str(e)}")
+            outcomes[message_id] = POISON
+            reasons[message_id] = f"malformed: {str(e)}"
+            continue
+        parsed.append((message_id, body))
+    
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN
+    results = process_records(parsed, lambda message_id, body: process_record(message_id, body, writes), deadline=deadline)
+    for message_id, (outcome, reason) in results.items():
+        outcomes[message_id] = outcome
+        if reason:
+            reasons[message_id] = reason
+    
+    for message_id, (outcome, reason) in writes.flush().items():
+        outcomes[message_id] = outcome
+        reasons[message_id] = f"write failed: {reason}" if outcome == POISON else reason
+    
+    poison = [record for record in event['Records'] if outcomes[record['messageId']] == POISON]
+    retry = {message_id for message_id, outcome in outcomes.items() if outcome == TRANSIENT}
+    retry.update(send_to_dlq(poison, reasons))
     
+    logger.info(f"Processed {len(outcomes) - len(poison) - len(retry)} of {len(outcomes)} messages, "
+                f"{len(poison)} poison, {len(retry)} to retry")
     return {
-        'statusCode': 200,
-        'body': json.dumps({
-            'processed': processed_count,
-            'failed': failed_count
-        })
+        'batchItemFailures': [
+            {'itemIdentifier': record['messageId']} for record in event['Records'] if record['messageId'] in retry
+        ]
     }
 
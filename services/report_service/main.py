@@ -9,6 +9,9 @@ import json
 import os
 import uuid
 
+# Shared service utilities
+from services.common.latency import LatencyMiddleware, LatencyRecorder
+
 # Initialize FastAPI app
 app = FastAPI(
     title="CarReport Report Generation Service",
@@ -26,6 +29,9 @@ redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = os.getenv("REDIS_PORT", 6379)
 redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
 
+# Per-route latency histograms, flushed to Redis and reported by /analytics/api
+app.add_middleware(LatencyMiddleware, recorder=LatencyRecorder("report_service", redis_client))
+
 # OAuth2 scheme for authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -291,6 +297,11 @@ async def get_latest_report(vin: str, token: str = Depends(oauth2_scheme)):
         detail="No report found for this VIN"
     )
 
+@app.get("/health")
+async def health():
+    """Liveness probe; dependency checks are aggregated by the analytics service"""
+    return {"status": "healthy", "service": "report_service"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,80 @@
+"""
+Event archiver against the real analytics_events schema
+
+Needs a Postgres server (POSTGRES_* environment variables); skipped without
+POSTGRES_HOST. database/schema.sql is loaded into a scratch schema that is
+dropped afterwards.
+"""
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+redis = pytest.importorskip("redis")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "services", "analytics_service"))
+
+from event_archiver import EventArchiver, connect_postgres  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not os.getenv("POSTGRES_HOST"), reason="needs Postgres (POSTGRES_HOST)")
+
+
+@pytest.fixture
+def connection_factory():
+    schema = f"archiver_test_{uuid.uuid4().hex[:8]}"
+    conn = connect_postgres()
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}")
+        with open(os.path.join(ROOT, "database", "schema.sql")) as f:
+            cur.execute(f.read())
+    conn.commit()
+    try:
+        yield lambda: connect_postgres(options=f"-c search_path={schema}")
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+ENTRY_MS = int(datetime(2026, 1, 15).timestamp() * 1000)
+
+
+def make_events(start, count):
+    """Decoded stream entries; the same index always gives the same entry, as on redelivery"""
+    return [
+        {"id": f"{ENTRY_MS}-{i}", "type": "report_generated",
+         "timestamp": datetime.utcfromtimestamp(ENTRY_MS / 1000).isoformat(),
+         "data": {"event_type": "report_generated", "report_id": str(i)}}
+        for i in range(start, start + count)
+    ]
+
+
+def archived_rows(connection_factory):
+    conn = connection_factory()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*), count(ingested_at) FROM analytics_events")
+            return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def test_redelivered_batch_is_skipped(connection_factory):
+    # The Redis client is only used for dead letters, which these rows never reach
+    archiver = EventArchiver(redis.Redis(), connection_factory=connection_factory)
+    archiver._archive(make_events(0, 100))
+
+    # Redelivery after a crash between commit and acknowledgement, with new entries mixed in
+    archiver._archive(make_events(50, 100))
+    archiver._archive(make_events(0, 150))
+
+    assert archived_rows(connection_factory) == (150, 150)
+    assert archiver.duplicate_retries == 2
+    assert archiver.failed_flushes == 0